@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 
+from smartguard.database import sqlite_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'smartguard.profiling.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,14 +75,20 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
+#
+# SQLite in WAL mode with persistent connections, plus a read-only alias of
+# the same file for dashboard queries; see smartguard.database for the
+# pragmas. Set SMARTGUARD_DASHBOARD_DATABASE to None to read from 'default'.
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default':   sqlite_profile(BASE_DIR / 'db.sqlite3'),
+    'dashboard': sqlite_profile(BASE_DIR / 'db.sqlite3', read_only=True),
 }
 
+DATABASE_ROUTERS = ['smartguard.database.DashboardRouter']
+
+SMARTGUARD_DASHBOARD_DATABASE = 'dashboard'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -116,3 +125,121 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+
+# SmartGuard ingestion
+# Readings per transaction for POST /api/readings/ingest/. Set
+# SMARTGUARD_INGEST_TOKEN to require an "Authorization: Bearer <token>" header.
+
+SMARTGUARD_INGEST_CHUNK_SIZE = 5000
+
+SMARTGUARD_INGEST_TOKEN = None
+
+
+# SmartGuard streaming anomaly detection
+# Runs over every ingested chunk; see smartguard.detection.DEFAULTS for the
+# available options.
+
+SMARTGUARD_DETECTION_ENABLED = True
+
+SMARTGUARD_DETECTION = {
+    'z_threshold': 3.0,
+    'warmup':      50,
+}
+
+
+# Caching
+# The dashboard cache and the ingest sensor lookup use the default cache.
+# LocMemCache is per process; with several worker processes use a shared
+# backend (Redis, Memcached or FileBasedCache) so invalidations reach all of
+# them.
+
+CACHES = {
+    'default': {
+        'BACKEND':  'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'smartguard',
+    }
+}
+
+
+# SmartGuard dashboard cache
+# Sections are cached independently and dropped when a write touches their
+# data; see smartguard.dashboard_cache.CACHE_DEFAULTS for all options.
+
+SMARTGUARD_DASHBOARD_CACHE = {
+    'timeout':  300,
+    'timeouts': {'trend': 60, 'recent_anomalies': 60},
+}
+
+
+# SmartGuard live feed
+# One poller per process pushes new alerts, latest readings and KPI changes
+# to every open dashboard; see smartguard.live.LIVE_DEFAULTS.
+
+SMARTGUARD_LIVE = {
+    'interval':  2.0,
+    'heartbeat': 15.0,
+}
+
+
+# SmartGuard query profiling
+# Every 20th request gets Server-Timing entries and a JSON line on the
+# smartguard.profiling logger (set sample_rate to 1.0 to profile them all);
+# summarise the lines with "manage.py profile_summary <logfile>". See
+# smartguard.profiling.PROFILING_DEFAULTS.
+
+SMARTGUARD_PROFILING = {
+    'sample_rate': 0.05,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'profile': {'format': '%(asctime)s %(message)s'},
+    },
+    'handlers': {
+        'profile': {'class': 'logging.StreamHandler', 'formatter': 'profile'},
+    },
+    'loggers': {
+        'smartguard.profiling': {'handlers': ['profile'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+
+# SmartGuard retention
+# "manage.py compact_readings" (run it daily from cron) folds raw readings
+# older than raw_age_days into the rollups and deletes them, keeping those
+# referenced by anomalies. Set archive_dir to keep compressed copies; see
+# smartguard.retention.RETENTION_DEFAULTS.
+
+SMARTGUARD_RETENTION = {
+    'raw_age_days': 90,
+    'batch_size':   5000,
+}
+
+
+# SmartGuard columnar archive
+# "manage.py export_columnar" writes raw readings as memory-mapped
+# per-sensor, per-month column files here; smartguard.columnar.ColumnarArchive
+# aggregates them without going through the ORM.
+
+SMARTGUARD_COLUMNAR_ROOT = BASE_DIR / 'columnar'
+
+
+# SmartGuard histograms
+# Bucket edges (and optionally labels) per reading field for the power-factor
+# panel and /api/histogram/<field>/; see smartguard.histograms.HISTOGRAM_DEFAULTS.
+# For example {'power': {'edges': [0, 1000, 2000, None]}}; None opens the top bucket.
+
+SMARTGUARD_HISTOGRAMS = {}
+
+
+# SmartGuard batch jobs
+# "manage.py rebuild_rollups --workers N" and "detect_anomalies --workers N"
+# split their days or sensors across N worker processes; this sets the
+# default N. See smartguard.batch.BATCH_DEFAULTS.
+
+SMARTGUARD_BATCH = {
+    'workers': 1,
+}
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import dashboard_cache, rollups
 from .models import *
 
 # =========================
@@ -80,6 +81,9 @@ class EnergyReadingAdmin(admin.ModelAdmin):
     search_fields = ('sensor__sensor_id',)
     list_filter = ('sensor__sensor_type',)
 
+    def delete_queryset(self, request, queryset):
+        rollups.delete_readings(queryset)
+
 # =========================
 # ANOMALY TYPE
 # =========================
@@ -93,9 +97,13 @@ class AnomalyTypeAdmin(admin.ModelAdmin):
 # =========================
 @admin.register(Anomaly)
 class AnomalyAdmin(admin.ModelAdmin):
-    list_display = ('anomaly_id', 'energy_reading', 'anomaly_type', 'timestamp', 'severity', 'description')
+    list_display = ('anomaly_id', 'energy_reading', 'sensor', 'building', 'anomaly_type', 'timestamp', 'severity', 'description')
     search_fields = ('energy_reading__energyreading_id',)
     list_filter = ('anomaly_type', 'severity')
+    readonly_fields = ('sensor', 'building', 'power')
+
+    def delete_queryset(self, request, queryset):
+        rollups.delete_anomalies(queryset)
 
 # =========================
 # ALERT
@@ -104,4 +112,35 @@ class AnomalyAdmin(admin.ModelAdmin):
 class AlertAdmin(admin.ModelAdmin):
     list_display = ('alert_id', 'anomaly', 'created_at', 'status', 'message')
     search_fields = ('anomaly__anomaly_id',)
-    list_filter = ('status',)
\ No newline at end of file
+    list_filter = ('status',)
+
+    def delete_queryset(self, request, queryset):
+        queryset.delete()
+        dashboard_cache.invalidate('alerts')
+
+# =========================
+# ROLLUPS
+# =========================
+@admin.register(SensorHourlyRollup)
+class SensorHourlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('rollup_id', 'sensor', 'hour', 'reading_count', 'power_min', 'power_max')
+    search_fields = ('sensor__sensor_id',)
+    list_filter = ('sensor__building',)
+
+@admin.register(BuildingDailyRollup)
+class BuildingDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('rollup_id', 'building', 'day', 'reading_count', 'power_min', 'power_max')
+    search_fields = ('building__name',)
+    list_filter = ('building',)
+
+@admin.register(BuildingStats)
+class BuildingStatsAdmin(admin.ModelAdmin):
+    list_display = ('building', 'reading_count', 'power_max', 'anomaly_count', 'last_reading_at')
+    search_fields = ('building__name',)
+
+# =========================
+# RETENTION
+# =========================
+@admin.register(ReadingCompaction)
+class ReadingCompactionAdmin(admin.ModelAdmin):
+    list_display = ('compaction_id', 'compacted_before', 'started_at', 'finished_at', 'deleted', 'kept', 'archived_files')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SmartguardConfig(AppConfig):
     name = 'smartguard'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,243 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import dashboard_cache, rollups
+from .detection import ensure_anomaly_types
+from .models import Sensor, EnergyReading
+
+
+# Batch jobs over history, fanned out across worker processes. A job is split
+# into partitions (groups of sensors, or ranges of days), and each partition
+# is handed to a module-level function in a ProcessPoolExecutor worker with
+# its own database connection. Results come back in partition order whatever
+# order the workers finish in, so merged totals and writes are the same for
+# any number of workers.
+#
+# Workers write their own results in short transactions: rescoring a sensor
+# at a time, a rollup rebuild a day at a time. A day's rows are computed in
+# the same transaction that swaps them in, as rollups.rebuild() does, so a
+# reading saved meanwhile waits for the write lock and then adds itself to
+# the new rows rather than being overwritten by them. Only counts travel back
+# to the parent, so memory stays bounded by one sensor or one day whatever
+# the partition size.
+# SQLite has a single writer; a worker that waits out busy_timeout while the
+# others commit retries its transaction after a back-off (lock_retries).
+#
+# With workers=1 partitions run in-process, one after another.
+
+BATCH_DEFAULTS = {
+    'workers':               1,
+    'partitions_per_worker': 4,   # smaller partitions even out uneven sensors or days
+    'lock_retries':          5,   # attempts after "database is locked" before giving up
+}
+
+
+def batch_options(**overrides):
+    options = {**BATCH_DEFAULTS, **getattr(settings, 'SMARTGUARD_BATCH', {})}
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    if options['workers'] < 1:
+        raise ValueError("A batch job needs at least one worker.")
+    return options
+
+
+# ─── PARTITIONS ───────────────────────────────────────────────────────────────
+def sensor_partitions(sensor_ids, count):
+    """``sensor_ids`` dealt round-robin into at most ``count`` non-empty lists."""
+    ids = sorted(sensor_ids)
+    return [ids[i::count] for i in range(min(count, len(ids)))]
+
+
+def day_partitions(first, last, count):
+    """The days [first, last] as at most ``count`` contiguous (start, end) ranges."""
+    days = (last - first).days + 1
+    size = -(-days // count)
+    return [
+        (first + timedelta(days=i), first + timedelta(days=min(i + size, days) - 1))
+        for i in range(0, days, size)
+    ]
+
+
+# ─── RUNNER ───────────────────────────────────────────────────────────────────
+class BatchProgress:
+    """Partitions finished and readings processed so far."""
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.done = 0
+        self.readings = 0
+        self.started = time.perf_counter()
+
+    def add(self, stats):
+        self.done += 1
+        self.readings += stats.get('readings', 0)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        """Readings per second."""
+        elapsed = self.elapsed
+        return self.readings / elapsed if elapsed else 0
+
+    def __str__(self):
+        return (
+            f"{self.done}/{self.partitions} partitions, {self.readings:,} readings "
+            f"in {self.elapsed:.1f}s ({self.rate:,.0f} readings/s)"
+        )
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones already have it.
+    if not apps.ready:
+        django.setup()
+
+
+def map_partitions(job, partitions, workers=1, **kwargs):
+    """Yield job(partition, **kwargs) for every partition, in partition order."""
+    call = partial(job, **kwargs)
+    if workers <= 1 or len(partitions) <= 1:
+        yield from map(call, partitions)
+        return
+    # Workers open their own connections; none may inherit the parent's.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=min(workers, len(partitions)), initializer=_init_worker) as pool:
+        yield from pool.map(call, partitions)
+
+
+def retry_locked(func, *args, retries=BATCH_DEFAULTS['lock_retries'], **kwargs):
+    """func(*args, **kwargs), run again after a back-off while SQLite reports the database locked."""
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as exc:
+            if 'database is locked' not in str(exc) or attempt == retries:
+                raise
+            time.sleep(min(0.1 * 2 ** attempt, 5))
+
+
+def merge_stats(results):
+    """Sum the numeric stats of every partition, keys in first-seen order."""
+    merged = {}
+    for stats in results:
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+# ─── JOBS ─────────────────────────────────────────────────────────────────────
+def rescore_partition(sensor_ids, retries=BATCH_DEFAULTS['lock_retries'], **scan_options):
+    from .scanner import BackfillScanner
+
+    scanner = BackfillScanner(sensor_ids=sensor_ids, **scan_options)
+    # Each sensor is synced in one transaction, which is safe to run again.
+    sync = scanner.sync
+    scanner.sync = lambda *args: retry_locked(sync, *args, retries=retries)
+    return scanner.run()
+
+
+def parallel_rescore(sensor_ids=None, workers=None, progress=None, **scan_options):
+    """
+    BackfillScanner over every sensor (or ``sensor_ids``) with the sensors
+    spread across worker processes. ``scan_options`` are BackfillScanner's.
+    Returns its merged stats plus the number of partitions.
+    """
+    options = batch_options(workers=workers)
+    # Created once here rather than raced for by the workers.
+    ensure_anomaly_types()
+    if not sensor_ids:
+        sensor_ids = Sensor.objects.values_list('sensor_id', flat=True)
+    partitions = sensor_partitions(sensor_ids, options['workers'] * options['partitions_per_worker'])
+
+    report, results = BatchProgress(len(partitions)), []
+    finished = map_partitions(
+        rescore_partition, partitions, options['workers'], retries=options['lock_retries'], **scan_options,
+    )
+    for stats in finished:
+        results.append(stats)
+        report.add(stats)
+        if progress:
+            progress(report)
+    if not scan_options.get('dry_run'):
+        dashboard_cache.invalidate('anomalies', 'alerts')
+    return {'partitions': len(partitions), **merge_stats(results)}
+
+
+def _replace_days(start, end, hourly, daily, batch_size):
+    with transaction.atomic():
+        return rollups.replace_rollups(start, end, hourly, daily, batch_size)
+
+
+def _rebuild_day(day, batch_size):
+    with transaction.atomic():
+        hourly, daily = rollups.rollup_rows(day, day, batch_size=batch_size)
+        hourly = list(hourly)
+        counts = rollups.replace_rollups(day, day, hourly, daily, batch_size)
+    return sum(row['reading_count'] for row in hourly), *counts
+
+
+def rollup_partition(days, batch_size=1000, retries=BATCH_DEFAULTS['lock_retries']):
+    """
+    Rebuild the rollups of the (first, last) days one day at a time, each
+    computed and swapped in by a transaction of its own. Returns the counts.
+    """
+    first, last = days
+    stats = {'readings': 0, 'hourly_rows': 0, 'daily_rows': 0}
+    day = first
+    while day <= last:
+        readings, hourly_rows, daily_rows = retry_locked(_rebuild_day, day, batch_size, retries=retries)
+        stats['readings']    += readings
+        stats['hourly_rows'] += hourly_rows
+        stats['daily_rows']  += daily_rows
+        day += timedelta(days=1)
+    return stats
+
+
+def parallel_rebuild(start=None, end=None, workers=None, batch_size=1000, progress=None):
+    """
+    rollups.rebuild() with the days split across worker processes, which
+    replace them a day at a time. Returns the merged counts.
+    """
+    options = batch_options(workers=workers)
+    days = rollups.rebuild_range(start, end)
+    if days is None:
+        return {'partitions': 0, 'readings': 0, 'hourly_rows': 0, 'daily_rows': 0}
+    start, end = days
+
+    bounds = rollups.within_days(EnergyReading.objects.all(), 'timestamp', start, end).aggregate(
+        first=Min('timestamp'), last=Max('timestamp'),
+    )
+    if bounds['first'] is None:
+        # No readings left in range: clear it, as rebuild() would.
+        retry_locked(_replace_days, start, end, [], [], batch_size, retries=options['lock_retries'])
+        dashboard_cache.invalidate('readings')
+        return {'partitions': 0, 'readings': 0, 'hourly_rows': 0, 'daily_rows': 0}
+    first, last = timezone.localdate(bounds['first']), timezone.localdate(bounds['last'])
+    # Requested days outside the readings only need clearing.
+    for clear_start, clear_end in ((start, first - timedelta(days=1)), (last + timedelta(days=1), end)):
+        retry_locked(_replace_days, clear_start, clear_end, [], [], batch_size, retries=options['lock_retries'])
+    partitions = day_partitions(first, last, options['workers'] * options['partitions_per_worker'])
+
+    report, results = BatchProgress(len(partitions)), []
+    finished = map_partitions(
+        rollup_partition, partitions, options['workers'],
+        batch_size=batch_size, retries=options['lock_retries'],
+    )
+    for stats in finished:
+        results.append(stats)
+        report.add(stats)
+        if progress:
+            progress(report)
+    dashboard_cache.invalidate('readings')
+    return {'partitions': len(partitions), **merge_stats(results)}
@@ -0,0 +1,325 @@
+import platform
+import subprocess
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import detection
+from .dashboard import KPI_SECTIONS, SECTIONS, compute_section
+from .database import dashboard_database, sqlite_profile
+from .ingest import ingest, known_sensors
+from .models import EnergyReading
+from .panels import PANELS
+from .profiling import percentile, profiled
+from .scanner import BackfillScanner
+from .synthetic import SyntheticFleet
+
+
+# Reproducible performance suite. Each scale is a synthetic dataset in its
+# own scratch SQLite file; the suite times the analytics page, every
+# dashboard section, bulk ingestion and both anomaly detectors against it and
+# returns flat metrics that can be written as JSON and compared with an
+# earlier run. Timings are the best of ``repeat`` runs.
+
+SCALES = {'10k': 10_000, '1M': 1_000_000, '10M': 10_000_000}
+
+LOWER, HIGHER = 'lower', 'higher'
+NOISE_MS      = 1.0  # timing differences below this never count as regressions
+
+
+def use_scratch_database(path):
+    """Point the default connection, and every alias of the same file, at a separate SQLite file."""
+    if connection.vendor != 'sqlite':
+        raise CommandError("Benchmarks build their datasets in scratch SQLite files.")
+    configured = connection.settings_dict['NAME']
+    for alias in connections:
+        if connections[alias].settings_dict['NAME'] == configured:
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = str(path)
+
+
+def populate(rows, sensors, interval=60):
+    per_building = 10
+    fleet = SyntheticFleet(
+        buildings=max(1, sensors // per_building),
+        sensors_per_building=min(sensors, per_building),
+        interval=interval,
+        span=timedelta(seconds=interval * max(1, rows // sensors)),
+        spike_rate=0.05,
+        anomaly_rate=0.02,
+        fast=True,
+    )
+    fleet.run()
+    return fleet.stats
+
+
+def metric(value, unit, better=LOWER):
+    return {'value': round(value, 3), 'unit': unit, 'better': better}
+
+
+def best_of(repeat, func):
+    """(best milliseconds, queries and result of the last run) of ``func()``."""
+    best = float('inf')
+    for _ in range(repeat):
+        with profiled() as profile:
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+    return best * 1000, len(profile.queries), result
+
+
+def run_description():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit':   commit,
+        'created':  time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python':   platform.python_version(),
+        'django':   django.get_version(),
+        'database': connection.vendor,
+        'machine':  platform.machine(),
+    }
+
+
+# ─── MEASUREMENTS ─────────────────────────────────────────────────────────────
+@override_settings(SMARTGUARD_PROFILING={'enabled': False})
+def bench_analytics(repeat):
+    # SERVER_NAME passes the ALLOWED_HOSTS check outside the test runner.
+    client = Client(SERVER_NAME='localhost')
+    get = lambda url: client.get(url).status_code  # noqa: E731
+    metrics = {}
+    with override_settings(SMARTGUARD_DASHBOARD_CACHE={'enabled': False}):
+        ms, queries, _ = best_of(repeat, lambda: get(reverse('smartguard:analytics')))
+        metrics['analytics.cold_ms'] = metric(ms, 'ms')
+        metrics['analytics.queries'] = metric(queries, 'queries')
+        for panel in PANELS:
+            ms, queries, _ = best_of(repeat, lambda: get(reverse('smartguard:dashboard_panel', args=[panel])))
+            metrics[f'panel.{panel}.cold_ms'] = metric(ms, 'ms')
+            metrics[f'panel.{panel}.queries'] = metric(queries, 'queries')
+
+    get(reverse('smartguard:analytics'))
+    ms, queries, _ = best_of(repeat, lambda: get(reverse('smartguard:analytics')))
+    metrics['analytics.warm_ms'] = metric(ms, 'ms')
+    metrics['analytics.warm_queries'] = metric(queries, 'queries')
+    return metrics
+
+
+def bench_sections(repeat):
+    metrics = {}
+    for name in SECTIONS:
+        ms, queries, _ = best_of(repeat, lambda: compute_section(name))
+        metrics[f'section.{name}.ms'] = metric(ms, 'ms')
+        metrics[f'section.{name}.queries'] = metric(queries, 'queries')
+    return metrics
+
+
+def synthetic_rows(count):
+    """Ingest rows for every known sensor, one minute after the newest reading."""
+    sensors = sorted(known_sensors())
+    last = EnergyReading.objects.aggregate(m=Max('timestamp'))['m']
+    for i in range(count):
+        yield {
+            'sensor_id':    sensors[i % len(sensors)],
+            'timestamp':    (last + timedelta(minutes=1 + i // len(sensors))).isoformat(),
+            'voltage':      230.0,
+            'current':      4.0 + i % 7,
+            'power':        900.0 + (i * 37) % 400,
+            'power_factor': 0.9,
+        }
+
+
+def bench_ingest(rows, repeat):
+    """Readings per second through the ingest pipeline; nothing is kept."""
+    best = float('inf')
+    for _ in range(repeat):
+        detection.reset_detector()
+        try:
+            with transaction.atomic():
+                payload = list(synthetic_rows(rows))
+                detection.get_detector().warm()
+                started = time.perf_counter()
+                with profiled() as profile:
+                    result = ingest(payload)
+                best = min(best, time.perf_counter() - started)
+                transaction.set_rollback(True)
+        finally:
+            detection.reset_detector()
+    return {
+        'ingest.readings_per_s': metric(result.accepted / best, 'readings/s', HIGHER),
+        'ingest.queries':        metric(len(profile.queries), 'queries'),
+    }
+
+
+def bench_detection(rows, repeat):
+    """Streaming (EWMA) and batch (backfill scan) detector throughput."""
+    readings = list(EnergyReading.objects.order_by('-timestamp')[:rows])
+    first = readings[-1].timestamp
+
+    def stream():
+        detector = detection.StreamingDetector()
+        detector.warm(before=first)
+        started = time.perf_counter()
+        detector.process(readings)
+        return time.perf_counter() - started
+
+    def scan():
+        started = time.perf_counter()
+        stats = BackfillScanner(start=first, dry_run=True).run()
+        return stats['readings'], time.perf_counter() - started
+
+    streaming = min(stream() for _ in range(repeat))
+    scanned, scanning = min((scan() for _ in range(repeat)), key=lambda run: run[1])
+    return {
+        'detection.streaming_per_s': metric(len(readings) / streaming, 'readings/s', HIGHER),
+        'detection.backfill_per_s':  metric(scanned / scanning, 'readings/s', HIGHER),
+    }
+
+
+# SQLite as Django configures it out of the box: rollback journal, a new
+# connection per request and no read-only alias.
+STOCK_SQLITE = {'CONN_MAX_AGE': 0, 'OPTIONS': {'init_command': 'PRAGMA journal_mode=DELETE'}}
+
+
+@contextmanager
+def sqlite_settings(path, tuned=True):
+    """
+    Run the block against the SQLite file ``path`` with the high-throughput
+    profile of smartguard.database (and its dashboard alias), or with
+    STOCK_SQLITE when ``tuned`` is false.
+    """
+    alias = dashboard_database() if tuned else None
+    changes = {DEFAULT_DB_ALIAS: sqlite_profile(str(path)) if tuned else {'NAME': str(path), **STOCK_SQLITE}}
+    if alias:
+        changes[alias] = sqlite_profile(str(path), read_only=True)
+    keys = ('NAME', 'CONN_MAX_AGE', 'OPTIONS')
+    saved = {name: {key: connections[name].settings_dict[key] for key in keys} for name in changes}
+    connections.close_all()
+    for name, database in changes.items():
+        connections[name].settings_dict.update({key: database[key] for key in keys})
+    try:
+        with override_settings(SMARTGUARD_DASHBOARD_DATABASE=alias):
+            yield
+    finally:
+        connections.close_all()
+        for name, database in saved.items():
+            connections[name].settings_dict.update(database)
+
+
+def bench_concurrent(seconds=10.0, readers=4, batch=200, interval=0.05):
+    """
+    Throughput of one thread ingesting ``batch`` readings per request while
+    ``readers`` threads each compute a KPI section every ``interval``
+    seconds (0 for back to back), for ``seconds``. Paced readers put the
+    same load on every configuration, so what differs is how long reads and
+    writes wait for each other. Every thread has its own connections and the
+    writes are committed, so run it on a scratch copy of the data.
+    """
+    deadline = time.perf_counter() + seconds
+    counts, latencies, lock = Counter(), {'write': [], 'read': []}, threading.Lock()
+
+    def timed(kind, func):
+        started = time.perf_counter()
+        try:
+            func()
+        except OperationalError:
+            # "database is locked" once busy_timeout runs out.
+            with lock:
+                counts[f'{kind}_errors'] += 1
+            return False
+        with lock:
+            latencies[kind].append((time.perf_counter() - started) * 1000)
+        return True
+
+    def writer():
+        try:
+            while time.perf_counter() < deadline:
+                if timed('write', lambda: ingest(list(synthetic_rows(batch)))):
+                    with lock:
+                        counts['written'] += batch
+        finally:
+            connections.close_all()
+
+    def reader(offset):
+        try:
+            i, due = offset, time.perf_counter()
+            while time.perf_counter() < deadline:
+                name = KPI_SECTIONS[i % len(KPI_SECTIONS)]
+                timed('read', lambda: compute_section(name))
+                i, due = i + 1, due + interval
+                time.sleep(max(0, min(due, deadline) - time.perf_counter()))
+        finally:
+            connections.close_all()
+
+    detection.reset_detector()
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader, args=(i,)) for i in range(readers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    detection.reset_detector()
+
+    return {
+        'concurrent.writes_per_s': metric(counts['written'] / elapsed, 'readings/s', HIGHER),
+        'concurrent.reads_per_s':  metric(len(latencies['read']) / elapsed, 'sections/s', HIGHER),
+        'concurrent.write_p95_ms': metric(percentile(latencies['write'], 0.95), 'ms'),
+        'concurrent.read_p95_ms':  metric(percentile(latencies['read'], 0.95), 'ms'),
+        'concurrent.write_errors': metric(counts['write_errors'], 'errors'),
+        'concurrent.read_errors':  metric(counts['read_errors'], 'errors'),
+    }
+
+
+def run_suite(repeat=3, ingest_rows=10_000, detect_rows=100_000):
+    """Every metric for the dataset in the default database."""
+    return {
+        'readings': EnergyReading.objects.count(),
+        'metrics': {
+            **bench_analytics(repeat),
+            **bench_sections(repeat),
+            **bench_ingest(ingest_rows, repeat),
+            **bench_detection(detect_rows, repeat),
+        },
+    }
+
+
+# ─── COMPARISON ───────────────────────────────────────────────────────────────
+def compare(results, baseline, threshold):
+    """
+    Metrics worse than the baseline by more than ``threshold`` (0.2 = 20%),
+    as (scale, name, baseline, current). Query counts may not grow at all,
+    and timings must also be NOISE_MS slower.
+    """
+    regressions = []
+    for scale, run in results['scales'].items():
+        before = baseline.get('scales', {}).get(scale, {}).get('metrics', {})
+        for name, current in run['metrics'].items():
+            if name not in before:
+                continue
+            old, new = before[name]['value'], current['value']
+            allowed = 0 if current['unit'] == 'queries' else threshold
+            if current['better'] == LOWER:
+                worse = new > old * (1 + allowed) and not (current['unit'] == 'ms' and new - old < NOISE_MS)
+            else:
+                worse = new < old * (1 - allowed)
+            if worse:
+                regressions.append((scale, name, old, new))
+    return regressions
@@ -0,0 +1,304 @@
+import json
+import os
+import shutil
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .dashboard import SPIKE_FACTOR
+from .histograms import histogram_buckets
+from .models import EnergyReading
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+# Columnar archive of raw readings for long-range analysis. Every sensor and
+# UTC month is one directory of fixed-width little-endian arrays, one file
+# per column, sorted by time:
+#
+#   <root>/sensor-<id>/<YYYY-MM>/timestamp.i8   microseconds since the epoch
+#                                 voltage.f4 current.f4 power.f4 power_factor.f4
+#                                 meta.json     row count, time range, dtypes
+#
+# Queries open the files with numpy.memmap, so a month is paged in by the OS
+# rather than copied, binary-search the sorted timestamps for the requested
+# range and aggregate in fixed-size blocks; Python memory stays constant
+# whatever the range. Partitions are written to a temporary directory and
+# renamed into place, so readers never see half a month.
+
+COLUMNS = {
+    'timestamp':    '<i8',
+    'voltage':      '<f4',
+    'current':      '<f4',
+    'power':        '<f4',
+    'power_factor': '<f4',
+}
+EXTENSIONS = {'<i8': 'i8', '<f4': 'f4'}
+BLOCK = 1 << 20  # rows aggregated at a time
+
+
+def default_root():
+    return Path(getattr(settings, 'SMARTGUARD_COLUMNAR_ROOT', Path(settings.BASE_DIR) / 'columnar'))
+
+
+def _micros(moment):
+    return round(moment.timestamp() * 1_000_000)
+
+
+def month_key(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y-%m')
+
+
+def month_start(key):
+    return datetime.strptime(key, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+
+
+def next_month(key):
+    start = month_start(key)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _column_file(directory, name):
+    return directory / f'{name}.{EXTENSIONS[COLUMNS[name]]}'
+
+
+# ─── WRITING ──────────────────────────────────────────────────────────────────
+class PartitionWriter:
+    """Appends readings of one sensor-month to column files, then publishes them."""
+
+    def __init__(self, root, sensor_id, month):
+        self.final = Path(root) / f'sensor-{sensor_id}' / month
+        self.tmp = self.final.with_name(f'.{month}.tmp-{os.getpid()}')
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        self.tmp.mkdir(parents=True)
+        self.files = {name: open(_column_file(self.tmp, name), 'wb') for name in COLUMNS}
+        self.meta = {'sensor_id': sensor_id, 'month': month, 'rows': 0, 'first': None, 'last': None}
+
+    def append(self, rows):
+        """Append (timestamp, voltage, current, power, power_factor) tuples."""
+        timestamps, voltage, current, power, pf = zip(*rows)
+        micros = [_micros(t) for t in timestamps]
+        for name, values in zip(COLUMNS, (micros, voltage, current, power, pf)):
+            np.asarray(values, dtype=COLUMNS[name]).tofile(self.files[name])
+        self.meta['rows'] += len(rows)
+        self.meta['first'] = self.meta['first'] if self.meta['first'] is not None else micros[0]
+        self.meta['last'] = micros[-1]
+
+    def close(self):
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        self.meta['columns'] = COLUMNS
+        (self.tmp / 'meta.json').write_text(json.dumps(self.meta))
+        if self.final.exists():
+            stale = self.final.with_name(f'.{self.final.name}.old-{os.getpid()}')
+            os.replace(self.final, stale)
+            os.replace(self.tmp, self.final)
+            shutil.rmtree(stale)
+        else:
+            os.replace(self.tmp, self.final)
+        return self.meta
+
+
+def export(root=None, sensor_ids=None, start=None, end=None, chunk_size=50_000, progress=None):
+    """
+    Write readings in [start, end) into the archive under ``root``, one
+    partition per sensor-month, replacing partitions that already exist.
+    ``start`` and ``end`` are rounded out to whole UTC months. Returns the
+    metadata of every partition written.
+    """
+    if np is None:
+        raise ValueError("The columnar archive needs NumPy.")
+    root = Path(root or default_root())
+    readings = EnergyReading.objects.all()
+    if sensor_ids:
+        readings = readings.filter(sensor_id__in=sensor_ids)
+    if start is not None:
+        readings = readings.filter(timestamp__gte=month_start(month_key(start)))
+    if end is not None:
+        readings = readings.filter(timestamp__lt=next_month(month_key(end - timedelta(microseconds=1))))
+    rows = (
+        readings
+        .order_by('sensor_id', 'timestamp')
+        .values_list('sensor_id', 'timestamp', 'voltage', 'current', 'power', 'power_factor')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    written, writer, buffer = [], None, []
+    current, until = None, None  # sensor and end of month of the open partition
+
+    def publish():
+        written.append(writer.close())
+        if progress:
+            progress(written[-1])
+
+    for sensor_id, *row in rows:
+        if sensor_id != current or row[0] >= until:
+            if buffer:
+                writer.append(buffer)
+                buffer = []
+            if writer:
+                publish()
+            month = month_key(row[0])
+            writer, current, until = PartitionWriter(root, sensor_id, month), sensor_id, next_month(month)
+        elif len(buffer) >= chunk_size:
+            writer.append(buffer)
+            buffer = []
+        buffer.append(row)
+    if writer:
+        if buffer:
+            writer.append(buffer)
+        publish()
+    return written
+
+
+# ─── READING ──────────────────────────────────────────────────────────────────
+class Partition:
+    """One sensor-month of memory-mapped columns."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.meta = json.loads((self.directory / 'meta.json').read_text())
+        self.sensor_id = self.meta['sensor_id']
+        self.month = self.meta['month']
+        self.rows = self.meta['rows']
+        self._columns = {}
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = (
+                np.memmap(_column_file(self.directory, name), dtype=COLUMNS[name], mode='r', shape=(self.rows,))
+                if self.rows else np.empty(0, dtype=COLUMNS[name])
+            )
+        return self._columns[name]
+
+    def span(self, start=None, end=None):
+        """Row range [lo, hi) with timestamps in [start, end)."""
+        timestamps = self.column('timestamp')
+        lo = int(np.searchsorted(timestamps, _micros(start), 'left')) if start is not None else 0
+        hi = int(np.searchsorted(timestamps, _micros(end), 'left')) if end is not None else self.rows
+        return lo, hi
+
+    def blocks(self, names, start=None, end=None, block=BLOCK):
+        """Zero-copy slices of ``names`` over the range, at most ``block`` rows each."""
+        lo, hi = self.span(start, end)
+        columns = [self.column(name) for name in names]
+        for i in range(lo, hi, block):
+            yield [c[i:min(i + block, hi)] for c in columns]
+
+
+class ColumnarArchive:
+    """Aggregates over the archive under ``root``, shaped like the dashboard sections."""
+
+    def __init__(self, root=None):
+        if np is None:
+            raise ValueError("The columnar archive needs NumPy.")
+        self.root = Path(root or default_root())
+
+    def partitions(self, sensor_ids=None, start=None, end=None):
+        first = month_key(start) if start is not None else None
+        last = month_key(end - timedelta(microseconds=1)) if end is not None else None
+        wanted = set(sensor_ids) if sensor_ids else None
+        for sensor_dir in sorted(self.root.glob('sensor-*')):
+            sensor_id = int(sensor_dir.name.split('-', 1)[1])
+            if wanted is not None and sensor_id not in wanted:
+                continue
+            for month_dir in sorted(sensor_dir.iterdir()):
+                month = month_dir.name
+                if month.startswith('.') or (first and month < first) or (last and month > last):
+                    continue
+                yield Partition(month_dir)
+
+    def _blocks(self, names, sensor_ids, start, end):
+        for partition in self.partitions(sensor_ids, start, end):
+            for block in partition.blocks(names, start, end):
+                yield partition, block
+
+    def summary(self, sensor_ids=None, start=None, end=None):
+        count, total, peak = 0, 0.0, None
+        for _, (power,) in self._blocks(['power'], sensor_ids, start, end):
+            if len(power):
+                count += len(power)
+                total += float(power.sum(dtype=np.float64))
+                peak = max(peak, float(power.max())) if peak is not None else float(power.max())
+        return {'count': count, 'avg_power': total / count if count else 0, 'max_power': peak or 0}
+
+    def hourly_profile(self, sensor_ids=None, start=None, end=None, tz=None):
+        """Average and peak power per local hour of day, like dashboard.hourly_section."""
+        tz = tz or timezone.get_current_timezone()
+        counts = np.zeros(24, dtype=np.int64)
+        sums = np.zeros(24, dtype=np.float64)
+        peaks = np.full(24, -np.inf)
+        for _, (timestamps, power) in self._blocks(['timestamp', 'power'], sensor_ids, start, end):
+            hours = self._local_hours(timestamps, tz)
+            block_counts = np.bincount(hours, minlength=24)
+            counts += block_counts
+            sums += np.bincount(hours, weights=power, minlength=24)
+            for h in np.flatnonzero(block_counts):
+                peaks[h] = max(peaks[h], power[hours == h].max())
+        return [
+            {
+                'hour':          h,
+                'avg_power':     sums[h] / counts[h] if counts[h] else 0,
+                'max_power':     float(peaks[h]) if counts[h] else 0,
+                'reading_count': int(counts[h]),
+            }
+            for h in range(24)
+        ]
+
+    @staticmethod
+    def _local_hours(timestamps, tz):
+        seconds = timestamps // 1_000_000
+        first, last = (datetime.fromtimestamp(int(t), tz=tz).utcoffset() for t in (seconds[0], seconds[-1]))
+        if first == last:
+            # A block lies within one month and offsets change at most twice
+            # a year, so equal offsets at both ends hold for the whole block.
+            local = seconds + int(first.total_seconds())
+        else:
+            # Offsets only change on quarter-hour boundaries; look them up
+            # once per distinct quarter hour rather than per reading.
+            quarters, index = np.unique(seconds // 900, return_inverse=True)
+            offsets = np.array([
+                datetime.fromtimestamp(int(q) * 900, tz=tz).utcoffset().total_seconds() for q in quarters
+            ], dtype=np.int64)
+            local = seconds + offsets[index]
+        return ((local // 3600) % 24).astype(np.intp)
+
+    def spike_counts(self, sensor_ids=None, start=None, end=None, threshold=None, limit=None):
+        """
+        Readings above ``threshold`` watts per sensor, by default SPIKE_FACTOR
+        times the mean power of the selection (dashboard.spike_section's rule).
+        """
+        if threshold is None:
+            threshold = self.summary(sensor_ids, start, end)['avg_power'] * SPIKE_FACTOR
+        spikes = {}
+        for partition, (power,) in self._blocks(['power'], sensor_ids, start, end):
+            above = power[power > threshold]
+            if len(above):
+                count, peak = spikes.get(partition.sensor_id, (0, float('-inf')))
+                spikes[partition.sensor_id] = (count + len(above), max(peak, float(above.max())))
+        result = sorted(
+            ({'sensor_id': s, 'spike_count': c, 'max_power': p} for s, (c, p) in spikes.items()),
+            key=lambda row: (-row['spike_count'], row['sensor_id']),
+        )
+        return result[:limit] if limit else result
+
+    def pf_buckets(self, sensor_ids=None, start=None, end=None, buckets=None):
+        """Readings per power-factor bucket, like dashboard.power_factor_section without faults."""
+        buckets = buckets or histogram_buckets('power_factor')
+        top = buckets[-1][1]
+        # Compare in float32, the storage type, so readings exactly on an
+        # edge (0.70 say) fall in the same bucket as in SQL.
+        edges = np.array([lo for lo, _, _ in buckets] + [np.inf if top is None else top], dtype=np.float32)
+        totals = np.zeros(len(buckets), dtype=np.int64)
+        for _, (pf,) in self._blocks(['power_factor'], sensor_ids, start, end):
+            index = np.searchsorted(edges, pf, 'right') - 1
+            index = index[(index >= 0) & (index < len(buckets))]
+            totals += np.bincount(index, minlength=len(buckets))
+        return [{'label': label, 'total': int(total)} for (_, _, label), total in zip(buckets, totals)]
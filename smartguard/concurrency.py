@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .dashboard_cache import get_section
+from .filters import ALL
+
+
+# Concurrent section computation for async views. Django's async ORM methods
+# (acount, aaggregate, async iteration) all run on the one thread-sensitive
+# executor, so awaiting them together still sends the queries one after
+# another. Here each section runs in its own worker thread with its own
+# database connection, so round trips to a networked database overlap and a
+# page costs about as much as its slowest section rather than the sum.
+#
+# SMARTGUARD_DASHBOARD_WORKERS caps the sections (and so connections) in
+# flight per request; 1 computes them serially on the request's own thread.
+
+DEFAULT_WORKERS = 8
+
+
+def section_workers():
+    return getattr(settings, 'SMARTGUARD_DASHBOARD_WORKERS', DEFAULT_WORKERS)
+
+
+def _timed(section, name, filters):
+    started = time.perf_counter()
+    value = section(name, filters)
+    return value, (time.perf_counter() - started) * 1000
+
+
+def _timed_in_worker(section, name, filters):
+    # Worker threads outlive the request, so their connections follow the
+    # same CONN_MAX_AGE rules as a request thread's.
+    close_old_connections()
+    try:
+        return _timed(section, name, filters)
+    finally:
+        close_old_connections()
+
+
+async def gather_sections(names, filters=ALL, section=get_section, workers=None):
+    """Fetch ``names`` concurrently; returns ({name: value}, {name: milliseconds})."""
+    names = tuple(dict.fromkeys(names))
+    workers = workers or section_workers()
+    if workers <= 1:
+        run_section = sync_to_async(_timed)
+    else:
+        run_section = sync_to_async(_timed_in_worker, thread_sensitive=False)
+    limit = asyncio.Semaphore(workers)
+
+    async def run(name):
+        async with limit:
+            return await run_section(section, name, filters)
+
+    results = await asyncio.gather(*(run(name) for name in names))
+    values  = {name: value for name, (value, _) in zip(names, results)}
+    timings = {name: elapsed for name, (_, elapsed) in zip(names, results)}
+    return values, timings
+
+
+def server_timing(timings, total=None):
+    """``Server-Timing`` header value, slowest section first."""
+    entries = sorted(timings.items(), key=lambda item: -item[1])
+    parts = [f'{name};dur={elapsed:.1f}' for name, elapsed in entries]
+    if total is not None:
+        parts.insert(0, f'total;dur={total:.1f}')
+    return ', '.join(parts)
@@ -0,0 +1,365 @@
+from datetime import timedelta
+
+from django.db.models import Avg, Max, Sum, Count, F, Q
+from django.db.models.functions import ExtractHour
+
+from .database import dashboard_reads
+from .downsample import TrendSeries
+from .filters import ALL
+from .histograms import histogram
+from .retention import compacted_before
+from .models import (
+    Building, Sensor, Appliance,
+    EnergyReading, Anomaly, Alert,
+    SensorHourlyRollup, BuildingDailyRollup, BuildingStats
+)
+from .spikes import GlobalMean, SpikeSummary
+
+
+# Every section below is computed from a fixed number of grouped queries, so
+# the cost of the dashboard does not depend on how many buildings, sensors or
+# readings exist. KPI, hourly and building sections read the pre-aggregated
+# rollups rather than raw readings.
+#
+# Once smartguard.retention has compacted old readings, the spike summary and
+# the histograms (power factor and the other reading fields) only count the
+# raw readings still stored: those newer than the cutoff, plus the ones
+# anomalies point at. The trend switches to the rollups for ranges that reach
+# past the cutoff. Full-history spike counts and power-factor buckets are
+# available from a ColumnarArchive exported before compacting.
+
+SPIKE_FACTOR = 1.5
+SPIKE_LIMIT  = 8
+TREND_POINTS = 200
+TREND_SPAN   = timedelta(hours=6)
+RECENT_LIMIT = 10
+
+
+# ─── KPI SUMMARY ──────────────────────────────────────────────────────────────
+def reading_stats(filters=ALL):
+    if filters.daily:
+        rollups = filters.daily_rollups(BuildingDailyRollup.objects.all())
+    else:
+        rollups = filters.hourly_rollups(SensorHourlyRollup.objects.all())
+    stats = rollups.aggregate(
+        count=Sum('reading_count'),
+        power_sum=Sum('power_sum'),
+        pf_sum=Sum('pf_sum'),
+        max_power=Max('power_max'),
+    )
+    count = stats['count'] or 0
+    return {
+        'count':     count,
+        'avg_power': stats['power_sum'] / count if count else 0,
+        'avg_pf':    stats['pf_sum'] / count if count else 0,
+        'max_power': stats['max_power'] or 0,
+    }
+
+
+def alert_stats(filters=ALL):
+    # One row per alert, so the per-status averages weigh anomalies exactly
+    # like the original `filter(alert__status=...)` aggregates did.
+    resolved = Q(status='Resolved')
+    active   = Q(status='Active')
+    stats = filters.alerts(Alert.objects.all()).aggregate(
+        total=Count('alert_id'),
+        active=Count('alert_id', filter=active),
+        resolved=Count('alert_id', filter=resolved),
+        resolved_severity=Avg('anomaly__severity', filter=resolved),
+        active_severity=Avg('anomaly__severity', filter=active),
+        resolved_power=Avg('anomaly__power', filter=resolved),
+        active_power=Avg('anomaly__power', filter=active),
+    )
+    return {key: value or 0 for key, value in stats.items()}
+
+
+# ─── 1. ENERGY SPIKES PER BUILDING ────────────────────────────────────────────
+def spike_section(filters=ALL, avg_power=None, limit=SPIKE_LIMIT):
+    if avg_power is None:
+        avg_power = reading_stats(filters)['avg_power']
+    strategy = GlobalMean(k=SPIKE_FACTOR, mean=avg_power)
+    readings = filters.readings(EnergyReading.objects.all())
+    return SpikeSummary(strategy, limit=limit, queryset=readings).top()
+
+
+# ─── 2. HOURLY OVERLOAD RISK ──────────────────────────────────────────────────
+def hourly_section(filters=ALL):
+    rows = (
+        filters.hourly_rollups(SensorHourlyRollup.objects.all())
+        .annotate(hour_of_day=ExtractHour('hour'))
+        .values('hour_of_day')
+        .annotate(
+            power_sum=Sum('power_sum'),
+            max_power=Max('power_max'),
+            reading_count=Sum('reading_count'),
+        )
+        .order_by('hour_of_day')
+    )
+    hourly_map = {row['hour_of_day']: row for row in rows}
+    result = []
+    for h in range(24):
+        row = hourly_map.get(h)
+        result.append({
+            'hour':          h,
+            'avg_power':     row['power_sum'] / row['reading_count'] if row else 0,
+            'max_power':     row['max_power'] if row else 0,
+            'reading_count': row['reading_count'] if row else 0,
+        })
+    return result
+
+
+# ─── 3. ANOMALIES BY BUILDING TYPE / ANOMALY TYPE ─────────────────────────────
+def building_type_section(filters=ALL):
+    # Grouped by the anomalies' own building column, then folded into
+    # building types, so the anomaly table is never joined.
+    per_building = (
+        filters.anomalies(Anomaly.objects.all())
+        .values_list('building_id')
+        .annotate(count=Count('anomaly_id'), severity=Sum('severity'))
+        .order_by()
+    )
+    type_names = dict(Building.objects.values_list('building_id', 'building_type__name'))
+    totals = {}
+    for building_id, count, severity in per_building:
+        total = totals.setdefault(type_names[building_id], [0, 0])
+        total[0] += count
+        total[1] += severity
+    return [
+        {'btype_name': name, 'count': count, 'avg_severity': severity / count}
+        for name, (count, severity) in sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+    ]
+
+
+def anomaly_type_section(filters=ALL):
+    return list(
+        filters.anomalies(Anomaly.objects.all())
+        .values(atype=F('anomaly_type__name'))
+        .annotate(count=Count('anomaly_id'))
+        .order_by('-count')
+    )
+
+
+# ─── 4. POWER FACTOR vs FAULT OCCURRENCE ──────────────────────────────────────
+def power_factor_section(filters=ALL, buckets=None):
+    return histogram('power_factor', filters, buckets)
+
+
+def histogram_section(field):
+    def section(filters=ALL):
+        return histogram(field, filters)
+    section.__name__ = f'{field}_histogram_section'
+    return section
+
+
+# ─── 6. ENERGY TREND ──────────────────────────────────────────────────────────
+def trend_section(filters=ALL, points=TREND_POINTS):
+    # Downsampled to at most ``points`` buckets over the filtered range, or
+    # over the last TREND_SPAN of data when no start is given.
+    readings = filters.readings(EnergyReading.objects.all())
+    end = filters.end
+    if end is None:
+        latest = readings.aggregate(latest=Max('timestamp'))['latest']
+        if latest is None:
+            return []
+        end = latest + timedelta(seconds=1)
+    start = filters.start or end - TREND_SPAN
+    rollups = filters.hourly_rollups(SensorHourlyRollup.objects.all())
+    return TrendSeries(
+        readings, rollups, start, end, points=points, compacted_before=compacted_before()
+    ).compute()
+
+
+# ─── 7. SENSOR STATUS ─────────────────────────────────────────────────────────
+def sensor_status_section(filters=ALL):
+    return list(
+        filters.sensors(Sensor.objects.all()).values('status').annotate(count=Count('sensor_id')).order_by('status')
+    )
+
+
+# ─── 8. ANOMALY SEVERITY DISTRIBUTION ─────────────────────────────────────────
+def severity_section(filters=ALL):
+    return list(
+        filters.anomalies(Anomaly.objects.all()).values('severity').annotate(count=Count('anomaly_id')).order_by('severity')
+    )
+
+
+# ─── 9. RECENT ANOMALIES ──────────────────────────────────────────────────────
+def recent_anomalies(filters=ALL, limit=RECENT_LIMIT):
+    return list(
+        filters.anomalies(Anomaly.objects.all())
+        .select_related('anomaly_type', 'building')
+        .order_by('-timestamp')[:limit]
+    )
+
+
+# ─── 10. BUILDING ENERGY OVERVIEW ─────────────────────────────────────────────
+def building_section(filters=ALL):
+    if filters.daily:
+        # No time or sensor scope: the running totals answer it in one row
+        # per building.
+        totals = {
+            row['building_id']: row
+            for row in (
+                filters.building_stats(BuildingStats.objects.all())
+                .values('building_id', 'power_sum', 'pf_sum', 'anomaly_count',
+                        max_power=F('power_max'), count=F('reading_count'))
+            )
+        }
+    else:
+        totals = {
+            row['building_id']: row
+            for row in (
+                filters.hourly_rollups(SensorHourlyRollup.objects.all())
+                .values(building_id=F('sensor__building_id'))
+                .annotate(
+                    power_sum=Sum('power_sum'),
+                    max_power=Max('power_max'),
+                    pf_sum=Sum('pf_sum'),
+                    count=Sum('reading_count'),
+                )
+                .order_by()
+            )
+        }
+        anomalies = (
+            filters.anomalies(Anomaly.objects.all())
+            .values_list('building_id')
+            .annotate(count=Count('anomaly_id'))
+            .order_by()
+        )
+        for building_id, count in anomalies:
+            totals.setdefault(building_id, {})['anomaly_count'] = count
+
+    result = []
+    buildings = filters.buildings(Building.objects.select_related('building_type'))
+    for building in buildings.order_by('building_id'):
+        data  = totals.get(building.building_id, {})
+        count = data.get('count') or 0
+        result.append({
+            'name':          building.name,
+            'type':          building.building_type.name,
+            'location':      building.location,
+            'avg_power':     round(data['power_sum'] / count if count else 0, 2),
+            'max_power':     round(data.get('max_power') or 0, 2),
+            'avg_pf':        round(data['pf_sum'] / count if count else 0, 3),
+            'reading_count': count,
+            'anomaly_count': data.get('anomaly_count', 0),
+        })
+    return result
+
+
+# ─── COUNTS ───────────────────────────────────────────────────────────────────
+def building_count(filters=ALL):
+    return filters.buildings(Building.objects.all()).count()
+
+
+def appliance_count(filters=ALL):
+    return filters.appliances(Appliance.objects.all()).count()
+
+
+# ─── DASHBOARD ────────────────────────────────────────────────────────────────
+# Each section lists the data it is derived from, so a cache can drop exactly
+# the sections a write affects (see smartguard.dashboard_cache). "fleet" covers
+# buildings, sensors, appliances and their types.
+
+SECTIONS = {
+    'reading_stats':     (reading_stats,                ('readings',)),
+    'alert_stats':       (alert_stats,                  ('alerts', 'anomalies', 'readings')),
+    'building_count':    (building_count,               ('fleet',)),
+    'appliance_count':   (appliance_count,              ('fleet',)),
+    'spikes':            (spike_section,                ('readings', 'fleet')),
+    'hourly':            (hourly_section,               ('readings',)),
+    'building_types':    (building_type_section,        ('anomalies', 'fleet')),
+    'anomaly_types':     (anomaly_type_section,         ('anomalies', 'fleet')),
+    'power_factor':      (power_factor_section,         ('readings', 'anomalies')),
+    'trend':             (trend_section,                ('readings',)),
+    'sensor_status':     (sensor_status_section,        ('fleet',)),
+    'severity':          (severity_section,             ('anomalies',)),
+    'recent_anomalies':  (recent_anomalies,             ('anomalies', 'readings', 'fleet')),
+    'buildings':         (building_section,             ('readings', 'anomalies', 'fleet')),
+    'power_histogram':   (histogram_section('power'),   ('readings', 'anomalies')),
+    'voltage_histogram': (histogram_section('voltage'), ('readings', 'anomalies')),
+    'current_histogram': (histogram_section('current'), ('readings', 'anomalies')),
+}
+
+# Section holding the histogram of each field in histograms.FIELDS.
+HISTOGRAM_SECTIONS = {
+    'power_factor': 'power_factor',
+    'power':        'power_histogram',
+    'voltage':      'voltage_histogram',
+    'current':      'current_histogram',
+}
+
+
+# Sections read by kpi_summary() and alert_effectiveness().
+KPI_SECTIONS = ('reading_stats', 'alert_stats', 'building_count', 'appliance_count', 'sensor_status', 'severity')
+
+
+def compute_section(name, filters=ALL):
+    with dashboard_reads():
+        return SECTIONS[name][0](filters)
+
+
+def kpi_summary(section):
+    readings = section('reading_stats')
+    alerts   = section('alert_stats')
+    return {
+        'total_buildings':  section('building_count'),
+        'total_sensors':    sum(r['count'] for r in section('sensor_status')),
+        'total_appliances': section('appliance_count'),
+        'total_readings':   readings['count'],
+        'total_anomalies':  sum(r['count'] for r in section('severity')),
+        'total_alerts':     alerts['total'],
+        'active_alerts':    alerts['active'],
+        'resolved_alerts':  alerts['resolved'],
+        'avg_power':        round(readings['avg_power'], 2),
+        'avg_power_factor': round(readings['avg_pf'], 3),
+        'max_power':        round(readings['max_power'], 2),
+    }
+
+
+def alert_effectiveness(section):
+    alerts = section('alert_stats')
+    return {
+        'resolved_severity': round(alerts['resolved_severity'], 2),
+        'active_severity':   round(alerts['active_severity'], 2),
+        'resolved_power':    round(alerts['resolved_power'], 2),
+        'active_power':      round(alerts['active_power'], 2),
+        'resolution_rate':   round(
+            (alerts['resolved'] / alerts['total'] * 100) if alerts['total'] > 0 else 0, 1
+        ),
+    }
+
+
+def memoized(section):
+    """Wrap a section getter so each section is fetched at most once."""
+    fetched = {}
+
+    def get(name):
+        if name not in fetched:
+            fetched[name] = section(name)
+        return fetched[name]
+    return get
+
+
+def assemble_dashboard(section):
+    """Build the dashboard payload, fetching each section through ``section(name)``."""
+    section = memoized(section)
+    return {
+        'kpi':                 kpi_summary(section),
+        'spikes':              section('spikes'),
+        'hourly':              section('hourly'),
+        'building_types':      section('building_types'),
+        'anomaly_types':       section('anomaly_types'),
+        'power_factor':        section('power_factor'),
+        'alert_effectiveness': alert_effectiveness(section),
+        'trend':               section('trend'),
+        'sensor_status':       section('sensor_status'),
+        'severity':            section('severity'),
+        'recent_anomalies':    section('recent_anomalies'),
+        'buildings':           section('buildings'),
+    }
+
+
+def compute_dashboard(filters=ALL):
+    """The full dashboard straight from the database, bypassing any cache."""
+    return assemble_dashboard(lambda name: compute_section(name, filters))
@@ -0,0 +1,166 @@
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .dashboard import SECTIONS, assemble_dashboard, compute_section
+from .filters import ALL
+
+
+# Dashboard sections are cached independently under keys that embed a version
+# number for every data source they read. A write bumps the versions of the
+# sources it touched, which orphans exactly the affected sections; unaffected
+# ones keep being served. Orphaned entries simply expire.
+#
+# Stampede protection: the first request to miss a section takes a short lock
+# (cache.add) and recomputes it. Concurrent requests get the previous value of
+# that section while it is being rebuilt, or wait for the lock holder when
+# there is no previous value yet.
+
+PREFIX  = 'smartguard:dashboard'
+MISSING = object()
+
+CACHE_DEFAULTS = {
+    'enabled':      True,
+    'alias':        'default',
+    'timeout':      300,   # seconds a section is served without a write
+    'timeouts':     {},    # per-section overrides of 'timeout'
+    'lock_timeout': 30,    # seconds before an abandoned recompute lock expires
+    'poll':         0.05,  # seconds between checks while waiting for the lock holder
+}
+
+
+def cache_options():
+    return {**CACHE_DEFAULTS, **getattr(settings, 'SMARTGUARD_DASHBOARD_CACHE', {})}
+
+
+def _cache(options):
+    return caches[options['alias']]
+
+
+def _version_key(source):
+    return f'{PREFIX}:version:{source}'
+
+
+def _modified_key(source):
+    return f'{PREFIX}:modified:{source}'
+
+
+def _versions(cache, sources):
+    keys = [_version_key(s) for s in sources]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # Start from the clock so an evicted counter never reuses a number.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        versions.append(str(found[key]))
+    return versions
+
+
+def section_key(name, filters=ALL, cache=None):
+    cache = cache or _cache(cache_options())
+    versions = '.'.join(_versions(cache, SECTIONS[name][1]))
+    return f"{PREFIX}:{name}:{filters.key()}:{versions}"
+
+
+# ─── READS ────────────────────────────────────────────────────────────────────
+def get_section(name, filters=ALL):
+    options = cache_options()
+    if not options['enabled']:
+        return compute_section(name, filters)
+
+    cache = _cache(options)
+    key = section_key(name, filters, cache)
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        return value
+
+    scope = f'{PREFIX}:{name}:{filters.key()}'
+    lock, stale = f'{scope}:lock', f'{scope}:stale'
+    if cache.add(lock, 1, options['lock_timeout']):
+        try:
+            value = compute_section(name, filters)
+            timeout = options['timeouts'].get(name, options['timeout'])
+            cache.set(key, value, timeout)
+            # Filtered scopes are open-ended, so only the unfiltered one keeps
+            # its fallback copy beyond the section timeout.
+            cache.set(stale, value, None if not filters else timeout)
+        finally:
+            cache.delete(lock)
+        return value
+
+    value = cache.get(stale, MISSING)
+    if value is not MISSING:
+        return value
+
+    deadline = time.monotonic() + options['lock_timeout']
+    while time.monotonic() < deadline:
+        time.sleep(options['poll'])
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        if cache.get(lock) is None:
+            break
+    return compute_section(name, filters)
+
+
+def cached_dashboard(filters=ALL):
+    return assemble_dashboard(lambda name: get_section(name, filters))
+
+
+# ─── CONDITIONAL GET ──────────────────────────────────────────────────────────
+def etag(names, filters=ALL):
+    """Validator for a response built from sections ``names``; None when caching is off."""
+    options = cache_options()
+    if not options['enabled']:
+        return None
+    cache = _cache(options)
+    keys = '|'.join(section_key(name, filters, cache) for name in names)
+    return hashlib.sha1(keys.encode()).hexdigest()
+
+
+def last_modified(names):
+    """Time of the latest write to any source of ``names``; None when caching is off."""
+    options = cache_options()
+    if not options['enabled']:
+        return None
+    cache = _cache(options)
+    keys = [_modified_key(s) for s in {s for name in names for s in SECTIONS[name][1]}]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Nothing recorded since the cache started: treat it as modified now.
+            cache.add(key, int(time.time()), None)
+            found[key] = cache.get(key)
+    return datetime.fromtimestamp(max(found.values()), tz=dt_timezone.utc)
+
+
+# ─── INVALIDATION ─────────────────────────────────────────────────────────────
+def _bump(sources):
+    options = cache_options()
+    if not options['enabled']:
+        return
+    cache = _cache(options)
+    for source in sources:
+        key = _version_key(source)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+        cache.set(_modified_key(source), int(time.time()), None)
+
+
+def invalidate(*sources):
+    """
+    Drop cached sections derived from ``sources`` ('readings', 'anomalies',
+    'alerts', 'fleet'). Versions are bumped now and again once the current
+    transaction commits, so a section recomputed from uncommitted state in
+    between is never served afterwards.
+    """
+    _bump(sources)
+    transaction.on_commit(lambda: _bump(sources))
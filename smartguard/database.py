@@ -0,0 +1,102 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# High-throughput SQLite. Every connection switches the file to write-ahead
+# logging, so dashboard readers and the ingest writer no longer block each
+# other, and relaxes fsync to WAL checkpoints (synchronous=NORMAL: a power cut
+# can lose the last commits but never corrupts the file). Connections are
+# kept open for CONN_MAX_AGE seconds instead of being reopened per request.
+#
+# Writers open their transactions with BEGIN IMMEDIATE, so a second writer
+# queues on busy_timeout at BEGIN rather than failing with "database is
+# locked" when it tries to upgrade a read lock mid-transaction.
+#
+# Dashboard sections are computed inside dashboard_reads(); with
+# SMARTGUARD_DASHBOARD_DATABASE naming a read-only alias of the same file,
+# DashboardRouter sends their queries there, so they run on connections that
+# never hold the write lock.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous':  'NORMAL',
+    'busy_timeout': 5000,         # milliseconds a connection waits for a lock
+    'cache_size':   -64000,       # negative: page cache in KiB per connection
+    'mmap_size':    268435456,    # bytes of the file read through mmap
+    'temp_store':   'MEMORY',
+}
+
+CONN_MAX_AGE = 600
+
+_dashboard_reads = contextvars.ContextVar('smartguard_dashboard_reads', default=False)
+
+
+def sqlite_profile(name, read_only=False, conn_max_age=CONN_MAX_AGE, **pragmas):
+    """A DATABASES entry for ``name`` with the high-throughput settings."""
+    pragmas = {**SQLITE_PRAGMAS, **pragmas}
+    options = {}
+    if read_only:
+        pragmas['query_only'] = 'ON'
+    else:
+        options['transaction_mode'] = 'IMMEDIATE'
+    options['init_command'] = '; '.join(f'PRAGMA {key}={value}' for key, value in pragmas.items())
+    database = {
+        'ENGINE':             'django.db.backends.sqlite3',
+        'NAME':               name,
+        'CONN_MAX_AGE':       conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS':            options,
+    }
+    if read_only:
+        # Tests read the default test database through this alias too.
+        database['TEST'] = {'MIRROR': DEFAULT_DB_ALIAS}
+    return database
+
+
+def dashboard_database():
+    """Alias dashboard reads are routed to, or None to use the default."""
+    return getattr(settings, 'SMARTGUARD_DASHBOARD_DATABASE', None)
+
+
+@contextmanager
+def dashboard_reads():
+    """Route the block's queries (and its worker threads') to the dashboard alias."""
+    token = _dashboard_reads.set(True)
+    try:
+        yield
+    finally:
+        _dashboard_reads.reset(token)
+
+
+class DashboardRouter:
+    """Sends reads inside dashboard_reads() to SMARTGUARD_DASHBOARD_DATABASE."""
+
+    def db_for_read(self, model, **hints):
+        alias = dashboard_database()
+        if not alias or not _dashboard_reads.get():
+            return None
+        # Inside a transaction the read must see the transaction's own
+        # writes, which only its connection can.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == dashboard_database():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        same_file = {DEFAULT_DB_ALIAS, dashboard_database()}
+        if obj1._state.db in same_file and obj2._state.db in same_file:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == dashboard_database():
+            return False
+        return None
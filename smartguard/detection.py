@@ -0,0 +1,259 @@
+import math
+import threading
+from collections import deque
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import dashboard_cache, rollups
+from .models import Sensor, EnergyReading, AnomalyType, Anomaly, Alert
+
+
+OVERLOAD = 'Overload'
+SPIKE    = 'Power Spike'
+
+ANOMALY_TYPES = {
+    OVERLOAD: 'Excessive power usage',
+    SPIKE:    'Sudden surge in power',
+}
+
+DEFAULTS = {
+    'alpha':        0.1,    # EWMA smoothing factor
+    'z_threshold':  3.0,    # deviations above the running mean that count as anomalous
+    'spike_ratio':  1.5,    # jump over the previous reading that makes it a spike
+    'min_rel_std':  0.05,   # std floor as a fraction of the mean, for flat series
+    'min_samples':  10,     # readings seen before a sensor can raise anomalies
+    'pf_window':    10,     # readings in the rolling power-factor window
+    'pf_floor':     0.8,    # rolling power factor below this raises severity
+    'warmup':       50,     # readings per sensor loaded from history on first use
+}
+
+
+def detection_options(**overrides):
+    options = {**DEFAULTS, **getattr(settings, 'SMARTGUARD_DETECTION', {})}
+    options.update(overrides)
+    return options
+
+
+def ensure_anomaly_types():
+    """AnomalyType rows used by the detectors, keyed by name."""
+    types = {}
+    for name, description in ANOMALY_TYPES.items():
+        types[name], _ = AnomalyType.objects.get_or_create(
+            name=name, defaults={'description': description}
+        )
+    return types
+
+
+def severity_for(z, z_threshold, pf_mean, pf_floor):
+    severity = 1 + int(z - z_threshold)
+    if pf_mean < pf_floor:
+        severity += 1
+    return max(1, min(5, severity))
+
+
+# ─── PER-SENSOR STATE ─────────────────────────────────────────────────────────
+class SensorState:
+    __slots__ = ('count', 'mean', 'var', 'last_power', 'pf_window', 'pf_sum')
+
+    def __init__(self, pf_window):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last_power = None
+        self.pf_window = deque(maxlen=pf_window)
+        self.pf_sum = 0.0
+
+    def update(self, power, power_factor, alpha):
+        if self.count == 0:
+            self.mean = power
+        else:
+            diff = power - self.mean
+            incr = alpha * diff
+            self.mean += incr
+            self.var = (1 - alpha) * (self.var + diff * incr)
+        self.count += 1
+        self.last_power = power
+
+        if len(self.pf_window) == self.pf_window.maxlen:
+            self.pf_sum -= self.pf_window[0]
+        self.pf_window.append(power_factor)
+        self.pf_sum += power_factor
+
+    def copy(self):
+        other = SensorState(self.pf_window.maxlen)
+        other.count, other.mean, other.var, other.last_power = self.count, self.mean, self.var, self.last_power
+        other.pf_window.extend(self.pf_window)
+        other.pf_sum = self.pf_sum
+        return other
+
+    @property
+    def pf_mean(self):
+        return self.pf_sum / len(self.pf_window) if self.pf_window else 1.0
+
+
+# ─── DETECTOR ─────────────────────────────────────────────────────────────────
+class StreamingDetector:
+    """
+    Scores readings against per-sensor EWMA statistics in O(1) per reading,
+    without re-reading history, and records Anomaly/Alert rows in bulk.
+    """
+
+    def __init__(self, **options):
+        self.options = detection_options(**options)
+        self.states = {}
+        self.lock = threading.Lock()
+        self.warmed = False
+        self._types = None
+
+    def state_for(self, sensor_id):
+        state = self.states.get(sensor_id)
+        if state is None:
+            state = self.states[sensor_id] = SensorState(self.options['pf_window'])
+        return state
+
+    def warm(self, limit=None, before=None):
+        """Seed state from the latest ``limit`` readings of every sensor."""
+        with self.lock:
+            self._warm(limit, before)
+
+    def _warm(self, limit, before):
+        limit = self.options['warmup'] if limit is None else limit
+        self.warmed = True
+        if limit <= 0:
+            return
+        readings = EnergyReading.objects.all()
+        if before is not None:
+            readings = readings.filter(timestamp__lt=before)
+        rank = Window(RowNumber(), partition_by=[F('sensor_id')], order_by=F('timestamp').desc())
+        rows = (
+            readings
+            .annotate(rank=rank)
+            .filter(rank__lte=limit)
+            .order_by('sensor_id', 'timestamp')
+            .values_list('sensor_id', 'power', 'power_factor')
+        )
+        alpha = self.options['alpha']
+        for sensor_id, power, power_factor in rows:
+            self.state_for(sensor_id).update(power, power_factor, alpha)
+
+    def score(self, reading, state=None):
+        """Classify one reading and fold it into ``state``, by default its sensor's."""
+        o = self.options
+        state = self.state_for(reading.sensor_id) if state is None else state
+        finding = None
+
+        if state.count >= o['min_samples']:
+            std = max(math.sqrt(state.var), abs(state.mean) * o['min_rel_std'], 1e-9)
+            z = (reading.power - state.mean) / std
+            if z >= o['z_threshold']:
+                sudden = (
+                    state.last_power is not None
+                    and reading.power >= state.last_power * o['spike_ratio']
+                )
+                finding = (
+                    SPIKE if sudden else OVERLOAD,
+                    severity_for(z, o['z_threshold'], state.pf_mean, o['pf_floor']),
+                    f"Power {reading.power:.0f} W is {z:.1f}σ above the running mean "
+                    f"of {state.mean:.0f} W",
+                )
+
+        state.update(reading.power, reading.power_factor, o['alpha'])
+        return finding
+
+    def process(self, readings):
+        """Return (reading, type_name, severity, description) for anomalous readings."""
+        readings = sorted(readings, key=lambda r: r.timestamp)
+        if not readings:
+            return []
+        findings, tentative = [], {}
+        with self.lock:
+            if not self.warmed:
+                # The batch is already saved, so only warm from what came before it.
+                self._warm(None, before=readings[0].timestamp)
+            # Scored against copies: sensor state only moves once the batch's
+            # transaction commits, so a rolled-back batch leaves no trace.
+            for reading in readings:
+                state = tentative.get(reading.sensor_id)
+                if state is None:
+                    state = tentative[reading.sensor_id] = self.state_for(reading.sensor_id).copy()
+                finding = self.score(reading, state)
+                if finding:
+                    findings.append((reading, *finding))
+        transaction.on_commit(partial(self._commit, readings))
+        return findings
+
+    def _commit(self, readings):
+        alpha = self.options['alpha']
+        with self.lock:
+            for reading in readings:
+                self.state_for(reading.sensor_id).update(reading.power, reading.power_factor, alpha)
+
+    def anomaly_types(self):
+        if self._types is None:
+            self._types = ensure_anomaly_types()
+        return self._types
+
+    def record(self, readings, building_ids=None):
+        """
+        Score saved readings and bulk-insert the resulting anomalies and
+        alerts. Callers that already know the sensor → building mapping can
+        pass it to skip the lookup query.
+        """
+        findings = self.process(readings)
+        if not findings:
+            return []
+        if building_ids is None:
+            building_ids = dict(
+                Sensor.objects
+                .filter(sensor_id__in={reading.sensor_id for reading, *_ in findings})
+                .values_list('sensor_id', 'building_id')
+            )
+
+        types = self.anomaly_types()
+        anomalies = Anomaly.objects.bulk_create([
+            Anomaly(
+                energy_reading=reading,
+                anomaly_type=types[type_name],
+                timestamp=reading.timestamp,
+                severity=severity,
+                description=description,
+                sensor_id=reading.sensor_id,
+                building_id=building_ids[reading.sensor_id],
+                power=reading.power,
+            )
+            for reading, type_name, severity, description in findings
+        ])
+        rollups.count_anomalies(anomaly.building_id for anomaly in anomalies)
+        Alert.objects.bulk_create([
+            Alert(
+                anomaly=anomaly,
+                status='Active',
+                message=f"{anomaly.anomaly_type.name} on sensor {anomaly.sensor_id}: "
+                        f"{anomaly.power:.0f} W",
+            )
+            for anomaly in anomalies
+        ])
+        dashboard_cache.invalidate('anomalies', 'alerts')
+        return anomalies
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = StreamingDetector()
+        return _detector
+
+
+def reset_detector():
+    global _detector
+    with _detector_lock:
+        _detector = None
@@ -0,0 +1,182 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import NotSupportedError
+from django.db.models import Count, Func, IntegerField, Max, Min, Sum, Value
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+# Fixed-size trend series for any time range. The database groups readings
+# into equal-width buckets by integer-dividing the epoch, so only one row per
+# bucket leaves it. Short ranges bucket raw readings; long ranges bucket the
+# hourly rollups, so a year costs about as much as a few hours. With NumPy
+# available the buckets are oversampled and largest-triangle-three-buckets
+# (LTTB) picks the points that best keep the shape of the curve.
+
+RAW_SPAN        = timedelta(hours=6)  # longer ranges are served from hourly rollups
+LTTB_OVERSAMPLE = 4                   # database buckets per returned point for LTTB
+HOUR            = 3600
+
+
+class Epoch(Func):
+    """Whole seconds since 1970-01-01 UTC for a datetime expression."""
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection, **extra):
+        raise NotSupportedError(f'Epoch() is not implemented for the {connection.vendor} backend.')
+
+    def as_sqlite(self, compiler, connection, **extra):
+        return super().as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)", **extra)
+
+    def as_postgresql(self, compiler, connection, **extra):
+        return super().as_sql(compiler, connection, template='CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)', **extra)
+
+    def as_mysql(self, compiler, connection, **extra):
+        return super().as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra)
+
+
+def _bucket(field, origin, width):
+    return (Epoch(field) - Value(origin)) / Value(width)
+
+
+def _epoch(moment):
+    return int(moment.timestamp())
+
+
+# ─── DATABASE BUCKETS ─────────────────────────────────────────────────────────
+def raw_buckets(readings, origin, width):
+    return (
+        readings
+        .annotate(bucket=_bucket('timestamp', origin, width))
+        .values('bucket')
+        .annotate(
+            count=Count('energyreading_id'),
+            power_sum=Sum('power'),
+            power_min=Min('power'),
+            power_max=Max('power'),
+            pf_sum=Sum('power_factor'),
+            voltage_sum=Sum('voltage'),
+            current_sum=Sum('current'),
+        )
+        .order_by('bucket')
+    )
+
+
+def rollup_buckets(rollups, origin, width):
+    return (
+        rollups
+        .annotate(bucket=_bucket('hour', origin, width))
+        .values('bucket')
+        .annotate(
+            count=Sum('reading_count'),
+            power_sum=Sum('power_sum'),
+            power_min=Min('power_min'),
+            power_max=Max('power_max'),
+            pf_sum=Sum('pf_sum'),
+            voltage_sum=Sum('voltage_sum'),
+            current_sum=Sum('current_sum'),
+        )
+        .order_by('bucket')
+    )
+
+
+def _points(rows, origin, width):
+    points = []
+    for row in rows:
+        count = row['count']
+        if not count:
+            continue
+        points.append({
+            'timestamp':    datetime.fromtimestamp(origin + (row['bucket'] + 0.5) * width, tz=dt_timezone.utc),
+            'power':        row['power_sum'] / count,
+            'power_min':    row['power_min'],
+            'power_max':    row['power_max'],
+            'power_factor': row['pf_sum'] / count,
+            'voltage':      row['voltage_sum'] / count,
+            'current':      row['current_sum'] / count,
+            'count':        count,
+        })
+    return points
+
+
+# ─── LTTB ─────────────────────────────────────────────────────────────────────
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points of (x, y) chosen by LTTB."""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        # Too few points to pick any between the endpoints.
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=np.int64)
+    every = (n - 2) / (threshold - 2)
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        chosen[i + 1] = a
+    return chosen
+
+
+# ─── SERIES ───────────────────────────────────────────────────────────────────
+class TrendSeries:
+    """
+    At most ``points`` trend points between ``start`` and ``end`` (exclusive).
+    ``method`` is 'lttb' (needs NumPy, falls back to 'minmax') or 'minmax',
+    which returns plain per-bucket average, minimum and maximum. Ranges that
+    start before ``compacted_before`` (see smartguard.retention) are always
+    served from the rollups, since their raw readings are gone.
+    """
+
+    def __init__(self, readings, rollups, start, end, points=200, method='lttb', compacted_before=None):
+        if method not in ('lttb', 'minmax'):
+            raise ValueError(f'Unknown downsampling method: {method!r}')
+        self.readings = readings
+        self.rollups = rollups
+        self.start = start
+        self.end = end
+        self.points = points
+        self.method = method if np is not None else 'minmax'
+        self.compacted_before = compacted_before
+
+    @property
+    def from_rollups(self):
+        if self.compacted_before is not None and self.start < self.compacted_before:
+            return True
+        return self.end - self.start > RAW_SPAN
+
+    def buckets(self):
+        n_buckets = self.points * (LTTB_OVERSAMPLE if self.method == 'lttb' else 1)
+        span = max(1, _epoch(self.end) - _epoch(self.start))
+        if self.from_rollups:
+            # Buckets are whole hours aligned with the rollups.
+            origin = _epoch(self.start) // HOUR * HOUR
+            width = max(1, math.ceil(span / n_buckets / HOUR)) * HOUR
+            first_hour = datetime.fromtimestamp(origin, tz=dt_timezone.utc)
+            rows = rollup_buckets(
+                self.rollups.filter(hour__gte=first_hour, hour__lt=self.end), origin, width
+            )
+        else:
+            origin = _epoch(self.start)
+            width = max(1, math.ceil(span / n_buckets))
+            rows = raw_buckets(
+                self.readings.filter(timestamp__gte=self.start, timestamp__lt=self.end),
+                origin, width,
+            )
+        return _points(rows, origin, width)
+
+    def compute(self):
+        points = self.buckets()
+        if self.method != 'lttb' or len(points) <= self.points:
+            return points
+        x = np.array([p['timestamp'].timestamp() for p in points])
+        y = np.array([p['power'] for p in points])
+        return [points[i] for i in lttb(x, y, self.points)]
@@ -0,0 +1,228 @@
+import csv
+import io
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .filters import ALL
+from .models import EnergyReading, Anomaly, Alert
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = pq = None
+
+
+# Streaming exports of readings, anomalies and alerts for a dashboard filter.
+# Rows come from a server-side cursor (QuerySet.iterator) and are encoded a
+# chunk at a time, so memory stays bounded by one chunk (CSV) or one row
+# group (Parquet) however large the export. The same generators back the
+# export endpoints, which stream them through StreamingHttpResponse, and the
+# export_data command, which writes them to a file.
+
+EXPORT_DEFAULTS = {
+    'chunk_size':     5000,     # rows fetched from the database cursor at a time
+    'row_group_size': 100_000,  # rows per Parquet row group
+}
+
+FORMATS = {
+    'csv':     'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_options(**overrides):
+    options = {**EXPORT_DEFAULTS, **getattr(settings, 'SMARTGUARD_EXPORT', {})}
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return options
+
+
+class Dataset:
+    """Model rows as flat columns: (name, ORM path, type) with type int, float, str or datetime."""
+
+    def __init__(self, model, columns, scope, ordering):
+        self.model = model
+        self.columns = columns
+        self.scope = scope
+        self.ordering = ordering
+
+    @property
+    def header(self):
+        return [name for name, _, _ in self.columns]
+
+    def rows(self, filters=ALL, chunk_size=EXPORT_DEFAULTS['chunk_size']):
+        queryset = getattr(filters, self.scope)(self.model.objects.all())
+        return (
+            queryset
+            .order_by(*self.ordering)
+            .values_list(*[path for _, path, _ in self.columns])
+            .iterator(chunk_size=chunk_size)
+        )
+
+
+DATASETS = {
+    # Ordered along the timestamp index, so the database never sorts.
+    'readings': Dataset(EnergyReading, [
+        ('energyreading_id',  'energyreading_id',                   'int'),
+        ('sensor_id',         'sensor_id',                          'int'),
+        ('building_id',       'sensor__building_id',                'int'),
+        ('timestamp',         'timestamp',                          'datetime'),
+        ('voltage',           'voltage',                            'float'),
+        ('current',           'current',                            'float'),
+        ('power',             'power',                              'float'),
+        ('power_factor',      'power_factor',                       'float'),
+    ], 'readings', ('timestamp', 'energyreading_id')),
+    'anomalies': Dataset(Anomaly, [
+        ('anomaly_id',        'anomaly_id',                         'int'),
+        ('energyreading_id',  'energy_reading_id',                  'int'),
+        ('sensor_id',         'sensor_id',                          'int'),
+        ('building_id',       'building_id',                        'int'),
+        ('anomaly_type',      'anomaly_type__name',                 'str'),
+        ('timestamp',         'timestamp',                          'datetime'),
+        ('severity',          'severity',                           'int'),
+        ('power',             'power',                              'float'),
+        ('description',       'description',                        'str'),
+    ], 'anomalies', ('timestamp', 'anomaly_id')),
+    'alerts': Dataset(Alert, [
+        ('alert_id',          'alert_id',                           'int'),
+        ('anomaly_id',        'anomaly_id',                         'int'),
+        ('sensor_id',         'anomaly__sensor_id',                 'int'),
+        ('anomaly_timestamp', 'anomaly__timestamp',                 'datetime'),
+        ('severity',          'anomaly__severity',                  'int'),
+        ('created_at',        'created_at',                         'datetime'),
+        ('status',            'status',                             'str'),
+        ('message',           'message',                            'str'),
+    ], 'alerts', ('alert_id',)),
+}
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _utc(moment):
+    return moment.astimezone(dt_timezone.utc).isoformat() if moment is not None else None
+
+
+# ─── CSV ──────────────────────────────────────────────────────────────────────
+def csv_chunks(dataset, filters=ALL, chunk_size=None):
+    """The export as CSV text, a header line and then one string per chunk of rows."""
+    options = export_options(chunk_size=chunk_size)
+    times = [i for i, (_, _, kind) in enumerate(dataset.columns) if kind == 'datetime']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(dataset.header)
+    yield drain()
+    for chunk in _chunks(dataset.rows(filters, options['chunk_size']), options['chunk_size']):
+        for row in chunk:
+            if times:
+                row = list(row)
+                for i in times:
+                    row[i] = _utc(row[i])
+            writer.writerow(row)
+        yield drain()
+
+
+# ─── PARQUET ──────────────────────────────────────────────────────────────────
+ARROW_TYPES = {
+    'int':      lambda: pa.int64(),
+    'float':    lambda: pa.float64(),
+    'str':      lambda: pa.string(),
+    'datetime': lambda: pa.timestamp('us', tz='UTC'),
+}
+
+
+class _Sink:
+    """Write-only file object that hands out what was written since the last drain."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_chunks(dataset, filters=ALL, chunk_size=None, row_group_size=None):
+    """The export as a Parquet file, yielded as bytes after every row group."""
+    if pa is None:
+        raise ValueError("Parquet exports need pyarrow.")
+    options = export_options(chunk_size=chunk_size, row_group_size=row_group_size)
+    schema = pa.schema([(name, ARROW_TYPES[kind]()) for name, _, kind in dataset.columns])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for group in _chunks(dataset.rows(filters, options['chunk_size']), options['row_group_size']):
+            columns = list(zip(*group))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(name, fmt, filters=ALL, **options):
+    """Chunks of dataset ``name`` in format ``fmt`` (see FORMATS)."""
+    if name not in DATASETS:
+        raise ValueError(f"Unknown export: {name}. Use one of {', '.join(DATASETS)}.")
+    if fmt == 'csv':
+        return csv_chunks(DATASETS[name], filters, options.get('chunk_size'))
+    if fmt == 'parquet':
+        if pa is None:
+            raise ValueError("Parquet exports need pyarrow.")
+        return parquet_chunks(DATASETS[name], filters, options.get('chunk_size'), options.get('row_group_size'))
+    raise ValueError(f"Unknown format: {fmt}. Use one of {', '.join(FORMATS)}.")
+
+
+def export_filename(name, fmt, now=None):
+    return f"{name}-{(now or datetime.now(dt_timezone.utc)):%Y%m%dT%H%M%SZ}.{fmt}"
+
+
+async def aiter_chunks(chunks):
+    """
+    Pull a synchronous chunk generator from async code one chunk at a time.
+    Every step runs on the thread-sensitive executor, so the server-side
+    cursor stays on one connection and nothing is buffered ahead.
+    """
+    step = sync_to_async(next)
+    try:
+        while (chunk := await step(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,191 @@
+import hashlib
+import re
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Sensor
+
+
+# Dashboard scope taken from the query string:
+#
+#   ?window=24h | 7d | 90m | 2w      readings from now minus the window
+#   ?start=2026-01-01&end=2026-02-01  explicit range (dates or datetimes), end exclusive
+#   ?building=7&building=8 | 7,8      building ids
+#   ?sensor_type=2                    sensor type ids
+#   ?sensor=12,13                     sensor ids
+#
+# Every filter becomes a half-open timestamp range and/or a
+# "sensor_id IN (subquery)" predicate, which the (sensor, timestamp) and
+# (timestamp) indexes serve directly.
+
+WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def parse_bound(value):
+    """Aware datetime from an ISO date or datetime; dates mean midnight."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise FilterError(f"Invalid date or datetime: {value}")
+        moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def parse_window(value):
+    match = re.fullmatch(r'\s*(\d+)\s*([mhdw])\s*', value or '')
+    if not match or int(match.group(1)) == 0:
+        raise FilterError(f"Invalid window {value!r}; use e.g. 90m, 24h, 7d or 2w.")
+    return timedelta(**{WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def parse_ids(values, name):
+    ids = set()
+    for value in values:
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                raise FilterError(f"Invalid {name} id: {part!r}")
+            ids.add(int(part))
+    return ids
+
+
+class DashboardFilter:
+    """Time range, buildings, sensor types and sensors that scope every dashboard section."""
+
+    def __init__(self, start=None, end=None, buildings=(), sensor_types=(), sensors=()):
+        if start is not None and end is not None and start >= end:
+            raise FilterError("start must be before end.")
+        self.start = start
+        self.end = end
+        self.building_ids    = tuple(sorted(set(buildings)))
+        self.sensor_type_ids = tuple(sorted(set(sensor_types)))
+        self.sensor_ids      = tuple(sorted(set(sensors)))
+
+    @classmethod
+    def from_query(cls, params, now=None):
+        start = parse_bound(params['start']) if params.get('start') else None
+        end   = parse_bound(params['end']) if params.get('end') else None
+        if params.get('window'):
+            if start is not None:
+                raise FilterError("Use either window or start, not both.")
+            # Anchor relative windows to the minute so polling clients share cache entries.
+            anchor = end or (now or timezone.now()).replace(second=0, microsecond=0) + timedelta(minutes=1)
+            start = anchor - parse_window(params['window'])
+        return cls(
+            start=start,
+            end=end,
+            buildings=parse_ids(params.getlist('building'), 'building'),
+            sensor_types=parse_ids(params.getlist('sensor_type'), 'sensor type'),
+            sensors=parse_ids(params.getlist('sensor'), 'sensor'),
+        )
+
+    def __bool__(self):
+        return bool(self.start or self.end or self.building_ids or self.sensor_type_ids or self.sensor_ids)
+
+    def key(self):
+        """Short stable identifier for cache keys."""
+        if not self:
+            return 'all'
+        raw = repr((
+            self.start and self.start.isoformat(),
+            self.end and self.end.isoformat(),
+            self.building_ids,
+            self.sensor_type_ids,
+            self.sensor_ids,
+        ))
+        return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+    def describe(self):
+        """Human-readable scope for the dashboard header."""
+        if not self:
+            return 'All readings'
+        fmt = '%Y-%m-%d %H:%M'
+        parts = []
+        if self.start and self.end:
+            parts.append(f"{timezone.localtime(self.start):{fmt}} – {timezone.localtime(self.end):{fmt}}")
+        elif self.start:
+            parts.append(f"Since {timezone.localtime(self.start):{fmt}}")
+        elif self.end:
+            parts.append(f"Until {timezone.localtime(self.end):{fmt}}")
+        if self.building_ids:
+            label = 'Building' if len(self.building_ids) == 1 else 'Buildings'
+            parts.append(f"{label} {', '.join(map(str, self.building_ids))}")
+        if self.sensor_type_ids:
+            label = 'Sensor type' if len(self.sensor_type_ids) == 1 else 'Sensor types'
+            parts.append(f"{label} {', '.join(map(str, self.sensor_type_ids))}")
+        if self.sensor_ids:
+            label = 'Sensor' if len(self.sensor_ids) == 1 else 'Sensors'
+            parts.append(f"{label} {', '.join(map(str, self.sensor_ids))}")
+        return ' · '.join(parts)
+
+    @property
+    def daily(self):
+        """Whether the per-building daily rollups (and totals) can answer this scope."""
+        return not (self.start or self.end or self.sensor_type_ids or self.sensor_ids)
+
+    # ─── PREDICATES ───────────────────────────────────────────────────────────
+    def _sensor_ids(self):
+        return self.sensors(Sensor.objects.all()).values('sensor_id')
+
+    def _scope(self, queryset, time_field=None, sensor_field=None, start=None):
+        start = start or self.start
+        lookups = {}
+        if time_field and start is not None:
+            lookups[f'{time_field}__gte'] = start
+        if time_field and self.end is not None:
+            lookups[f'{time_field}__lt'] = self.end
+        if sensor_field and (self.building_ids or self.sensor_type_ids or self.sensor_ids):
+            lookups[f'{sensor_field}__in'] = self._sensor_ids()
+        return queryset.filter(**lookups)
+
+    def readings(self, queryset):
+        return self._scope(queryset, 'timestamp', 'sensor_id')
+
+    def hourly_rollups(self, queryset):
+        # A bucket covers [hour, hour + 1h), so the start is rounded down to
+        # whole hours; windows are as precise as the rollups allow.
+        start = self.start and self.start.replace(minute=0, second=0, microsecond=0)
+        return self._scope(queryset, 'hour', 'sensor_id', start=start)
+
+    def daily_rollups(self, queryset):
+        if self.building_ids:
+            queryset = queryset.filter(building_id__in=self.building_ids)
+        return queryset
+
+    def building_stats(self, queryset):
+        return self.daily_rollups(queryset)
+
+    def anomalies(self, queryset):
+        return self._scope(queryset, 'timestamp', 'sensor_id')
+
+    def alerts(self, queryset):
+        return self._scope(queryset, 'anomaly__timestamp', 'anomaly__sensor_id')
+
+    def sensors(self, queryset):
+        if self.building_ids:
+            queryset = queryset.filter(building_id__in=self.building_ids)
+        if self.sensor_type_ids:
+            queryset = queryset.filter(sensor_type_id__in=self.sensor_type_ids)
+        if self.sensor_ids:
+            queryset = queryset.filter(sensor_id__in=self.sensor_ids)
+        return queryset
+
+    def appliances(self, queryset):
+        return self._scope(queryset, sensor_field='sensor_id')
+
+    def buildings(self, queryset):
+        if self.building_ids:
+            queryset = queryset.filter(building_id__in=self.building_ids)
+        return queryset
+
+
+ALL = DashboardFilter()
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Q, Value, When
+
+from .filters import ALL
+from .models import EnergyReading, Anomaly
+
+
+# Histograms of a reading field with, per bucket, how many of its readings
+# an anomaly points at. Buckets are contiguous, half-open ranges given by
+# their edges, [e0, e1), [e1, e2), ...; a last edge of None leaves the top
+# bucket open. Readings outside the edges are not counted.
+#
+# Each histogram is one grouped query: the bucket is a CASE over the upper
+# edges, and faults are counted with a correlated EXISTS on the anomaly
+# table's reading index, so a reading with several anomalies counts once and
+# nothing is passed to the database as a list of ids.
+#
+# Edges and labels per field come from HISTOGRAM_DEFAULTS, overridable per
+# field through SMARTGUARD_HISTOGRAMS.
+
+HISTOGRAM_DEFAULTS = {
+    'power_factor': {
+        'edges':  [0.0, 0.70, 0.80, 0.90, 0.95, 1.01],
+        'labels': [
+            'Critical (<0.70)', 'Poor (0.70–0.80)', 'Moderate (0.80–0.90)',
+            'Good (0.90–0.95)', 'Excellent (>0.95)',
+        ],
+    },
+    'power':   {'edges': [0, 250, 500, 1000, 2000, 3000, 5000, None], 'unit': 'W'},
+    'voltage': {'edges': [0, 200, 210, 220, 230, 240, 250, None],     'unit': 'V'},
+    'current': {'edges': [0, 1, 2, 5, 10, 20, None],                  'unit': 'A'},
+}
+
+FIELDS = tuple(HISTOGRAM_DEFAULTS)
+
+
+def histogram_options(field):
+    if field not in HISTOGRAM_DEFAULTS:
+        raise ValueError(f"No histogram for {field!r}. Use one of {', '.join(FIELDS)}.")
+    return {**HISTOGRAM_DEFAULTS[field], **getattr(settings, 'SMARTGUARD_HISTOGRAMS', {}).get(field, {})}
+
+
+def _label(lower, upper, unit):
+    unit = f' {unit}' if unit else ''
+    return f'≥{lower:g}{unit}' if upper is None else f'{lower:g}–{upper:g}{unit}'
+
+
+def histogram_buckets(field, edges=None, labels=None):
+    """
+    (lower, upper, label) per bucket of ``field``: the configured ones, or
+    those of ``edges`` (labels generated unless given).
+    """
+    options = histogram_options(field)
+    if edges is None:
+        edges, labels = options['edges'], labels or options.get('labels')
+    if len(edges) < 2:
+        raise ValueError("A histogram needs at least two edges.")
+    if any(e is None for e in edges[:-1]):
+        raise ValueError("Only the last edge can be open (None).")
+    bounded = edges if edges[-1] is not None else edges[:-1]
+    if any(b >= a for a, b in zip(bounded[1:], bounded)):
+        raise ValueError("Histogram edges must be strictly increasing.")
+    if labels is not None and len(labels) != len(edges) - 1:
+        raise ValueError(f"{len(edges) - 1} buckets need as many labels, not {len(labels)}.")
+    if labels is None:
+        labels = [_label(lo, hi, options.get('unit')) for lo, hi in zip(edges, edges[1:])]
+    return [(lo, hi, label) for lo, hi, label in zip(edges, edges[1:], labels)]
+
+
+def parse_edges(value):
+    """Edges from a comma-separated query parameter; 'inf' as the last one leaves it open."""
+    try:
+        edges = [float(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        edges = [float('nan')]
+    if any(edge != edge for edge in edges):
+        raise ValueError(f"Invalid histogram edges: {value!r}")
+    if edges and edges[-1] == float('inf'):
+        edges[-1] = None
+    return edges
+
+
+def histogram(field, filters=ALL, buckets=None):
+    """Readings and faulty readings per bucket of ``field`` within ``filters``."""
+    buckets = buckets or histogram_buckets(field)
+    readings = filters.readings(EnergyReading.objects.all()).filter(**{f'{field}__gte': buckets[0][0]})
+    if buckets[-1][1] is not None:
+        readings = readings.filter(**{f'{field}__lt': buckets[-1][1]})
+    # Buckets are contiguous, so the first upper edge above the value
+    # decides; the lower bound is already in the WHERE clause.
+    bucket = Case(
+        *[When(**{f'{field}__lt': hi}, then=Value(i)) for i, (_, hi, _) in enumerate(buckets[:-1])],
+        default=Value(len(buckets) - 1),
+        output_field=IntegerField(),
+    )
+    rows = (
+        readings
+        .annotate(bucket=bucket, faulty=Exists(Anomaly.objects.filter(energy_reading_id=OuterRef('pk'))))
+        .values('bucket')
+        .annotate(total=Count('energyreading_id'), faults=Count('energyreading_id', filter=Q(faulty=True)))
+        .order_by('bucket')
+    )
+    by_bucket = {row['bucket']: row for row in rows}
+
+    result = []
+    for i, (lower, upper, label) in enumerate(buckets):
+        total  = by_bucket[i]['total'] if i in by_bucket else 0
+        faults = by_bucket[i]['faults'] if i in by_bucket else 0
+        result.append({
+            'label':  label,
+            'lower':  lower,
+            'upper':  upper,
+            'total':  total,
+            'faults': faults,
+            'rate':   round((faults / total * 100) if total > 0 else 0, 2),
+        })
+    return result
@@ -0,0 +1,182 @@
+import csv
+import json
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import detection, rollups
+from .models import Sensor, EnergyReading
+
+
+KNOWN_SENSORS_KEY = 'smartguard:known-sensors'
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+# ─── SENSOR LOOKUP ────────────────────────────────────────────────────────────
+def known_sensors():
+    """Map of sensor_id → building_id, cached until a sensor is saved or deleted."""
+    sensors = cache.get(KNOWN_SENSORS_KEY)
+    if sensors is None:
+        sensors = dict(Sensor.objects.values_list('sensor_id', 'building_id'))
+        cache.set(KNOWN_SENSORS_KEY, sensors, None)
+    return sensors
+
+
+def forget_known_sensors():
+    cache.delete(KNOWN_SENSORS_KEY)
+
+
+# ─── PARSING ──────────────────────────────────────────────────────────────────
+def ndjson_rows(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            yield None
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield RowError(f"Invalid JSON: {exc}")
+            continue
+        yield row if isinstance(row, dict) else RowError("Expected a JSON object")
+
+
+def csv_rows(lines):
+    reader = csv.reader(line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [h.strip() for h in header]
+    yield None  # keep line numbers aligned with the header row
+    for values in reader:
+        if not values:
+            yield None
+        elif len(values) != len(header):
+            yield RowError(f"Expected {len(header)} columns, got {len(values)}")
+        else:
+            yield dict(zip(header, values))
+
+
+PARSERS = {
+    'application/x-ndjson': ndjson_rows,
+    'application/jsonl':    ndjson_rows,
+    'application/json':     ndjson_rows,
+    'text/csv':             csv_rows,
+}
+
+
+def _number(row, field):
+    try:
+        value = float(row[field])
+    except KeyError:
+        raise RowError(f"Missing field '{field}'")
+    except (TypeError, ValueError):
+        raise RowError(f"Field '{field}' must be a number")
+    if not math.isfinite(value):
+        raise RowError(f"Field '{field}' must be finite")
+    return value
+
+
+def build_reading(row, sensors):
+    try:
+        sensor_id = int(row['sensor_id'])
+    except KeyError:
+        raise RowError("Missing field 'sensor_id'")
+    except (TypeError, ValueError):
+        raise RowError("Field 'sensor_id' must be an integer")
+    if sensor_id not in sensors:
+        raise RowError(f"Unknown sensor {sensor_id}")
+
+    raw_timestamp = row.get('timestamp')
+    timestamp = parse_datetime(raw_timestamp) if isinstance(raw_timestamp, str) else None
+    if timestamp is None:
+        raise RowError("Field 'timestamp' must be an ISO 8601 datetime")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+
+    voltage, current, power, power_factor = (
+        _number(row, field) for field in ('voltage', 'current', 'power', 'power_factor')
+    )
+    if voltage < 0 or current < 0 or power < 0:
+        raise RowError("Voltage, current and power must not be negative")
+    if not 0 <= power_factor <= 1:
+        raise RowError("Field 'power_factor' must be between 0 and 1")
+
+    return EnergyReading(
+        sensor_id=sensor_id,
+        timestamp=timestamp,
+        voltage=voltage,
+        current=current,
+        power=power,
+        power_factor=power_factor,
+    )
+
+
+# ─── WRITING ──────────────────────────────────────────────────────────────────
+class IngestResult:
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': str(error)})
+
+    def as_dict(self):
+        return {
+            'accepted':  self.accepted,
+            'rejected':  self.rejected,
+            'errors':    self.errors,
+            'truncated': self.rejected > len(self.errors),
+        }
+
+
+def write_chunk(readings, sensors):
+    with transaction.atomic():
+        EnergyReading.objects.bulk_create(readings)
+        rollups.apply_readings(readings, building_ids=sensors)
+        if getattr(settings, 'SMARTGUARD_DETECTION_ENABLED', True):
+            detection.get_detector().record(readings, building_ids=sensors)
+
+
+def ingest(rows, chunk_size=None):
+    """
+    Validate and store parsed rows. Each chunk is written in its own
+    transaction; invalid rows are reported with their 1-based line number
+    and never abort the rest of the batch.
+    """
+    chunk_size = chunk_size or getattr(settings, 'SMARTGUARD_INGEST_CHUNK_SIZE', 5000)
+    sensors = known_sensors()
+    result = IngestResult()
+    chunk = []
+
+    for line, row in enumerate(rows, start=1):
+        if row is None:
+            continue
+        if isinstance(row, RowError):
+            result.reject(line, row)
+            continue
+        try:
+            chunk.append(build_reading(row, sensors))
+        except RowError as exc:
+            result.reject(line, exc)
+            continue
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk, sensors)
+            result.accepted += len(chunk)
+            chunk = []
+
+    if chunk:
+        write_chunk(chunk, sensors)
+        result.accepted += len(chunk)
+    return result
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Max
+
+from .dashboard import kpi_summary, memoized
+from .dashboard_cache import get_section
+from .models import EnergyReading, Alert
+
+
+# Live dashboard feed. One producer task per process polls the database for
+# new alerts, the latest reading of every sensor that reported and changed
+# KPIs, then fans each event out to every connected viewer's queue. Viewers
+# never query the database themselves, so a hundred open dashboards cost the
+# same as one.
+#
+# A failed poll is logged and retried with exponential back-off; viewers get a
+# "status" event when the feed stalls and again when it recovers.
+
+LIVE_DEFAULTS = {
+    'interval':    2.0,   # seconds between producer polls
+    'heartbeat':   15.0,  # seconds of silence before a keep-alive comment
+    'queue_size':  100,   # events buffered per viewer; the oldest are dropped first
+    'max_alerts':  50,    # new alerts sent per poll
+    'max_backoff': 60.0,  # longest wait between polls after repeated failures
+}
+
+logger = logging.getLogger('smartguard.live')
+
+
+def live_options():
+    return {**LIVE_DEFAULTS, **getattr(settings, 'SMARTGUARD_LIVE', {})}
+
+
+def format_event(event, data, event_id=None):
+    """One Server-Sent Events message."""
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+# ─── POLLING ──────────────────────────────────────────────────────────────────
+class FeedPoller:
+    """Turns database changes since the previous poll into (event, data) pairs."""
+
+    def __init__(self, max_alerts=50):
+        self.max_alerts = max_alerts
+        self.last_alert = 0
+        self.last_reading = 0
+        self.kpi = None
+
+    def kpi_snapshot(self):
+        # Served from the dashboard cache; recomputed only after writes.
+        return kpi_summary(memoized(get_section))
+
+    def prime(self):
+        """Start from the current state so nothing historical is replayed."""
+        self.last_alert = Alert.objects.aggregate(m=Max('alert_id'))['m'] or 0
+        self.last_reading = EnergyReading.objects.aggregate(m=Max('energyreading_id'))['m'] or 0
+        self.kpi = self.kpi_snapshot()
+
+    def new_alerts(self):
+        alerts = list(
+            Alert.objects
+            .filter(alert_id__gt=self.last_alert)
+            .select_related('anomaly__anomaly_type', 'anomaly__building')
+            .order_by('alert_id')[:self.max_alerts]
+        )
+        if alerts:
+            self.last_alert = alerts[-1].alert_id
+        return [
+            {
+                'alert_id':    a.alert_id,
+                'anomaly_id':  a.anomaly_id,
+                'status':      a.status,
+                'message':     a.message,
+                'created_at':  a.created_at,
+                'type':        a.anomaly.anomaly_type.name,
+                'severity':    a.anomaly.severity,
+                'description': a.anomaly.description,
+                'timestamp':   a.anomaly.timestamp,
+                'sensor_id':   a.anomaly.sensor_id,
+                'building':    a.anomaly.building.name,
+            }
+            for a in alerts
+        ]
+
+    def latest_readings(self):
+        latest_ids = dict(
+            EnergyReading.objects
+            .filter(energyreading_id__gt=self.last_reading)
+            .values_list('sensor_id')
+            .annotate(last_id=Max('energyreading_id'))
+            .order_by()
+        )
+        if not latest_ids:
+            return []
+        self.last_reading = max(latest_ids.values())
+        return list(
+            EnergyReading.objects
+            .filter(energyreading_id__in=latest_ids.values())
+            .order_by('sensor_id')
+            .values('sensor_id', 'timestamp', 'power', 'power_factor', 'voltage', 'current')
+        )
+
+    def kpi_delta(self):
+        kpi = self.kpi_snapshot()
+        previous, self.kpi = self.kpi, kpi
+        changed = {key: value for key, value in kpi.items() if previous is None or previous.get(key) != value}
+        if not changed:
+            return None
+        delta = {
+            key: round(value - previous[key], 3)
+            for key, value in changed.items()
+            if previous is not None and isinstance(value, (int, float))
+        }
+        return {'kpi': changed, 'delta': delta}
+
+    def poll(self):
+        close_old_connections()
+        events = [('alert', alert) for alert in self.new_alerts()]
+        readings = self.latest_readings()
+        if readings:
+            events.append(('readings', readings))
+        kpi = self.kpi_delta()
+        if kpi:
+            events.append(('kpi', kpi))
+        return events
+
+
+# ─── FAN-OUT ──────────────────────────────────────────────────────────────────
+class Subscription:
+    """A viewer's bounded event queue, bound to the event loop that created it."""
+
+    def __init__(self, broker, size):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+        self.dropped = 0
+
+    def push(self, message):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._put(message)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        """Next message, or None after ``timeout`` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LiveBroker:
+    """In-process pub/sub: one producer, any number of subscribers."""
+
+    def __init__(self, **options):
+        self.options = {**live_options(), **options}
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.producer = None
+        self.sequence = 0
+
+    def subscribe(self):
+        subscription = Subscription(self, self.options['queue_size'])
+        with self.lock:
+            self.subscribers.add(subscription)
+            if self.producer is None or self.producer.done():
+                self.producer = asyncio.get_running_loop().create_task(self.produce())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        """Serialize once and hand the message to every subscriber."""
+        with self.lock:
+            self.sequence += 1
+            message = format_event(event, data, self.sequence)
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.push(message)
+        return message
+
+    async def produce(self, poller=None):
+        poller = poller or FeedPoller(self.options['max_alerts'])
+        primed, failures = False, 0
+        while self.subscribers:
+            try:
+                if primed:
+                    events = await sync_to_async(poller.poll)()
+                else:
+                    await sync_to_async(poller.prime)()
+                    primed, events = True, []
+            except Exception:
+                failures += 1
+                logger.exception("Live feed poll failed (%d in a row)", failures)
+                if failures == 1:
+                    self.publish('status', {'ok': False})
+            else:
+                if failures:
+                    failures = 0
+                    self.publish('status', {'ok': True})
+                for event, data in events:
+                    self.publish(event, data)
+            await asyncio.sleep(min(self.options['interval'] * 2 ** failures, self.options['max_backoff']))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = LiveBroker()
+        return _broker
+
+
+def reset_broker():
+    global _broker
+    with _broker_lock:
+        _broker = None
+
+
+async def event_stream(subscription, heartbeat):
+    """Async iterator of SSE text for one viewer; unsubscribes when the client goes away."""
+    try:
+        yield f"retry: {int(live_options()['interval'] * 1000) * 2}\n\n"
+        while True:
+            message = await subscription.get(heartbeat)
+            yield message if message is not None else ': keep-alive\n\n'
+    finally:
+        subscription.close()
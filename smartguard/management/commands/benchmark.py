@@ -0,0 +1,79 @@
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from smartguard.benchmarks import SCALES, compare, populate, run_description, run_suite, use_scratch_database
+from smartguard.models import EnergyReading
+
+
+class Command(BaseCommand):
+    help = 'Time the analytics page, dashboard sections, ingestion and detection on synthetic datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default=','.join(SCALES),
+                            help=f"Comma-separated dataset sizes out of {', '.join(SCALES)}.")
+        parser.add_argument('--sensors', type=int, default=200)
+        parser.add_argument('--scratch-dir', default=str(settings.BASE_DIR),
+                            help='Directory for the bench-<scale>.sqlite3 datasets.')
+        parser.add_argument('--reuse', action='store_true',
+                            help='Reuse existing scratch datasets instead of regenerating them.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per timing; the best is kept.')
+        parser.add_argument('--ingest-rows', type=int, default=10_000)
+        parser.add_argument('--detect-rows', type=int, default=100_000)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Earlier results to compare against.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed slowdown before a timing counts as a regression (0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        scales = [s.strip() for s in options['scales'].split(',') if s.strip()]
+        unknown = [s for s in scales if s not in SCALES]
+        if unknown:
+            raise CommandError(f"Unknown scale(s): {', '.join(unknown)}. Use {', '.join(SCALES)}.")
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline: {exc}")
+
+        configured = Path(connection.settings_dict['NAME']).resolve()
+        results = {'run': run_description(), 'scales': {}}
+        for scale in scales:
+            scratch = Path(options['scratch_dir']) / f'bench-{scale}.sqlite3'
+            if scratch.resolve() == configured:
+                raise CommandError("The scratch file must not be the configured database.")
+            if not options['reuse'] and scratch.exists():
+                scratch.unlink()
+
+            use_scratch_database(scratch)
+            call_command('migrate', verbosity=0)
+            if not EnergyReading.objects.exists():
+                self.stdout.write(f"Generating {SCALES[scale]:,} readings in {scratch}...")
+                started = time.perf_counter()
+                populate(SCALES[scale], options['sensors'])
+                self.stdout.write(f"  done in {time.perf_counter() - started:.1f}s.")
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Scale {scale}"))
+            run = run_suite(options['repeat'], options['ingest_rows'], options['detect_rows'])
+            results['scales'][scale] = run
+            for name, m in run['metrics'].items():
+                digits = 0 if m['unit'] == 'queries' else 1
+                self.stdout.write(f"  {name:<40} {m['value']:>14,.{digits}f} {m['unit']}")
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            for scale, name, old, new in regressions:
+                self.stdout.write(self.style.ERROR(f"  {scale} {name}: {old:,.1f} → {new:,.1f}"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} metric(s) regressed against {options['baseline']}.")
+            self.stdout.write(self.style.SUCCESS(f"✅ No regressions against {options['baseline']}."))
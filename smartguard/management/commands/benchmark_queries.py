@@ -0,0 +1,106 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from smartguard.benchmarks import populate, use_scratch_database
+from smartguard.dashboard import compute_dashboard
+from smartguard.models import EnergyReading, Anomaly, Alert
+from smartguard.profiling import profiled
+
+
+INDEXED_MODELS = (EnergyReading, Anomaly, Alert)
+
+
+def capture_dashboard_queries():
+    # Sections read through the dashboard alias (and on worker threads), so
+    # the statements are collected from every connection, not just the default.
+    with profiled() as profile:
+        compute_dashboard()
+    return [(sql, params) for sql, params, _ in profile.queries]
+
+
+def explain(sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        rows = cursor.fetchall()
+    return [row[-1] if connection.vendor == 'sqlite' else row[0] for row in rows]
+
+
+def timed(sql, params, repeat):
+    best = float('inf')
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def set_indexes(present):
+    with connection.schema_editor() as editor:
+        for model in INDEXED_MODELS:
+            for index in model._meta.indexes:
+                if present:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans and timings for every analytics dashboard query, without and with the hot-path indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000, help='Synthetic readings to generate.')
+        parser.add_argument('--sensors', type=int, default=200)
+        parser.add_argument('--scratch', default=str(Path(settings.BASE_DIR) / 'bench.sqlite3'),
+                            help='SQLite file that holds the synthetic dataset.')
+        parser.add_argument('--reuse', action='store_true',
+                            help='Reuse an existing scratch dataset instead of regenerating it.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per query; the best time is reported.')
+
+    def handle(self, *args, **options):
+        scratch = Path(options['scratch'])
+        if scratch.resolve() == Path(connection.settings_dict['NAME']).resolve():
+            raise CommandError("The scratch file must not be the configured database.")
+        if not options['reuse'] and scratch.exists():
+            scratch.unlink()
+
+        use_scratch_database(scratch)
+        call_command('migrate', verbosity=0)
+        if not EnergyReading.objects.exists():
+            self.stdout.write(f"Generating {options['rows']:,} readings in {scratch}...")
+            started = time.perf_counter()
+            stats = populate(options['rows'], options['sensors'])
+            self.stdout.write(
+                f"Generated {stats['readings']:,} readings and {stats['anomalies']:,} anomalies "
+                f"in {time.perf_counter() - started:.1f}s."
+            )
+
+        queries = capture_dashboard_queries()
+        set_indexes(present=False)
+        before = [(explain(sql, params), timed(sql, params, options['repeat'])) for sql, params in queries]
+        set_indexes(present=True)
+        after = [(explain(sql, params), timed(sql, params, options['repeat'])) for sql, params in queries]
+
+        total_before = total_after = 0
+        for i, ((sql, _), (plan_b, ms_b), (plan_a, ms_a)) in enumerate(zip(queries, before, after), start=1):
+            total_before += ms_b
+            total_after += ms_a
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Q{i}: {ms_b:9.1f} ms → {ms_a:9.1f} ms"))
+            self.stdout.write(f"  {' '.join(sql.split())[:160]}")
+            self.stdout.write("  before:")
+            for line in plan_b:
+                self.stdout.write(f"    {line}")
+            self.stdout.write("  after:")
+            for line in plan_a:
+                self.stdout.write(f"    {line}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(queries)} queries: {total_before:.1f} ms without indexes, {total_after:.1f} ms with indexes."
+        ))
@@ -0,0 +1,74 @@
+import shutil
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from smartguard.benchmarks import bench_concurrent, populate, sqlite_settings, use_scratch_database
+from smartguard.models import EnergyReading
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent ingest and dashboard throughput with stock and high-throughput SQLite settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help='Readings in the generated dataset.')
+        parser.add_argument('--sensors', type=int, default=200)
+        parser.add_argument('--scratch-dir', default=str(settings.BASE_DIR),
+                            help='Directory for the bench-sqlite.sqlite3 dataset and its working copies.')
+        parser.add_argument('--reuse', action='store_true',
+                            help='Reuse an existing scratch dataset instead of regenerating it.')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each run.')
+        parser.add_argument('--readers', type=int, default=4, help='Threads computing dashboard sections.')
+        parser.add_argument('--read-interval', type=float, default=0.05,
+                            help='Seconds between the sections each reader computes; 0 reads back to back.')
+        parser.add_argument('--batch', type=int, default=200, help='Readings per ingest request.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark compares SQLite settings.")
+        scratch = Path(options['scratch_dir']) / 'bench-sqlite.sqlite3'
+        if scratch.resolve() == Path(connection.settings_dict['NAME']).resolve():
+            raise CommandError("The scratch file must not be the configured database.")
+        if not options['reuse'] and scratch.exists():
+            scratch.unlink()
+
+        use_scratch_database(scratch)
+        call_command('migrate', verbosity=0)
+        if not EnergyReading.objects.exists():
+            self.stdout.write(f"Generating {options['rows']:,} readings in {scratch}...")
+            started = time.perf_counter()
+            populate(options['rows'], options['sensors'])
+            self.stdout.write(f"  done in {time.perf_counter() - started:.1f}s.")
+        # Closing the last connection checkpoints the WAL into the file.
+        connections.close_all()
+
+        runs = {}
+        for mode, tuned in (('stock', False), ('tuned', True)):
+            # Every run starts from an identical copy, since writes are kept.
+            work = scratch.with_name(f'bench-sqlite-{mode}.sqlite3')
+            shutil.copyfile(scratch, work)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{mode}: 1 writer, {options['readers']} readers, {options['seconds']:g}s"
+            ))
+            try:
+                with sqlite_settings(work, tuned):
+                    runs[mode] = bench_concurrent(
+                        options['seconds'], options['readers'], options['batch'], options['read_interval'],
+                    )
+            finally:
+                for path in (work, Path(f'{work}-wal'), Path(f'{work}-shm')):
+                    path.unlink(missing_ok=True)
+            for name, m in runs[mode].items():
+                self.stdout.write(f"  {name:<28} {m['value']:>12,.1f} {m['unit']}")
+
+        stock, tuned = (runs[mode] for mode in ('stock', 'tuned'))
+        self.stdout.write(self.style.MIGRATE_HEADING("tuned / stock"))
+        for name in ('concurrent.writes_per_s', 'concurrent.reads_per_s', 'concurrent.read_p95_ms'):
+            before = stock[name]['value']
+            ratio = f"{tuned[name]['value'] / before:.2f}x" if before else 'n/a'
+            self.stdout.write(f"  {name:<28} {ratio:>12}")
+        self.stdout.write(self.style.SUCCESS("✅ SQLite benchmark complete."))
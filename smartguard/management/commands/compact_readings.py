@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from smartguard.retention import ARCHIVE_FORMATS, Compactor, retention_options
+
+
+class Command(BaseCommand):
+    help = ('Fold raw energy readings older than the retention age into the rollups and delete them, '
+            'keeping readings referenced by anomalies. Safe to run from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, metavar='DAYS',
+                            help=f"Retention age in days (default {retention_options()['raw_age_days']}).")
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction.')
+        parser.add_argument('--pause', type=float, help='Seconds to wait between batches.')
+        parser.add_argument('--archive-dir', help='Archive every deleted batch to this directory first.')
+        parser.add_argument('--format', choices=ARCHIVE_FORMATS, help='Archive file format.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted.')
+
+    def handle(self, *args, **options):
+        if options['older_than'] is not None and options['older_than'] < 1:
+            raise CommandError("--older-than must be at least 1 day.")
+        try:
+            compactor = Compactor(
+                older_than=timedelta(days=options['older_than']) if options['older_than'] else None,
+                batch_size=options['batch_size'],
+                archive_dir=options['archive_dir'],
+                archive_format=options['format'],
+                pause=options['pause'],
+                dry_run=options['dry_run'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f"Compacting raw readings before {compactor.cutoff:%Y-%m-%d %H:%M %Z}...")
+        verbose = options['verbosity'] > 1
+        stats = compactor.run(
+            progress=(lambda s: self.stdout.write(f"  {s['deleted']:,} deleted in {s['batches']} batches"))
+            if verbose else None
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Would delete {stats['deleted']:,} readings and keep {stats['kept']:,} referenced by anomalies."
+            ))
+            return
+        archived = f", {stats['archived_files']} archive files" if stats['archived_files'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Deleted {stats['deleted']:,} readings in {stats['batches']} batches{archived}; "
+            f"kept {stats['kept']:,} referenced by anomalies."
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from smartguard.columnar import default_root, export, month_start, next_month
+from smartguard.filters import parse_ids
+
+
+class Command(BaseCommand):
+    help = ('Export raw energy readings to the memory-mapped columnar archive, one directory per '
+            'sensor and UTC month; existing months are replaced. Run it before compact_readings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', help=f'Archive directory (default {default_root()}).')
+        parser.add_argument('--start', help='First month to export (YYYY-MM). Defaults to all history.')
+        parser.add_argument('--end', help='Last month to export (YYYY-MM), inclusive.')
+        parser.add_argument('--sensor', action='append', default=[], help='Sensor id(s); repeat or comma-separate.')
+        parser.add_argument('--chunk-size', type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        try:
+            start = month_start(options['start']) if options['start'] else None
+            end = next_month(options['end']) if options['end'] else None
+            sensor_ids = parse_ids(options['sensor'], 'sensor')
+        except ValueError as exc:
+            raise CommandError(f"Invalid argument: {exc}")
+
+        verbose = options['verbosity'] > 1
+        try:
+            partitions = export(
+                options['root'], sensor_ids, start, end, chunk_size=options['chunk_size'],
+                progress=(lambda m: self.stdout.write(f"  sensor {m['sensor_id']} {m['month']}: {m['rows']:,} rows"))
+                if verbose else None,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        rows = sum(p['rows'] for p in partitions)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Exported {rows:,} readings into {len(partitions)} sensor-month partitions "
+            f"under {options['root'] or default_root()}."
+        ))
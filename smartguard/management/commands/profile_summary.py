@@ -0,0 +1,53 @@
+import sys
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+
+from smartguard.profiling import read_profiles, summarise
+
+
+class Command(BaseCommand):
+    help = 'Summarise the request profiles logged by QueryProfilingMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='*', help='Log files to read. Defaults to standard input.')
+        parser.add_argument('--by', choices=('route', 'path'), default='route',
+                            help='Group requests by URL pattern or by concrete path.')
+        parser.add_argument('--top', type=int, default=10, help='Rows per table.')
+
+    def handle(self, *args, **options):
+        try:
+            files = [open(path, encoding='utf-8') for path in options['logs']] or [sys.stdin]
+        except OSError as exc:
+            raise CommandError(f"Cannot read log: {exc}")
+        try:
+            summary = summarise(read_profiles(chain.from_iterable(files)), by=options['by'])
+        finally:
+            for f in files:
+                if f is not sys.stdin:
+                    f.close()
+
+        if not summary['endpoints']:
+            raise CommandError("No request profiles found.")
+
+        top = options['top']
+        self.stdout.write(self.style.MIGRATE_HEADING("Endpoints (slowest p95 first)"))
+        self.stdout.write(
+            f"  {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'queries':>8} "
+            f"{'max q':>6} {'sql ms':>9} {'render':>8} {'dups':>6}  endpoint"
+        )
+        for row in summary['endpoints'][:top]:
+            self.stdout.write(
+                f"  {row['requests']:>8} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['max_ms']:>9.1f} "
+                f"{row['avg_queries']:>8.1f} {row['max_queries']:>6} {row['avg_sql_ms']:>9.1f} "
+                f"{row['avg_render_ms']:>8.1f} {row['duplicates']:>6}  {row['endpoint']}"
+            )
+
+        if summary['repeated']:
+            self.stdout.write(self.style.MIGRATE_HEADING("Repeated statements (possible N+1 loops)"))
+            for sql, count in summary['repeated'][:top]:
+                self.stdout.write(f"  {count:>8}×  {sql[:160]}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Slowest statements"))
+        for sql, ms in summary['slowest'][:top]:
+            self.stdout.write(f"  {ms:>8.1f} ms  {sql[:160]}")
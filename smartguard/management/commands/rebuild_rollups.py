@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from smartguard import batch, rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly sensor and daily building rollups from raw energy readings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD). Defaults to all history.')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD), inclusive.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int,
+                            help='Worker processes that split the days between them (default 1).')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end   = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+
+        try:
+            workers = batch.batch_options(workers=options['workers'])['workers']
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write("Rebuilding rollups...")
+        if workers == 1:
+            hourly, daily = rollups.rebuild(start, end, batch_size=options['batch_size'])
+        else:
+            stats = batch.parallel_rebuild(
+                start, end, workers=workers, batch_size=options['batch_size'],
+                progress=lambda report: self.stdout.write(f"  {report}"),
+            )
+            hourly, daily = stats['hourly_rows'], stats['daily_rows']
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {hourly} hourly sensor rollups and {daily} daily building rollups."
+        ))
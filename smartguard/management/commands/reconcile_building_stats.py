@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from smartguard import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-building totals from rollups, anomalies and readings, fixing any drift'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling building totals...")
+        buildings, drifted = rollups.rebuild_building_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Checked {buildings} buildings; rewrote {drifted} totals rows."
+        ))
@@ -0,0 +1,78 @@
+# Generated by Django 6.0.2 on 2026-10-17 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncHour
+
+
+def populate_rollups(apps, schema_editor):
+    """Roll up the readings already stored, as rebuild_rollups would."""
+    EnergyReading = apps.get_model('smartguard', 'EnergyReading')
+    stats = {
+        'reading_count': Count('energyreading_id'),
+        'power_sum':     Sum('power'),
+        'power_sq_sum':  Sum(F('power') * F('power')),
+        'power_min':     Min('power'),
+        'power_max':     Max('power'),
+        'pf_sum':        Sum('power_factor'),
+    }
+    targets = (
+        (apps.get_model('smartguard', 'SensorHourlyRollup'),
+         EnergyReading.objects.values('sensor_id', hour=TruncHour('timestamp'))),
+        (apps.get_model('smartguard', 'BuildingDailyRollup'),
+         EnergyReading.objects.values(building_id=F('sensor__building_id'), day=TruncDate('timestamp'))),
+    )
+    for model, grouping in targets:
+        batch = []
+        for row in grouping.annotate(**stats).order_by().iterator(chunk_size=2000):
+            batch.append(model(**row))
+            if len(batch) >= 1000:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartguard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildingDailyRollup',
+            fields=[
+                ('rollup_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('reading_count', models.IntegerField(default=0)),
+                ('power_sum', models.FloatField(default=0)),
+                ('power_sq_sum', models.FloatField(default=0)),
+                ('power_min', models.FloatField()),
+                ('power_max', models.FloatField()),
+                ('pf_sum', models.FloatField(default=0)),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='smartguard.building')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('building', 'day'), name='unique_building_day_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SensorHourlyRollup',
+            fields=[
+                ('rollup_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('hour', models.DateTimeField()),
+                ('reading_count', models.IntegerField(default=0)),
+                ('power_sum', models.FloatField(default=0)),
+                ('power_sq_sum', models.FloatField(default=0)),
+                ('power_min', models.FloatField()),
+                ('power_max', models.FloatField()),
+                ('pf_sum', models.FloatField(default=0)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='smartguard.sensor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sensor', 'hour'), name='unique_sensor_hour_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
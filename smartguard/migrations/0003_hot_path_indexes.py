@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartguard', '0002_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['status'], name='alert_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['timestamp'], name='anomaly_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='energyreading',
+            index=models.Index(fields=['sensor', 'timestamp'], name='reading_sensor_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='energyreading',
+            index=models.Index(fields=['sensor', 'power'], name='reading_sensor_power_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='energyreading',
+            index=models.Index(fields=['timestamp'], name='reading_time_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate, TruncHour
+
+
+def backfill_sums(apps, schema_editor):
+    """Fill voltage/current sums of existing rollup rows from raw readings."""
+    EnergyReading = apps.get_model('smartguard', 'EnergyReading')
+    targets = (
+        (apps.get_model('smartguard', 'SensorHourlyRollup'), ('sensor_id', 'hour'),
+         EnergyReading.objects.values('sensor_id', hour=TruncHour('timestamp'))),
+        (apps.get_model('smartguard', 'BuildingDailyRollup'), ('building_id', 'day'),
+         EnergyReading.objects.values(building_id=F('sensor__building_id'), day=TruncDate('timestamp'))),
+    )
+    for model, key_fields, grouping in targets:
+        rows = {tuple(getattr(r, f) for f in key_fields): r for r in model.objects.all()}
+        sums = (
+            grouping
+            .annotate(voltage_sum=Sum('voltage'), current_sum=Sum('current'))
+            .order_by()
+        )
+        changed = []
+        for group in sums.iterator(chunk_size=2000):
+            row = rows.get(tuple(group[f] for f in key_fields))
+            if row is not None:
+                row.voltage_sum, row.current_sum = group['voltage_sum'], group['current_sum']
+                changed.append(row)
+        model.objects.bulk_update(changed, ['voltage_sum', 'current_sum'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartguard', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buildingdailyrollup',
+            name='current_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='buildingdailyrollup',
+            name='voltage_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sensorhourlyrollup',
+            name='current_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sensorhourlyrollup',
+            name='voltage_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_sums, migrations.RunPython.noop),
+    ]
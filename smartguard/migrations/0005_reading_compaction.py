@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartguard', '0004_rollup_voltage_current'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingCompaction',
+            fields=[
+                ('compaction_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('compacted_before', models.DateTimeField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('deleted', models.BigIntegerField(default=0)),
+                ('kept', models.BigIntegerField(default=0)),
+                ('archived_files', models.IntegerField(default=0)),
+                ('archive_dir', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+    ]
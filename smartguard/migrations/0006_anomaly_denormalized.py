@@ -0,0 +1,62 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_readings(apps, schema_editor):
+    """Copy each anomaly's sensor, building and power from its reading."""
+    EnergyReading = apps.get_model('smartguard', 'EnergyReading')
+    Anomaly = apps.get_model('smartguard', 'Anomaly')
+    reading = EnergyReading.objects.filter(pk=OuterRef('energy_reading_id'))
+    Anomaly.objects.update(
+        sensor=Subquery(reading.values('sensor_id')[:1]),
+        building=Subquery(reading.values('sensor__building_id')[:1]),
+        power=Subquery(reading.values('power')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartguard', '0005_reading_compaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomaly',
+            name='building',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='smartguard.building'),
+        ),
+        migrations.AddField(
+            model_name='anomaly',
+            name='power',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='anomaly',
+            name='sensor',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='smartguard.sensor'),
+        ),
+        migrations.RunPython(backfill_readings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='anomaly',
+            name='building',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='smartguard.building'),
+        ),
+        migrations.AlterField(
+            model_name='anomaly',
+            name='power',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='anomaly',
+            name='sensor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='smartguard.sensor'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['sensor', 'timestamp'], name='anomaly_sensor_time_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def populate_stats(apps, schema_editor):
+    """One totals row per building, from the daily rollups, anomalies and raw readings."""
+    Building = apps.get_model('smartguard', 'Building')
+    BuildingStats = apps.get_model('smartguard', 'BuildingStats')
+    totals = {
+        row.pop('building_id'): row
+        for row in (
+            apps.get_model('smartguard', 'BuildingDailyRollup').objects
+            .values('building_id')
+            .annotate(
+                reading_count=Sum('reading_count'), power_sum=Sum('power_sum'),
+                power_max=Max('power_max'), pf_sum=Sum('pf_sum'),
+            )
+            .order_by()
+        )
+    }
+    anomalies = dict(
+        apps.get_model('smartguard', 'Anomaly').objects
+        .values_list('building_id').annotate(Count('anomaly_id')).order_by()
+    )
+    last_readings = dict(
+        apps.get_model('smartguard', 'EnergyReading').objects
+        .values_list('sensor__building_id').annotate(Max('timestamp')).order_by()
+    )
+    BuildingStats.objects.bulk_create([
+        BuildingStats(
+            building_id=building_id,
+            anomaly_count=anomalies.get(building_id, 0),
+            last_reading_at=last_readings.get(building_id),
+            **totals.get(building_id, {}),
+        )
+        for building_id in Building.objects.values_list('building_id', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartguard', '0006_anomaly_denormalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildingStats',
+            fields=[
+                ('stats_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('reading_count', models.BigIntegerField(default=0)),
+                ('power_sum', models.FloatField(default=0)),
+                ('power_max', models.FloatField(blank=True, null=True)),
+                ('pf_sum', models.FloatField(default=0)),
+                ('anomaly_count', models.BigIntegerField(default=0)),
+                ('last_reading_at', models.DateTimeField(blank=True, null=True)),
+                ('building', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='smartguard.building')),
+            ],
+            options={
+                'verbose_name_plural': 'building stats',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
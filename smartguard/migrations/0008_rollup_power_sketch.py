@@ -0,0 +1,88 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:05
+
+import math
+from datetime import timedelta
+from itertools import islice
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# A frozen copy of the smartguard.sketches bucketing this migration was
+# written against (relative accuracy 0.01), so later changes to the app code
+# never change what the backfill writes.
+RELATIVE_ACCURACY = 0.01
+LOG_GAMMA = math.log((1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY))
+
+
+def sketch_dict(values):
+    """The stored form of a sketch of ``values``."""
+    bins, zero = {}, 0
+    for value in values:
+        if value > 0:
+            key = math.ceil(math.log(value) / LOG_GAMMA)
+            bins[key] = bins.get(key, 0) + 1
+        else:
+            zero += 1
+    keys = sorted(bins)
+    return {
+        'keys':   keys,
+        'counts': [bins[key] for key in keys],
+        'zero':   zero,
+        'min':    min(values),
+        'max':    max(values),
+    }
+
+
+def hourly_power(rows, tz):
+    """((sensor_id, hour), powers) from (sensor_id, timestamp, power) rows sorted by sensor and time."""
+    key, values, end = None, None, None
+    for sensor_id, timestamp, power in rows:
+        if values is None or sensor_id != key[0] or not key[1] <= timestamp < end:
+            if values is not None:
+                yield key, values
+            hour = timestamp.astimezone(tz).replace(minute=0, second=0, microsecond=0)
+            key, values, end = (sensor_id, hour), [], hour + timedelta(hours=1)
+        values.append(power)
+    if values is not None:
+        yield key, values
+
+
+def backfill_sketches(apps, schema_editor):
+    """Sketch every hourly rollup whose raw readings are all still there."""
+    EnergyReading = apps.get_model('smartguard', 'EnergyReading')
+    SensorHourlyRollup = apps.get_model('smartguard', 'SensorHourlyRollup')
+    hours = hourly_power(
+        EnergyReading.objects
+        .order_by('sensor_id', 'timestamp')
+        .values_list('sensor_id', 'timestamp', 'power')
+        .iterator(chunk_size=10000),
+        timezone.get_current_timezone(),
+    )
+    while batch := dict(islice(hours, 1000)):
+        rows = SensorHourlyRollup.objects.filter(
+            sensor_id__in={key[0] for key in batch}, hour__in={key[1] for key in batch},
+        )
+        changed = []
+        for row in rows:
+            values = batch.get((row.sensor_id, row.hour))
+            if values is not None and len(values) == row.reading_count:
+                row.power_sketch = sketch_dict(values)
+                changed.append(row)
+        SensorHourlyRollup.objects.bulk_update(changed, ['power_sketch'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartguard', '0007_building_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensorhourlyrollup',
+            name='power_sketch',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_sketches, migrations.RunPython.noop),
+    ]
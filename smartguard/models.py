@@ -92,6 +92,18 @@ class EnergyReading(models.Model):
     power = models.FloatField()
     power_factor = models.FloatField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sensor', 'timestamp'], name='reading_sensor_time_idx'),
+            models.Index(fields=['sensor', 'power'], name='reading_sensor_power_idx'),
+            models.Index(fields=['timestamp'], name='reading_time_idx'),
+        ]
+
+    def delete(self, *args, **kwargs):
+        # Through rollups so the rollups and building totals lose it too.
+        from .rollups import delete_readings
+        return delete_readings(EnergyReading.objects.filter(pk=self.pk))
+
     def __str__(self):
         return f"Reading {self.energyreading_id} - {self.timestamp}"
 
@@ -111,6 +123,62 @@ class Anomaly(models.Model):
     timestamp = models.DateTimeField()
     severity = models.IntegerField()
     description = models.TextField()
+    # Copies of the reading's sensor, its building and the reading's power,
+    # so per-sensor and per-building anomaly statistics never join through
+    # the readings table. save() and the signals keep them in step; bulk
+    # writers set them from what they already know.
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE)
+    building = models.ForeignKey(Building, on_delete=models.CASCADE)
+    power = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='anomaly_time_idx'),
+            models.Index(fields=['sensor', 'timestamp'], name='anomaly_sensor_time_idx'),
+        ]
+
+    # The reading and building this row was loaded with; None for a new row.
+    _stored_reading_id = None
+    _stored_building_id = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_reading_id = instance.__dict__.get('energy_reading_id')
+        instance._stored_building_id = instance.__dict__.get('building_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Pointing a saved anomaly at another reading re-copies its fields;
+        # if that moves it to another building, the signals move its count
+        # in BuildingStats as well.
+        unset = None in (self.sensor_id, self.building_id, self.power)
+        moved = self._stored_reading_id is not None and self._stored_reading_id != self.energy_reading_id
+        if unset or moved:
+            self.copy_reading()
+        super().save(*args, **kwargs)
+        self._stored_reading_id, self._stored_building_id = self.energy_reading_id, self.building_id
+
+    def copy_reading(self):
+        """Copy the reading's sensor, building and power, reusing a loaded reading."""
+        if Anomaly.energy_reading.is_cached(self) and self.energy_reading.pk == self.energy_reading_id:
+            reading = self.energy_reading
+            if EnergyReading.sensor.is_cached(reading):
+                building_id = reading.sensor.building_id
+            else:
+                building_id = Sensor.objects.values_list('building_id', flat=True).get(pk=reading.sensor_id)
+            self.sensor_id, self.building_id, self.power = reading.sensor_id, building_id, reading.power
+        else:
+            self.sensor_id, self.building_id, self.power = (
+                EnergyReading.objects
+                .filter(pk=self.energy_reading_id)
+                .values_list('sensor_id', 'sensor__building_id', 'power')
+                .get()
+            )
+
+    def delete(self, *args, **kwargs):
+        from .rollups import delete_anomalies
+        return delete_anomalies(Anomaly.objects.filter(pk=self.pk))
 
     def __str__(self):
         return f"Anomaly {self.anomaly_id}"
@@ -123,5 +191,102 @@ class Alert(models.Model):
     status = models.CharField(max_length=20)
     message = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='alert_status_idx'),
+        ]
+
+    def delete(self, *args, **kwargs):
+        from .dashboard_cache import invalidate
+        deleted = super().delete(*args, **kwargs)
+        invalidate('alerts')
+        return deleted
+
+    def __str__(self):
+        return f"Alert {self.alert_id}"
+
+class SensorHourlyRollup(models.Model):
+    rollup_id = models.BigAutoField(primary_key=True)
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    reading_count = models.IntegerField(default=0)
+    power_sum = models.FloatField(default=0)
+    power_sq_sum = models.FloatField(default=0)
+    power_min = models.FloatField()
+    power_max = models.FloatField()
+    pf_sum = models.FloatField(default=0)
+    voltage_sum = models.FloatField(default=0)
+    current_sum = models.FloatField(default=0)
+    # Quantile sketch of the hour's power (smartguard.sketches); null for
+    # hours whose raw readings were gone before sketches were kept.
+    power_sketch = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sensor', 'hour'], name='unique_sensor_hour_rollup'),
+        ]
+
+    def __str__(self):
+        return f"Sensor {self.sensor_id} @ {self.hour}"
+
+
+class BuildingDailyRollup(models.Model):
+    rollup_id = models.BigAutoField(primary_key=True)
+    building = models.ForeignKey(Building, on_delete=models.CASCADE)
+    day = models.DateField()
+    reading_count = models.IntegerField(default=0)
+    power_sum = models.FloatField(default=0)
+    power_sq_sum = models.FloatField(default=0)
+    power_min = models.FloatField()
+    power_max = models.FloatField()
+    pf_sum = models.FloatField(default=0)
+    voltage_sum = models.FloatField(default=0)
+    current_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['building', 'day'], name='unique_building_day_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.building} @ {self.day}"
+
+
+class BuildingStats(models.Model):
+    """
+    Running totals per building over all readings ever recorded, kept by
+    smartguard.rollups as readings and anomalies are written, edited or
+    deleted. Like the rollups, they outlive the raw readings retention
+    compacts away. Deletes that bypass rollups.delete_readings() and
+    delete_anomalies() (QuerySet.delete() or raw SQL) are not subtracted;
+    "manage.py reconcile_building_stats" recomputes them.
+    """
+    stats_id = models.BigAutoField(primary_key=True)
+    building = models.OneToOneField(Building, on_delete=models.CASCADE)
+    reading_count = models.BigIntegerField(default=0)
+    power_sum = models.FloatField(default=0)
+    power_max = models.FloatField(null=True, blank=True)
+    pf_sum = models.FloatField(default=0)
+    anomaly_count = models.BigIntegerField(default=0)
+    last_reading_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'building stats'
+
+    def __str__(self):
+        return f"{self.building} totals"
+
+
+class ReadingCompaction(models.Model):
+    """One retention run. Raw readings before ``compacted_before`` survive only if an anomaly references them."""
+    compaction_id = models.BigAutoField(primary_key=True)
+    compacted_before = models.DateTimeField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    deleted = models.BigIntegerField(default=0)
+    kept = models.BigIntegerField(default=0)
+    archived_files = models.IntegerField(default=0)
+    archive_dir = models.CharField(max_length=255, blank=True)
+
     def __str__(self):
-        return f"Alert {self.alert_id}"
\ No newline at end of file
+        return f"Compaction before {self.compacted_before}"
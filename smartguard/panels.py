@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .dashboard import compute_section
+from .filters import ALL
+
+
+# JSON payloads for the lazily loaded dashboard panels. Keys match the DATA
+# object in analytics.html, so the page merges a payload and draws the charts
+# registered for that panel.
+
+def trend_panel(trend):
+    multi_day = len(trend) > 1 and trend[-1]['timestamp'] - trend[0]['timestamp'] > timedelta(days=1)
+    label = '%m-%d %H:%M' if multi_day else '%H:%M'
+    return {
+        'trendLabels':   [timezone.localtime(r['timestamp']).strftime(label) for r in trend],
+        'trendPower':    [round(r['power'], 2) for r in trend],
+        'trendPowerMin': [round(r['power_min'], 2) for r in trend],
+        'trendPowerMax': [round(r['power_max'], 2) for r in trend],
+        'trendPF':      [round(r['power_factor'], 4) for r in trend],
+        'trendVoltage': [round(r['voltage'], 2) for r in trend],
+        'trendCurrent': [round(r['current'], 2) for r in trend],
+    }
+
+
+def hourly_panel(hourly):
+    return {
+        'hourlyLabels': [f"{h['hour']:02d}:00" for h in hourly],
+        'hourlyAvg':    [round(h['avg_power'], 2) for h in hourly],
+        'hourlyMax':    [round(h['max_power'], 2) for h in hourly],
+        'hourlyCount':  [h['reading_count'] for h in hourly],
+    }
+
+
+def spikes_panel(spikes):
+    return {
+        'spikeLabels':   [f"{s['building']} / S{s['sensor_id']}" for s in spikes],
+        'spikeCounts':   [s['spike_count'] for s in spikes],
+        'spikeMaxPower': [round(s['max_power'], 2) for s in spikes],
+        'spikeRows':     [
+            {
+                'building':    s['building'],
+                'sensor_id':   s['sensor_id'],
+                'appliances':  s['appliances'],
+                'spike_count': s['spike_count'],
+                'max_power':   round(s['max_power'], 1),
+            }
+            for s in spikes
+        ],
+    }
+
+
+def btype_panel(btypes, atypes):
+    return {
+        'btypeLabels':   [r['btype_name'] for r in btypes],
+        'btypeCounts':   [r['count'] for r in btypes],
+        'btypeSeverity': [round(r['avg_severity'], 2) for r in btypes],
+        'atypeLabels':   [r['atype'] for r in atypes],
+        'atypeCounts':   [r['count'] for r in atypes],
+    }
+
+
+def pf_panel(buckets):
+    return {
+        'pfLabels':      [b['label'] for b in buckets],
+        'pfFaultCounts': [b['faults'] for b in buckets],
+        'pfTotalCounts': [b['total'] for b in buckets],
+        'pfFaultRates':  [b['rate'] for b in buckets],
+    }
+
+
+def severity_panel(severity):
+    return {
+        'severityLabels': [f"Level {r['severity']}" for r in severity],
+        'severityCounts': [r['count'] for r in severity],
+    }
+
+
+def sensor_status_panel(status):
+    return {
+        'sensorStatusLabels': [r['status'] for r in status],
+        'sensorStatusCounts': [r['count'] for r in status],
+    }
+
+
+def buildings_panel(buildings):
+    return {
+        'buildingLabels':    [b['name'] for b in buildings],
+        'buildingAvgPwr':    [b['avg_power'] for b in buildings],
+        'buildingMaxPwr':    [b['max_power'] for b in buildings],
+        'buildingAnomalies': [b['anomaly_count'] for b in buildings],
+        'buildingRows':      [
+            {
+                'name':          b['name'],
+                'type':          b['type'],
+                'anomaly_count': b['anomaly_count'],
+                'avg_pf':        b['avg_pf'],
+            }
+            for b in buildings
+        ],
+    }
+
+
+PANELS = {
+    'trend':         (('trend',),                           trend_panel),
+    'hourly':        (('hourly',),                          hourly_panel),
+    'spikes':        (('spikes',),                          spikes_panel),
+    'btype':         (('building_types', 'anomaly_types'),  btype_panel),
+    'pf':            (('power_factor',),                    pf_panel),
+    'severity':      (('severity',),                        severity_panel),
+    'sensor-status': (('sensor_status',),                   sensor_status_panel),
+    'buildings':     (('buildings',),                       buildings_panel),
+}
+
+
+def panel_sections(name):
+    return PANELS[name][0]
+
+
+def render_panel(name, filters=ALL, section=compute_section):
+    sections, build = PANELS[name]
+    return build(*(section(s, filters) for s in sections))
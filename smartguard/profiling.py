@@ -0,0 +1,264 @@
+import contextvars
+import itertools
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# Per-request query profiling. Every database connection gets one execute
+# wrapper (installed from the connection_created signal) that records into
+# the profile of the current request, found through a context variable, so
+# queries made on worker threads (see smartguard.concurrency) are counted
+# too. Requests that are not sampled leave the variable unset and the
+# wrapper only calls through.
+#
+# Each sampled request gets a Server-Timing header (sql, render, app) and a
+# JSON log line on the "smartguard.profiling" logger, which the
+# profile_summary command aggregates.
+
+PROFILING_DEFAULTS = {
+    'enabled':     True,
+    'sample_rate': 1.0,   # fraction of requests profiled, spread evenly (0.05 = every 20th)
+    'slowest':     3,     # statements listed per request
+    'repeated':    2,     # executions of one statement shape that count as an N+1 loop
+    'header':      True,  # add Server-Timing entries
+}
+
+logger = logging.getLogger('smartguard.profiling')
+
+_current = contextvars.ContextVar('smartguard_profile', default=None)
+
+PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+
+
+def profiling_options():
+    return {**PROFILING_DEFAULTS, **getattr(settings, 'SMARTGUARD_PROFILING', {})}
+
+
+def statement_shape(sql):
+    """SQL with IN-lists of any length collapsed, for grouping repeated statements."""
+    return PLACEHOLDER_LIST.sub('(%s, ...)', ' '.join(sql.split()))
+
+
+class RequestProfile:
+    """Statements, SQL time and render time of one request."""
+
+    def __init__(self):
+        self.queries = []  # (sql, params, seconds)
+        self.started = time.perf_counter()
+        self.render_started = None
+        self.render = 0.0
+        self.duration = None
+
+    @property
+    def active(self):
+        return self.duration is None
+
+    def record(self, sql, params, seconds):
+        self.queries.append((sql, params, seconds))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    @property
+    def sql_time(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def slowest(self, n):
+        return sorted(self.queries, key=lambda q: -q[2])[:n]
+
+    def duplicates(self):
+        """Statements executed more than once with identical parameters."""
+        counts = Counter((sql, repr(params)) for sql, params, _ in self.queries)
+        return sum(count - 1 for count in counts.values() if count > 1)
+
+    def repeated(self, threshold):
+        """Statement shapes executed at least ``threshold`` times (N+1 candidates)."""
+        counts = Counter(statement_shape(sql) for sql, _, _ in self.queries)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def server_timing(self):
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{len(self.queries)} queries"',
+            f'render;dur={self.render * 1000:.1f}',
+            f'app;dur={self.duration * 1000:.1f}',
+        ])
+
+    def as_dict(self, request, response, options):
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'event':       'request_profile',
+            'method':      request.method,
+            'path':        request.path,
+            'route':       match.route if match else None,
+            'status':      response.status_code,
+            'duration_ms': round(self.duration * 1000, 2),
+            'queries':     len(self.queries),
+            'sql_ms':      round(self.sql_time * 1000, 2),
+            'render_ms':   round(self.render * 1000, 2),
+            'duplicates':  self.duplicates(),
+            'slowest':     [
+                {'sql': statement_shape(sql)[:500], 'ms': round(seconds * 1000, 2)}
+                for sql, _, seconds in self.slowest(options['slowest'])
+            ],
+            'repeated':    [
+                {'sql': shape[:500], 'count': count}
+                for shape, count in self.repeated(options['repeated'])
+            ],
+        }
+
+
+@contextmanager
+def profiled():
+    """Profile the statements run inside the block, on this thread and its workers."""
+    profile = RequestProfile()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        profile.finish()
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None or not profile.active:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record(sql, params, time.perf_counter() - started)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver: profile every statement on ``connection``."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryProfilingMiddleware:
+    """Profile a sample of requests; see PROFILING_DEFAULTS for the options."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = profiling_options()
+        self.requests = itertools.count(1)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        # Deterministic and lock-free: request n is sampled when n * rate
+        # crosses an integer.
+        if not self.options['enabled']:
+            return False
+        n, rate = next(self.requests), self.options['sample_rate']
+        return int(n * rate) > int((n - 1) * rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(profile, request, response)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(profile, request, response)
+
+    def process_template_response(self, request, response):
+        profile = _current.get()
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda r: self.rendered(profile))
+        return response
+
+    @staticmethod
+    def rendered(profile):
+        profile.render = time.perf_counter() - profile.render_started
+
+    def report(self, profile, request, response):
+        # Streaming responses are timed up to the start of their body.
+        profile.finish()
+        if self.options['header']:
+            existing = response.get('Server-Timing')
+            timing = profile.server_timing()
+            response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        logger.info(json.dumps(profile.as_dict(request, response, self.options)))
+        return response
+
+
+# ─── SUMMARY ──────────────────────────────────────────────────────────────────
+def read_profiles(lines):
+    """Profile records from log lines; other lines and prefixes are skipped."""
+    for line in lines:
+        start = line.find('{')
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and record.get('event') == 'request_profile':
+            yield record
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0
+
+
+def summarise(records, by='route'):
+    """Per-endpoint figures plus the most repeated and slowest statements."""
+    endpoints, repeated, slowest = {}, Counter(), {}
+    for record in records:
+        name = f"{record['method']} {record.get(by) or record['path']}"
+        endpoints.setdefault(name, []).append(record)
+        for statement in record['repeated']:
+            repeated[statement['sql']] += statement['count']
+        for statement in record['slowest']:
+            slowest[statement['sql']] = max(slowest.get(statement['sql'], 0), statement['ms'])
+
+    rows = []
+    for name, group in endpoints.items():
+        durations = [r['duration_ms'] for r in group]
+        rows.append({
+            'endpoint':      name,
+            'requests':      len(group),
+            'p50_ms':        percentile(durations, 0.5),
+            'p95_ms':        percentile(durations, 0.95),
+            'max_ms':        max(durations),
+            'avg_queries':   sum(r['queries'] for r in group) / len(group),
+            'max_queries':   max(r['queries'] for r in group),
+            'avg_sql_ms':    sum(r['sql_ms'] for r in group) / len(group),
+            'avg_render_ms': sum(r['render_ms'] for r in group) / len(group),
+            'duplicates':    sum(r['duplicates'] for r in group),
+        })
+    rows.sort(key=lambda row: -row['p95_ms'])
+    return {
+        'endpoints': rows,
+        'repeated':  repeated.most_common(),
+        'slowest':   sorted(slowest.items(), key=lambda item: -item[1]),
+    }
@@ -0,0 +1,242 @@
+import os
+import time as clock
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from . import dashboard_cache, rollups
+from .models import EnergyReading, Anomaly, ReadingCompaction
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = pq = None
+
+
+# Raw readings older than the retention age are folded into the hourly and
+# daily rollups and deleted, except those an Anomaly points at. Compaction
+# works in whole local days: the rollups for the range are rebuilt from raw
+# data first, the cutoff is recorded as a ReadingCompaction, and only then
+# are raw rows deleted in short, separately committed batches. Each batch can
+# first be written to a compressed archive file, so the history stays
+# recoverable with read_archive().
+#
+# rollups.rebuild() never touches days before the latest cutoff, since the
+# raw rows it would recompute them from are gone. Dashboard sections that
+# need individual readings (the spike summary and the histograms) cover only
+# the rows that remain; see smartguard.dashboard.
+
+RETENTION_DEFAULTS = {
+    'raw_age_days':   90,     # raw readings older than this are compacted
+    'batch_size':     5000,   # rows deleted per transaction
+    'pause':          0.0,    # seconds between batches, to let writers in
+    'archive_dir':    None,   # write each deleted batch here first
+    'archive_format': 'npz',  # 'npz' (NumPy) or 'parquet' (pyarrow)
+}
+
+ARCHIVE_COLUMNS = ('energyreading_id', 'sensor_id', 'timestamp', 'voltage', 'current', 'power', 'power_factor')
+ARCHIVE_FORMATS = ('npz', 'parquet')
+
+
+def retention_options(**overrides):
+    options = {**RETENTION_DEFAULTS, **getattr(settings, 'SMARTGUARD_RETENTION', {})}
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return options
+
+
+def compacted_before():
+    """Raw readings before this moment have been compacted, or None."""
+    return ReadingCompaction.objects.aggregate(m=Max('compacted_before'))['m']
+
+
+def cutoff_for(age, now=None):
+    """Local midnight at or before ``now - age``."""
+    day = timezone.localdate((now or timezone.now()) - age)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# ─── ARCHIVES ─────────────────────────────────────────────────────────────────
+def _columns(rows):
+    ids, sensors, stamps, voltage, current, power, pf = zip(*rows)
+    return {
+        'energyreading_id': np.asarray(ids, dtype=np.int64),
+        'sensor_id':        np.asarray(sensors, dtype=np.int64),
+        'timestamp':        np.asarray([round(t.timestamp() * 1_000_000) for t in stamps], dtype=np.int64),
+        'voltage':          np.asarray(voltage, dtype=np.float64),
+        'current':          np.asarray(current, dtype=np.float64),
+        'power':            np.asarray(power, dtype=np.float64),
+        'power_factor':     np.asarray(pf, dtype=np.float64),
+    }
+
+
+def write_archive(directory, rows, fmt='npz'):
+    """
+    Write (id, sensor_id, timestamp, voltage, current, power, power_factor)
+    rows to one compressed file named after their id range; timestamps are
+    stored as microseconds since the epoch (UTC). Returns the path.
+    """
+    if np is None:
+        raise ValueError("Archiving readings needs NumPy.")
+    if fmt == 'parquet' and pa is None:
+        raise ValueError("Parquet archives need pyarrow.")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'readings-{rows[0][0]:012d}-{rows[-1][0]:012d}.{fmt}'
+    partial = path.with_name(path.name + '.part')
+
+    columns = _columns(rows)
+    if fmt == 'npz':
+        with open(partial, 'wb') as f:
+            np.savez_compressed(f, **columns)
+    else:
+        table = pa.table({
+            **columns,
+            'timestamp': pa.array(columns['timestamp'], type=pa.timestamp('us', tz='UTC')),
+        })
+        pq.write_table(table, partial, compression='zstd')
+    # Rows are deleted only after the file is completely on disk.
+    with open(partial, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+    return path
+
+
+def read_archive(path):
+    """Rows of an archive file as (id, sensor_id, timestamp, voltage, current, power, power_factor)."""
+    path = Path(path)
+    if path.suffix == '.parquet':
+        if pq is None:
+            raise ValueError("Reading Parquet archives needs pyarrow.")
+        table = pq.read_table(path)
+        columns = {name: table.column(name).to_numpy() for name in ARCHIVE_COLUMNS if name != 'timestamp'}
+        columns['timestamp'] = table.column('timestamp').cast(pa.int64()).to_numpy()
+    else:
+        with np.load(path) as data:
+            columns = {name: data[name] for name in ARCHIVE_COLUMNS}
+    stamps = [
+        datetime.fromtimestamp(0, tz=dt_timezone.utc) + timedelta(microseconds=int(us))
+        for us in columns['timestamp']
+    ]
+    return [
+        (int(i), int(s), t, float(v), float(c), float(p), float(f))
+        for i, s, t, v, c, p, f in zip(
+            columns['energyreading_id'], columns['sensor_id'], stamps, columns['voltage'],
+            columns['current'], columns['power'], columns['power_factor'],
+        )
+    ]
+
+
+# ─── COMPACTION ───────────────────────────────────────────────────────────────
+class Compactor:
+    """
+    Compact raw readings older than ``older_than`` (a timedelta). With
+    ``dry_run`` nothing is written; run() only counts what would go.
+    """
+
+    def __init__(self, older_than=None, batch_size=None, archive_dir=None, archive_format=None,
+                 pause=None, dry_run=False, now=None):
+        options = retention_options(
+            batch_size=batch_size, archive_dir=archive_dir, archive_format=archive_format, pause=pause,
+        )
+        if options['archive_format'] not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {options['archive_format']!r}")
+        if options['archive_dir'] and np is None:
+            raise ValueError("Archiving readings needs NumPy.")
+        if options['archive_dir'] and options['archive_format'] == 'parquet' and pa is None:
+            raise ValueError("Parquet archives need pyarrow.")
+        if older_than is None:
+            older_than = timedelta(days=options['raw_age_days'])
+        self.options = options
+        self.cutoff = cutoff_for(older_than, now)
+        self.dry_run = dry_run
+        self.stats = {'deleted': 0, 'kept': 0, 'archived_files': 0, 'batches': 0}
+
+    def expired(self):
+        referenced = Anomaly.objects.filter(energy_reading_id=OuterRef('pk'))
+        return (
+            EnergyReading.objects
+            .filter(timestamp__lt=self.cutoff)
+            .annotate(referenced=Exists(referenced))
+        )
+
+    def batches(self):
+        """Lists of unreferenced expired rows in primary-key order (keyset paginated)."""
+        last, size = 0, self.options['batch_size']
+        expired = self.expired().filter(referenced=False).order_by('energyreading_id')
+        while True:
+            rows = list(expired.filter(energyreading_id__gt=last).values_list(*ARCHIVE_COLUMNS)[:size])
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def rebuild_rollups(self):
+        previous = compacted_before()
+        if previous is not None and previous >= self.cutoff:
+            return
+        start = timezone.localdate(previous) if previous is not None else None
+        rollups.rebuild(start, timezone.localdate(self.cutoff) - timedelta(days=1))
+
+    def delete(self, ids):
+        table = connection.ops.quote_name(EnergyReading._meta.db_table)
+        pk = connection.ops.quote_name(EnergyReading._meta.pk.column)
+        anomalies = connection.ops.quote_name(Anomaly._meta.db_table)
+        reading = connection.ops.quote_name(Anomaly._meta.get_field('energy_reading').column)
+        step = connection.features.max_query_params or len(ids)
+        deleted = 0
+        # The anomaly check and the delete are one statement, so an anomaly
+        # created since the batch was read keeps its reading. The dashboard
+        # cache is invalidated once at the end.
+        with transaction.atomic(), connection.cursor() as cursor:
+            for i in range(0, len(ids), step):
+                chunk = ids[i:i + step]
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(chunk))}) "
+                    f"AND NOT EXISTS (SELECT 1 FROM {anomalies} WHERE {anomalies}.{reading} = {table}.{pk})",
+                    chunk,
+                )
+                deleted += cursor.rowcount
+        return deleted
+
+    def run(self, progress=None):
+        self.stats['kept'] = self.expired().filter(referenced=True).count()
+        if self.dry_run:
+            self.stats['deleted'] = self.expired().filter(referenced=False).count()
+            return self.stats
+
+        self.rebuild_rollups()
+        record = ReadingCompaction.objects.create(
+            compacted_before=self.cutoff, archive_dir=str(self.options['archive_dir'] or ''),
+        )
+        finished = None
+        try:
+            for rows in self.batches():
+                if self.options['archive_dir']:
+                    write_archive(self.options['archive_dir'], rows, self.options['archive_format'])
+                    self.stats['archived_files'] += 1
+                self.stats['deleted'] += self.delete([row[0] for row in rows])
+                self.stats['batches'] += 1
+                if progress:
+                    progress(self.stats)
+                if self.options['pause']:
+                    clock.sleep(self.options['pause'])
+            finished = timezone.now()
+        finally:
+            # An interrupted run keeps its cutoff, so rebuilds still skip
+            # the days it may have partly deleted; rerunning finishes it.
+            ReadingCompaction.objects.filter(pk=record.pk).update(
+                deleted=self.stats['deleted'], kept=self.stats['kept'],
+                archived_files=self.stats['archived_files'], finished_at=finished,
+            )
+            dashboard_cache.invalidate('readings')
+        return self.stats
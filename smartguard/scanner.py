@@ -0,0 +1,221 @@
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from django.db import transaction
+
+from . import dashboard_cache, rollups
+from .detection import OVERLOAD, SPIKE, detection_options, ensure_anomaly_types
+from .models import Sensor, EnergyReading, Anomaly, Alert
+
+
+# Backfill counterpart of detection.StreamingDetector. The rules are the same,
+# but the running mean/std is a trailing window computed with cumulative sums
+# so a whole sensor history is scored with a handful of array operations.
+
+SCAN_DEFAULTS = {
+    'window':        60,   # readings in the trailing mean/std window
+    'spike_lookback': 1,   # readings whose maximum a spike must jump over
+}
+
+
+def trailing_stats(values, window):
+    """Mean and std of the ``window`` values strictly before each position."""
+    n = len(values)
+    c1 = np.concatenate(([0.0], np.cumsum(values)))
+    c2 = np.concatenate(([0.0], np.cumsum(values * values)))
+    idx = np.arange(n)
+    lo = np.maximum(0, idx - window)
+    count = idx - lo
+    safe = np.maximum(count, 1)
+    mean = (c1[idx] - c1[lo]) / safe
+    var = np.maximum((c2[idx] - c2[lo]) / safe - mean * mean, 0.0)
+    return mean, np.sqrt(var), count
+
+
+def trailing_max(values, lookback):
+    """Maximum of the ``lookback`` values strictly before each position (NaN if none)."""
+    out = np.full(len(values), np.nan)
+    if len(values) > lookback:
+        out[lookback:] = sliding_window_view(values[:-1], lookback).max(axis=1)
+    return out
+
+
+def score_sensor(power, power_factor, options, lead=0):
+    """
+    Return (indices, is_spike, severity, z, mean) for the anomalous readings
+    of one sensor, given its readings in timestamp order. The first ``lead``
+    readings only seed the windows; indices count from the one after them.
+    """
+    mean, std, count = trailing_stats(power, options['window'])
+    std = np.maximum(np.maximum(std, np.abs(mean) * options['min_rel_std']), 1e-9)
+    z = (power - mean) / std
+
+    pf_mean, _, pf_count = trailing_stats(power_factor, options['pf_window'])
+    pf_mean = np.where(pf_count > 0, pf_mean, 1.0)
+
+    anomalous = (count >= options['min_samples']) & (z >= options['z_threshold'])
+    peak = trailing_max(power, options['spike_lookback'])
+    is_spike = ~np.isnan(peak) & (power >= peak * options['spike_ratio'])
+
+    severity = 1 + np.floor(z - options['z_threshold']) + (pf_mean < options['pf_floor'])
+    severity = np.clip(severity, 1, 5).astype(int)
+
+    idx = np.flatnonzero(anomalous[lead:]) + lead
+    return idx - lead, is_spike[idx], severity[idx], z[idx], mean[idx]
+
+
+class BackfillScanner:
+    """
+    Re-score stored readings for a time range and sync Anomaly/Alert rows so
+    that re-running with the same options changes nothing. Anomalies that
+    still apply are updated in place, keeping their alerts and statuses.
+    """
+
+    def __init__(self, start=None, end=None, sensor_ids=None, chunk_size=20000, dry_run=False, **options):
+        self.start = start
+        self.end = end
+        self.sensor_ids = sensor_ids
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.options = detection_options(**{**SCAN_DEFAULTS, **options})
+        self.stats = {'sensors': 0, 'readings': 0, 'found': 0, 'created': 0, 'updated': 0, 'deleted': 0}
+
+    def readings(self):
+        readings = EnergyReading.objects.all()
+        if self.start is not None:
+            readings = readings.filter(timestamp__gte=self.start)
+        if self.end is not None:
+            readings = readings.filter(timestamp__lt=self.end)
+        if self.sensor_ids:
+            readings = readings.filter(sensor_id__in=self.sensor_ids)
+        return readings
+
+    def lead(self, sensor_id):
+        """
+        (power, power_factor) arrays of the readings just before ``start``
+        that a scan of the whole history would have in its windows.
+        """
+        if self.start is None:
+            return np.empty(0), np.empty(0)
+        size = max(self.options['window'], self.options['pf_window'], self.options['spike_lookback'])
+        rows = list(
+            EnergyReading.objects.filter(sensor_id=sensor_id, timestamp__lt=self.start)
+            .order_by('-timestamp', '-energyreading_id')
+            .values_list('power', 'power_factor')[:size]
+        )[::-1]
+        return np.asarray(rows, dtype=np.float64).reshape(-1, 2).T
+
+    def stream(self):
+        """Yield (sensor_id, ids, epochs, power, power_factor) arrays per sensor."""
+        rows = (
+            self.readings()
+            .order_by('sensor_id', 'timestamp', 'energyreading_id')
+            .values_list('sensor_id', 'energyreading_id', 'timestamp', 'power', 'power_factor')
+            .iterator(chunk_size=self.chunk_size)
+        )
+        current, ids, epochs, power, pf = None, [], [], [], []
+        for sensor_id, reading_id, timestamp, p, f in rows:
+            if sensor_id != current:
+                if ids:
+                    yield current, *self._arrays(ids, epochs, power, pf)
+                current, ids, epochs, power, pf = sensor_id, [], [], [], []
+            ids.append(reading_id)
+            epochs.append(timestamp.timestamp())
+            power.append(p)
+            pf.append(f)
+        if ids:
+            yield current, *self._arrays(ids, epochs, power, pf)
+
+    @staticmethod
+    def _arrays(ids, epochs, power, pf):
+        return (
+            np.asarray(ids, dtype=np.int64),
+            np.asarray(epochs, dtype=np.float64),
+            np.asarray(power, dtype=np.float64),
+            np.asarray(pf, dtype=np.float64),
+        )
+
+    def run(self, progress=None):
+        types = ensure_anomaly_types()
+        for sensor_id, ids, epochs, power, pf in self.stream():
+            lead_power, lead_pf = self.lead(sensor_id)
+            idx, is_spike, severity, z, mean = score_sensor(
+                np.concatenate((lead_power, power)), np.concatenate((lead_pf, pf)), self.options, lead=len(lead_power)
+            )
+            findings = {
+                int(ids[i]): (
+                    types[SPIKE if spike else OVERLOAD],
+                    int(sev),
+                    datetime.fromtimestamp(epochs[i], tz=dt_timezone.utc),
+                    f"Power {power[i]:.0f} W is {zi:.1f}σ above the running mean of {m:.0f} W",
+                    float(power[i]),
+                )
+                for i, spike, sev, zi, m in zip(idx, is_spike, severity, z, mean)
+            }
+            self.stats['sensors']  += 1
+            self.stats['readings'] += len(ids)
+            self.stats['found']    += len(findings)
+            if not self.dry_run:
+                self.sync(sensor_id, findings, types)
+            if progress:
+                progress(sensor_id, len(ids), len(findings))
+        return self.stats
+
+    @transaction.atomic
+    def sync(self, sensor_id, findings, types):
+        # The oldest anomaly of a reading is kept; any later duplicates are stale.
+        existing, stale = {}, []
+        for a in Anomaly.objects.filter(
+            energy_reading__in=self.readings().filter(sensor_id=sensor_id),
+            anomaly_type__in=types.values(),
+        ).order_by('pk'):
+            if a.energy_reading_id in findings and a.energy_reading_id not in existing:
+                existing[a.energy_reading_id] = a
+            else:
+                stale.append(a.pk)
+        if stale:
+            rollups.delete_anomalies(Anomaly.objects.filter(pk__in=stale))
+
+        changed = []
+        for reading_id, (atype, severity, _, description, _) in findings.items():
+            anomaly = existing.get(reading_id)
+            if anomaly is None:
+                continue
+            if (anomaly.anomaly_type_id, anomaly.severity, anomaly.description) != (atype.pk, severity, description):
+                anomaly.anomaly_type, anomaly.severity, anomaly.description = atype, severity, description
+                changed.append(anomaly)
+        Anomaly.objects.bulk_update(changed, ['anomaly_type', 'severity', 'description'], batch_size=500)
+
+        building_id = Sensor.objects.values_list('building_id', flat=True).get(pk=sensor_id)
+        created = Anomaly.objects.bulk_create([
+            Anomaly(
+                energy_reading_id=reading_id,
+                anomaly_type=atype,
+                timestamp=timestamp,
+                severity=severity,
+                description=description,
+                sensor_id=sensor_id,
+                building_id=building_id,
+                power=power,
+            )
+            for reading_id, (atype, severity, timestamp, description, power) in findings.items()
+            if reading_id not in existing
+        ], batch_size=500)
+        rollups.count_anomalies([building_id] * len(created))
+        Alert.objects.bulk_create([
+            Alert(
+                anomaly=anomaly,
+                status='Active',
+                message=f"{anomaly.anomaly_type.name} on sensor {sensor_id}: "
+                        f"{findings[anomaly.energy_reading_id][4]:.0f} W",
+            )
+            for anomaly in created
+        ], batch_size=500)
+        if stale or changed or created:
+            dashboard_cache.invalidate('anomalies', 'alerts')
+
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed)
+        self.stats['deleted'] += len(stale)
@@ -0,0 +1,130 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import dashboard_cache, ingest, profiling, rollups
+from .models import (
+    BuildingType, Building, SensorType, Sensor, Appliance,
+    EnergyReading, AnomalyType, Anomaly, Alert
+)
+
+
+# bulk_create() does not send post_save; bulk writers call
+# rollups.apply_readings(), rollups.count_anomalies() and
+# dashboard_cache.invalidate() themselves, and set the reading fields
+# anomalies carry. Deleted readings and anomalies are taken out of the
+# rollups and totals by rollups.delete_readings() and delete_anomalies(),
+# which their delete() and admin actions go through.
+#
+# Readings, anomalies and alerts have no delete receivers at all, which would
+# cost QuerySet.delete() its fast path and bump the cache once per row: their
+# deletes invalidate the dashboard once, from the code that deletes them.
+
+@receiver(pre_save, sender=EnergyReading)
+def remember_stored_reading(sender, instance, raw, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._stored_row = (
+            EnergyReading.objects.filter(pk=instance.pk)
+            .values_list('sensor_id', 'sensor__building_id', 'timestamp')
+            .first()
+        )
+
+
+@receiver(post_save, sender=EnergyReading)
+def update_anomaly_readings(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        Anomaly.objects.filter(energy_reading=instance).update(
+            sensor_id=instance.sensor_id,
+            building_id=Sensor.objects.filter(pk=instance.sensor_id).values('building_id'),
+            power=instance.power,
+        )
+
+
+@receiver(post_save, sender=EnergyReading)
+def update_rollups(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        rollups.apply_readings([instance])
+        return
+    # An edit is corrected in the buckets it left and the ones it joined.
+    stored = getattr(instance, '_stored_row', None)
+    building_id = Sensor.objects.values_list('building_id', flat=True).get(pk=instance.sensor_id)
+    rollups.correct_readings(
+        [stored] if stored else [], [(instance.sensor_id, building_id, instance.timestamp)],
+    )
+
+
+@receiver(pre_save, sender=Sensor)
+def remember_sensor_building(sender, instance, raw, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._stored_building_id = (
+            Sensor.objects.filter(pk=instance.pk).values_list('building_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Sensor)
+def update_sensor_building(sender, instance, created, raw, **kwargs):
+    previous = getattr(instance, '_stored_building_id', None)
+    if created or raw or previous in (None, instance.building_id):
+        return
+    Anomaly.objects.filter(sensor=instance).update(building_id=instance.building_id)
+    rollups.move_sensor(instance.sensor_id, previous, instance.building_id)
+
+
+@receiver(pre_delete, sender=Sensor)
+def remember_sensor_days(sender, instance, **kwargs):
+    instance._stored_days = rollups.sensor_days(instance.sensor_id)
+
+
+@receiver(post_delete, sender=Sensor)
+def update_sensor_building_totals(sender, instance, **kwargs):
+    # The cascade took the sensor's readings and hourly rollups with it.
+    rollups.correct_days(instance.building_id, getattr(instance, '_stored_days', ()))
+
+
+@receiver(post_save, sender=Anomaly)
+def count_saved_anomaly(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    previous = instance._stored_building_id
+    if created:
+        rollups.count_anomalies([instance.building_id])
+    elif previous not in (None, instance.building_id):
+        rollups.count_anomalies([previous], sign=-1)
+        rollups.count_anomalies([instance.building_id])
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def forget_known_sensors(sender, **kwargs):
+    ingest.forget_known_sensors()
+
+
+DASHBOARD_SOURCES = {
+    EnergyReading: 'readings',
+    Anomaly:       'anomalies',
+    Alert:         'alerts',
+    BuildingType:  'fleet',
+    Building:      'fleet',
+    SensorType:    'fleet',
+    Sensor:        'fleet',
+    Appliance:     'fleet',
+    AnomalyType:   'fleet',
+}
+
+
+def invalidate_dashboard(sender, **kwargs):
+    dashboard_cache.invalidate(DASHBOARD_SOURCES[sender])
+
+
+BULK_DELETED = {EnergyReading, Anomaly, Alert}
+
+
+for model in DASHBOARD_SOURCES:
+    post_save.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-save-{model.__name__}')
+    if model not in BULK_DELETED:
+        post_delete.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-delete-{model.__name__}')
+
+
+connection_created.connect(profiling.install, dispatch_uid='smartguard-profiling')
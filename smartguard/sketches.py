@@ -0,0 +1,223 @@
+import math
+import operator
+from datetime import timedelta
+from functools import reduce
+
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .filters import ALL
+from .models import SensorHourlyRollup
+
+
+# Power quantiles from mergeable sketches. Every hourly sensor rollup keeps a
+# DDSketch of its readings' power: counts per logarithmic bucket, where
+# bucket i holds values in (γ^(i-1), γ^i] with γ = (1 + α) / (1 - α). Any
+# quantile read back from a sketch is within a relative error α of the true
+# one, and two sketches merge by adding their bucket counts, so p95/p99 for a
+# sensor, building, day or the whole fleet come from the hourly rows of that
+# scope without touching raw readings.
+#
+# α is fixed rather than configurable, since sketches only merge with
+# sketches of the same α.
+
+RELATIVE_ACCURACY = 0.01
+QUANTILES = (0.95, 0.99)
+
+
+class QuantileSketch:
+    """DDSketch of non-negative values; values ≤ 0 share one zero bucket."""
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self):
+        self.bins = {}
+        self.zero = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value > 0:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+        else:
+            self.zero += 1
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        return self
+
+    def merge(self, other):
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero  += other.zero
+        self.count += other.count
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def merge_dict(self, data):
+        """Merge a sketch in its to_dict() form without building it first."""
+        bins = self.bins
+        for key, count in zip(data['keys'], data['counts']):
+            bins[key] = bins.get(key, 0) + count
+        self.zero  += data['zero']
+        self.count += data['zero'] + sum(data['counts'])
+        if data['min'] is not None:
+            self.min = data['min'] if self.min is None else min(self.min, data['min'])
+            self.max = data['max'] if self.max is None else max(self.max, data['max'])
+        return self
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile (0 ≤ q ≤ 1), or None when empty."""
+        if not 0 <= q <= 1:
+            raise ValueError('Quantile must be between 0 and 1.')
+        if not self.count:
+            return None
+        if q in (0, 1):
+            # The extremes are tracked exactly.
+            return self.min if q == 0 else self.max
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if seen > rank:
+            return min(max(0.0, self.min), self.max)
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        # JSON object keys are strings, so buckets are stored as two lists.
+        keys = sorted(self.bins)
+        return {
+            'keys':   keys,
+            'counts': [self.bins[key] for key in keys],
+            'zero':   self.zero,
+            'min':    self.min,
+            'max':    self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        return sketch.merge_dict(data) if data else sketch
+
+
+def hourly_sketches(rows, tz=None):
+    """
+    ((sensor_id, hour), sketch) from (sensor_id, timestamp, power) rows sorted
+    by sensor and time, one sketch at a time. Hours start where TruncHour
+    puts them in ``tz``, the current timezone by default.
+    """
+    tz = tz or timezone.get_current_timezone()
+    key, sketch, end = None, None, None
+    for sensor_id, timestamp, power in rows:
+        # Bucketing is only worked out again when the hour changes.
+        if sketch is None or sensor_id != key[0] or not key[1] <= timestamp < end:
+            if sketch is not None:
+                yield key, sketch
+            hour = timestamp.astimezone(tz).replace(minute=0, second=0, microsecond=0)
+            key, sketch, end = (sensor_id, hour), QuantileSketch(), hour + timedelta(hours=1)
+        sketch.add(power)
+    if sketch is not None:
+        yield key, sketch
+
+
+def quantile_label(q):
+    return f'p{q * 100:g}'
+
+
+# ─── QUERIES ──────────────────────────────────────────────────────────────────
+GROUPS = {
+    'sensor':   F('sensor_id'),
+    'building': F('sensor__building_id'),
+    'hour':     F('hour'),
+    'day':      TruncDay('hour'),
+}
+
+
+def merged_sketches(filters=ALL, by=None):
+    """Hourly sketches within ``filters`` merged per ``by`` (see GROUPS), or into one."""
+    if by is not None and by not in GROUPS:
+        raise ValueError(f"Cannot group sketches by {by!r}. Use one of {', '.join(GROUPS)}.")
+    rows = filters.hourly_rollups(SensorHourlyRollup.objects.exclude(power_sketch=None))
+    if by is None:
+        merged = QuantileSketch()
+        for data in rows.values_list('power_sketch', flat=True).iterator(chunk_size=2000):
+            merged.merge_dict(data)
+        return merged
+    merged = {}
+    for key, data in rows.values_list(GROUPS[by], 'power_sketch').iterator(chunk_size=2000):
+        sketch = merged.get(key)
+        if sketch is None:
+            sketch = merged[key] = QuantileSketch()
+        sketch.merge_dict(data)
+    return merged
+
+
+def power_percentiles(filters=ALL, by=None, quantiles=QUANTILES):
+    """
+    Approximate power quantiles within ``filters``: one {'p95': ..., 'count':
+    ...} dict overall, or a dict of them keyed by sensor, building, hour or day.
+    """
+    def summary(sketch):
+        return {
+            **{quantile_label(q): sketch.quantile(q) for q in quantiles},
+            'count': sketch.count,
+        }
+
+    merged = merged_sketches(filters, by)
+    if by is None:
+        return summary(merged)
+    return {key: summary(sketch) for key, sketch in sorted(merged.items())}
+
+
+def active_sensors(filters=ALL, by='hour'):
+    """
+    Distinct sensors with readings per hour or day. The hourly rollups hold
+    one row per sensor and hour, so this is an exact indexed count.
+    """
+    if by not in ('hour', 'day'):
+        raise ValueError("Active sensors are counted per 'hour' or 'day'.")
+    return list(
+        filters.hourly_rollups(SensorHourlyRollup.objects.all())
+        .values(period=GROUPS[by])
+        .annotate(sensors=Count('sensor_id', distinct=True))
+        .order_by('period')
+    )
+
+
+def sensor_thresholds(q, filters=ALL):
+    """Each sensor's approximate ``q`` power quantile within ``filters``."""
+    return {
+        sensor_id: sketch.quantile(q)
+        for sensor_id, sketch in merged_sketches(filters, by='sensor').items()
+    }
+
+
+# Up to this many sensors, readings above their sensor's threshold are
+# selected with one "sensor_id = s AND power > t" term per sensor, which the
+# (sensor, power) index answers with a range scan each. Beyond it SQLite's
+# expression depth limit gets close, and a CASE over every reading is used.
+MAX_THRESHOLD_TERMS = 500
+
+
+def above_thresholds(queryset, thresholds):
+    """Readings of ``queryset`` with power above their sensor's threshold."""
+    if len(thresholds) <= MAX_THRESHOLD_TERMS:
+        terms = [Q(sensor_id=sensor_id, power__gt=t) for sensor_id, t in thresholds.items()]
+        return queryset.filter(reduce(operator.or_, terms)) if terms else queryset.none()
+    threshold = Case(
+        *[When(sensor_id=sensor_id, then=Value(t)) for sensor_id, t in thresholds.items()],
+        default=Value(None),
+        output_field=FloatField(),
+    )
+    return queryset.alias(threshold=threshold).filter(power__gt=F('threshold'))
@@ -0,0 +1,130 @@
+from django.db.models import Avg, Max, Count, F, Window
+from django.db.models.functions import CumeDist
+
+from . import sketches
+from .filters import ALL
+from .models import Appliance, EnergyReading
+
+
+# ─── THRESHOLD STRATEGIES ─────────────────────────────────────────────────────
+# A strategy narrows an EnergyReading queryset down to the readings that count
+# as spikes. Per-sensor strategies use window functions so the threshold is
+# computed inside the same statement as the grouping.
+
+class GlobalMean:
+    """Spike when power exceeds the fleet-wide mean power times ``k``."""
+
+    def __init__(self, k=1.5, mean=None):
+        self.k = k
+        self.mean = mean
+
+    def apply(self, queryset):
+        mean = self.mean
+        if mean is None:
+            mean = queryset.aggregate(avg=Avg('power'))['avg'] or 0
+        return queryset.filter(power__gt=mean * self.k)
+
+
+class SensorMean:
+    """Spike when power exceeds the sensor's own mean power times ``k``."""
+
+    def __init__(self, k=1.5):
+        self.k = k
+
+    def apply(self, queryset):
+        window = Window(Avg('power'), partition_by=[F('sensor_id')])
+        spikes = queryset.annotate(sensor_mean=window).filter(power__gt=F('sensor_mean') * self.k)
+        return queryset.filter(pk__in=spikes.values('pk'))
+
+
+class SensorPercentile:
+    """Spike when a reading lies above the sensor's ``q`` power percentile."""
+
+    def __init__(self, q=0.95):
+        if not 0 < q < 1:
+            raise ValueError('Percentile must be between 0 and 1.')
+        self.q = q
+
+    def apply(self, queryset):
+        window = Window(CumeDist(), partition_by=[F('sensor_id')], order_by=F('power').asc())
+        spikes = queryset.annotate(rank=window).filter(rank__gt=self.q)
+        return queryset.filter(pk__in=spikes.values('pk'))
+
+
+class SketchPercentile:
+    """
+    Like SensorPercentile, but with each sensor's percentile estimated from
+    its hourly power sketches (see smartguard.sketches) instead of ranking
+    every reading. ``filters`` picks the hours the percentile is taken over.
+    """
+
+    def __init__(self, q=0.95, filters=ALL):
+        if not 0 < q < 1:
+            raise ValueError('Percentile must be between 0 and 1.')
+        self.q = q
+        self.filters = filters
+
+    def apply(self, queryset):
+        return sketches.above_thresholds(queryset, sketches.sensor_thresholds(self.q, self.filters))
+
+
+STRATEGIES = {
+    'global_mean':       GlobalMean,
+    'sensor_mean':       SensorMean,
+    'sensor_percentile': SensorPercentile,
+    'sketch_percentile': SketchPercentile,
+}
+
+
+def get_strategy(name, *args):
+    try:
+        return STRATEGIES[name](*args)
+    except KeyError:
+        raise ValueError(f'Unknown spike strategy: {name!r}')
+
+
+# ─── SPIKE SUMMARY ────────────────────────────────────────────────────────────
+class SpikeSummary:
+    """
+    Top sensors by spike count with their peak power and appliance names,
+    built from one grouped query plus one appliance lookup.
+    """
+
+    def __init__(self, strategy=None, limit=8, queryset=None):
+        self.strategy = strategy or GlobalMean()
+        self.limit = limit
+        self.queryset = queryset if queryset is not None else EnergyReading.objects.all()
+
+    def rows(self):
+        return list(
+            self.strategy.apply(self.queryset)
+            .values('sensor_id', building=F('sensor__building__name'))
+            .annotate(spike_count=Count('energyreading_id'), max_power=Max('power'))
+            .order_by('-spike_count', 'sensor__building_id', 'sensor_id')[:self.limit]
+        )
+
+    def appliances(self, sensor_ids):
+        names = {}
+        rows = (
+            Appliance.objects
+            .filter(sensor_id__in=sensor_ids)
+            .order_by('appliance_id')
+            .values_list('sensor_id', 'name')
+        )
+        for sensor_id, name in rows:
+            names.setdefault(sensor_id, []).append(name)
+        return names
+
+    def top(self):
+        rows = self.rows()
+        appliances = self.appliances([r['sensor_id'] for r in rows])
+        return [
+            {
+                'building':    r['building'],
+                'sensor_id':   r['sensor_id'],
+                'appliances':  ', '.join(appliances.get(r['sensor_id'], [])) or 'None',
+                'spike_count': r['spike_count'],
+                'max_power':   r['max_power'] or 0,
+            }
+            for r in rows
+        ]
@@ -0,0 +1,316 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import dashboard_cache, rollups
+from .detection import OVERLOAD, SPIKE, ensure_anomaly_types
+from .models import (
+    BuildingType, Building, SensorType, Sensor, Appliance,
+    EnergyReading, Anomaly, Alert
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+# Readings follow a daily load curve per building type, with per-sensor base
+# load, Gaussian noise and occasional spikes. Primary keys are assigned by us
+# so anomalies can reference readings without reading them back, which also
+# lets the raw executemany path skip the ORM entirely. Chunks are generated
+# with keys counted from 0 and shifted past the tables' current maximum only
+# once the chunk's transaction holds the write lock, so concurrent writers
+# such as ingest never receive the same keys.
+
+READING_COLUMNS = ('energyreading_id', 'sensor_id', 'timestamp', 'voltage', 'current', 'power', 'power_factor')
+ANOMALY_COLUMNS = (
+    'anomaly_id', 'energy_reading_id', 'anomaly_type_id', 'timestamp', 'severity', 'description',
+    'sensor_id', 'building_id', 'power',
+)
+ALERT_COLUMNS   = ('alert_id', 'anomaly_id', 'created_at', 'status', 'message')
+
+
+def load_shape(hour, commercial):
+    """Relative load (roughly 0.3–1.1) for a fractional hour of the day."""
+    if commercial:
+        return 0.35 + 0.65 / (1 + math.exp(-(hour - 8) * 2)) / (1 + math.exp((hour - 18) * 2))
+    return (
+        0.45
+        + 0.35 * math.exp(-((hour - 7.5) / 1.5) ** 2)
+        + 0.60 * math.exp(-((hour - 19.5) / 2.5) ** 2)
+    )
+
+
+def _load_shape_array(hour, commercial):
+    residential = (
+        0.45
+        + 0.35 * np.exp(-((hour - 7.5) / 1.5) ** 2)
+        + 0.60 * np.exp(-((hour - 19.5) / 2.5) ** 2)
+    )
+    office = 0.35 + 0.65 / (1 + np.exp(-(hour - 8) * 2)) / (1 + np.exp((hour - 18) * 2))
+    return np.where(commercial, office, residential)
+
+
+def severity_for_factor(factor):
+    return max(1, min(5, 1 + int((factor - 1.5) * 4)))
+
+
+class SyntheticFleet:
+    """
+    Generate buildings, sensors, appliances, readings and spike anomalies.
+
+    ``interval`` is seconds between readings of one sensor and ``span`` the
+    covered timedelta ending at ``end``. ``spike_rate`` is the share of
+    readings that spike; ``anomaly_rate`` is the share of spikes recorded as
+    Anomaly + Alert and ``overload_share`` the share of those typed Overload
+    rather than Power Spike. The same seed always yields the same dataset.
+    """
+
+    def __init__(self, buildings=10, sensors_per_building=5, interval=60, span=timedelta(days=1),
+                 spike_rate=0.02, anomaly_rate=0.1, overload_share=0.0, seed=42, chunk_size=50000,
+                 fast=False, end=None):
+        self.buildings = buildings
+        self.sensors_per_building = sensors_per_building
+        self.interval = interval
+        self.steps = max(1, int(span.total_seconds() // interval))
+        self.spike_rate = spike_rate
+        self.anomaly_rate = anomaly_rate
+        self.overload_share = overload_share
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.fast = fast
+        self.end = end or timezone.now()
+        self.rng = random.Random(seed)
+        self.stats = {'buildings': 0, 'sensors': 0, 'readings': 0, 'anomalies': 0}
+
+    @property
+    def total_readings(self):
+        return self.steps * self.buildings * self.sensors_per_building
+
+    # ─── FLEET ────────────────────────────────────────────────────────────────
+    def create_fleet(self):
+        residential, _ = BuildingType.objects.get_or_create(
+            name="Residential", defaults={"description": "Homes and apartments"}
+        )
+        commercial, _ = BuildingType.objects.get_or_create(
+            name="Commercial", defaults={"description": "Business establishments"}
+        )
+        panel_type, _ = SensorType.objects.get_or_create(
+            name="Panel Sensor", defaults={"description": "Monitors electrical panels"}
+        )
+        appliance_type, _ = SensorType.objects.get_or_create(
+            name="Appliance Sensor", defaults={"description": "Monitors appliances"}
+        )
+
+        offset = Building.objects.count()
+        buildings = Building.objects.bulk_create([
+            Building(
+                name=f"Building {offset + i + 1}",
+                building_type=self.rng.choice([residential, commercial]),
+                location=f"Location {offset + i + 1}",
+            )
+            for i in range(self.buildings)
+        ])
+        sensors = Sensor.objects.bulk_create([
+            Sensor(
+                building=building,
+                sensor_type=self.rng.choice([panel_type, appliance_type]),
+                status="Active",
+            )
+            for building in buildings
+            for _ in range(self.sensors_per_building)
+        ])
+        Appliance.objects.bulk_create([
+            Appliance(sensor=sensor, name=f"Appliance {j + 1}")
+            for sensor in sensors
+            for j in range(self.rng.randint(1, 3))
+        ])
+
+        self.stats['buildings'] = len(buildings)
+        self.stats['sensors'] = len(sensors)
+        return buildings, [
+            (s.sensor_id, s.building.building_type_id == commercial.pk, self.rng.uniform(1500, 4000))
+            for s in sensors
+        ]
+
+    # ─── READINGS ─────────────────────────────────────────────────────────────
+    def reading_chunks(self, sensors, first_id=0):
+        """Yield lists of (reading_row, spike_factor) in timestamp order."""
+        steps_per_chunk = max(1, self.chunk_size // len(sensors))
+        start = self.end - timedelta(seconds=self.interval * self.steps)
+        generate = self._chunk_numpy if np is not None else self._chunk_python
+        np_rng = np.random.default_rng(self.seed) if np is not None else None
+
+        next_id = first_id
+        for step in range(0, self.steps, steps_per_chunk):
+            count = min(steps_per_chunk, self.steps - step)
+            rows = generate(sensors, start, step, count, next_id, np_rng)
+            next_id += len(rows)
+            yield rows
+
+    def _chunk_python(self, sensors, start, step, count, first_id, _):
+        rng, rows, pk = self.rng, [], first_id
+        for s in range(step, step + count):
+            moment = start + timedelta(seconds=self.interval * s)
+            hour = moment.hour + moment.minute / 60
+            for sensor_id, commercial, base in sensors:
+                shape = load_shape(hour, commercial)
+                power = max(50.0, base * shape * rng.gauss(1, 0.08))
+                factor = rng.uniform(1.5, 2.5) if rng.random() < self.spike_rate else None
+                if factor:
+                    power *= factor
+                voltage = rng.gauss(230, 4)
+                pf = min(1.0, max(0.5, rng.gauss(0.82 + 0.12 * min(shape, 1), 0.04)))
+                rows.append(((pk, sensor_id, moment, voltage, power / (voltage * pf), power, pf), factor))
+                pk += 1
+        return rows
+
+    def _chunk_numpy(self, sensors, start, step, count, first_id, rng):
+        n_sensors = len(sensors)
+        sensor_ids = np.array([s[0] for s in sensors], dtype=np.int64)
+        commercial = np.array([s[1] for s in sensors], dtype=bool)
+        base = np.array([s[2] for s in sensors])
+
+        offsets = (np.arange(step, step + count) * self.interval).repeat(n_sensors)
+        epoch0 = start.timestamp()
+        hour = ((epoch0 + offsets) % 86400) / 3600
+        shape = _load_shape_array(hour, np.tile(commercial, count))
+        n = len(offsets)
+
+        power = np.maximum(50.0, np.tile(base, count) * shape * rng.normal(1, 0.08, n))
+        spiking = rng.random(n) < self.spike_rate
+        factors = np.where(spiking, rng.uniform(1.5, 2.5, n), 0.0)
+        power = np.where(spiking, power * factors, power)
+        voltage = rng.normal(230, 4, n)
+        pf = np.clip(rng.normal(0.82 + 0.12 * np.minimum(shape, 1), 0.04), 0.5, 1.0)
+        current = power / (voltage * pf)
+
+        moments = [
+            datetime.fromtimestamp(epoch0 + o, tz=dt_timezone.utc)
+            for o in (offsets[::n_sensors].tolist())
+        ]
+        ids = range(first_id, first_id + n)
+        columns = zip(
+            ids, np.tile(sensor_ids, count).tolist(), voltage.tolist(),
+            current.tolist(), power.tolist(), pf.tolist(), factors.tolist(),
+        )
+        return [
+            ((pk, sid, moments[i // n_sensors], v, c, p, f), factor or None)
+            for i, (pk, sid, v, c, p, f, factor) in enumerate(columns)
+        ]
+
+    # ─── WRITING ──────────────────────────────────────────────────────────────
+    def write(self, model, columns, rows):
+        if not rows:
+            return
+        if not self.fast:
+            model.objects.bulk_create(
+                [model(**dict(zip(columns, row))) for row in rows], batch_size=self.chunk_size
+            )
+            return
+        table = connection.ops.quote_name(model._meta.db_table)
+        names = ', '.join(connection.ops.quote_name(c) for c in columns)
+        marks = ', '.join(['%s'] * len(columns))
+        # Readings in one step share a timestamp, so adapt each moment once.
+        adapted = {}
+        positions = [i for i, value in enumerate(rows[0]) if isinstance(value, datetime)]
+        for i in positions:
+            for moment in {row[i] for row in rows}:
+                adapted[moment] = connection.ops.adapt_datetimefield_value(moment)
+        if positions:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in positions:
+                    row[i] = adapted[row[i]]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({marks})', rows)
+
+    def lock_tables(self):
+        """
+        Hold the write lock on the reading, anomaly and alert tables until the
+        current transaction ends. SQLite writers already start with BEGIN
+        IMMEDIATE (see smartguard.database).
+        """
+        if connection.vendor == 'sqlite':
+            return
+        if connection.vendor == 'postgresql':
+            tables = ', '.join(connection.ops.quote_name(m._meta.db_table) for m in (EnergyReading, Anomaly, Alert))
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {tables} IN EXCLUSIVE MODE')
+            return
+        # Elsewhere, locking the highest key also locks the gap above it.
+        for model in (EnergyReading, Anomaly, Alert):
+            list(model.objects.select_for_update().order_by('-pk').values_list('pk')[:1])
+
+    def next_keys(self):
+        """The first free (reading, anomaly, alert) keys; call under lock_tables()."""
+        return tuple(
+            (model.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+            for model in (EnergyReading, Anomaly, Alert)
+        )
+
+    def run(self, progress=None, build_rollups=True):
+        types = ensure_anomaly_types()
+        spike_type, overload_type = types[SPIKE].pk, types[OVERLOAD].pk
+        with transaction.atomic():
+            buildings, sensors = self.create_fleet()
+        building_ids = dict(Sensor.objects.filter(building__in=buildings).values_list('sensor_id', 'building_id'))
+
+        for chunk in self.reading_chunks(sensors):
+            anomalies, alerts = [], []
+            for row, factor in chunk:
+                if factor and self.rng.random() < self.anomaly_rate:
+                    pk, sensor_id, moment, _, _, power, _ = row
+                    overload = self.rng.random() < self.overload_share
+                    anomalies.append((
+                        len(anomalies), pk, overload_type if overload else spike_type, moment,
+                        severity_for_factor(factor),
+                        f"Simulated {'overload' if overload else 'spike'}: {power:.0f} W "
+                        f"({factor:.1f}× normal load)",
+                        sensor_id, building_ids[sensor_id], power,
+                    ))
+                    alerts.append((
+                        len(alerts), len(anomalies) - 1, moment,
+                        self.rng.choice(["Active", "Resolved"]),
+                        "System detected abnormal energy usage",
+                    ))
+            with transaction.atomic():
+                self.lock_tables()
+                reading_id, anomaly_id, alert_id = self.next_keys()
+                self.write(EnergyReading, READING_COLUMNS, [
+                    (pk + reading_id, *rest) for (pk, *rest), _ in chunk
+                ])
+                self.write(Anomaly, ANOMALY_COLUMNS, [
+                    (pk + anomaly_id, reading + reading_id, *rest) for pk, reading, *rest in anomalies
+                ])
+                self.write(Alert, ALERT_COLUMNS, [
+                    (pk + alert_id, anomaly + anomaly_id, *rest) for pk, anomaly, *rest in alerts
+                ])
+                self.reset_sequences()
+            self.stats['readings'] += len(chunk)
+            self.stats['anomalies'] += len(anomalies)
+            if progress:
+                progress(self.stats['readings'], self.total_readings)
+
+        dashboard_cache.invalidate('fleet', 'readings', 'anomalies', 'alerts')
+        if build_rollups:
+            start = self.end - timedelta(seconds=self.interval * self.steps)
+            rollups.rebuild(timezone.localdate(start), timezone.localdate(self.end))
+            rollups.rebuild_building_stats()
+        return buildings
+
+    def reset_sequences(self):
+        # Explicit primary keys bypass PostgreSQL sequences; SQLite needs nothing.
+        # Run before the chunk commits, so no writer waiting on the lock
+        # draws a key the chunk has just taken.
+        statements = connection.ops.sequence_reset_sql(no_style(), [EnergyReading, Anomaly, Alert])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
@@ -1,3 +1,1397 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import datetime, timedelta
+from importlib import import_module
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.db.utils import ConnectionHandler
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import batch, benchmarks, dashboard_cache, detection, export, retention, rollups
+from .columnar import ColumnarArchive, export as export_columnar
+from .concurrency import gather_sections, server_timing
+from .database import DashboardRouter, dashboard_reads, sqlite_profile
+from .dashboard import SECTIONS, building_section, compute_dashboard, compute_section, hourly_section, power_factor_section, spike_section, trend_section
+from .downsample import TrendSeries, lttb
+from .filters import DashboardFilter
+from .histograms import histogram, histogram_buckets
+from .live import FeedPoller, LiveBroker, format_event
+from .panels import PANELS
+from .management.commands.benchmark_queries import capture_dashboard_queries
+from .profiling import RequestProfile, profiled, read_profiles
+from .sketches import QuantileSketch, active_sensors, power_percentiles
+from .spikes import GlobalMean, SensorMean, SensorPercentile, SketchPercentile, SpikeSummary
+from .synthetic import SyntheticFleet
+from .models import (
+    BuildingType, Building, SensorType, Sensor, Appliance,
+    EnergyReading, AnomalyType, Anomaly, Alert,
+    SensorHourlyRollup, BuildingDailyRollup, BuildingStats, ReadingCompaction
+)
+
+
+def make_fleet(buildings, sensors_per_building, readings_per_sensor):
+    """Create a small, deterministic fleet with a spike and an anomaly per sensor."""
+    btype = BuildingType.objects.create(name='Residential', description='')
+    stype = SensorType.objects.create(name='Panel Sensor', description='')
+    atype = AnomalyType.objects.create(name='Overload', description='')
+    base = timezone.now() - timedelta(days=1)
+
+    for b in range(buildings):
+        building = Building.objects.create(
+            name=f'Building {b + 1}', building_type=btype, location=f'Location {b + 1}'
+        )
+        for s in range(sensors_per_building):
+            sensor = Sensor.objects.create(building=building, sensor_type=stype, status='Active')
+            Appliance.objects.create(sensor=sensor, name=f'Appliance {s + 1}')
+            readings = EnergyReading.objects.bulk_create([
+                EnergyReading(
+                    sensor=sensor,
+                    timestamp=base + timedelta(minutes=i),
+                    voltage=230,
+                    current=5,
+                    power=5000 if i == 0 else 1000,
+                    power_factor=0.65 if i == 0 else 0.92,
+                )
+                for i in range(readings_per_sensor)
+            ])
+            rollups.apply_readings(readings)
+            anomaly = Anomaly.objects.create(
+                energy_reading=readings[0], anomaly_type=atype,
+                timestamp=readings[0].timestamp, severity=3, description='',
+            )
+            Alert.objects.create(anomaly=anomaly, status='Active', message='')
+
+
+def stale_anomaly_copies():
+    """Anomalies whose sensor, building or power no longer match their reading's."""
+    return Anomaly.objects.exclude(
+        sensor_id=F('energy_reading__sensor_id'),
+        building_id=F('energy_reading__sensor__building_id'),
+        power=F('energy_reading__power'),
+    )
+
+
+@override_settings(SMARTGUARD_DASHBOARD_WORKERS=1)
+class DashboardQueryCountTests(TestCase):
+    # Counted with profiled(), which sees every connection: sections may
+    # read through the dashboard alias rather than the default one.
+    def count_queries(self):
+        with profiled() as profile:
+            compute_dashboard()
+        return len(profile.queries)
+
+    def test_query_count_is_independent_of_fleet_size(self):
+        make_fleet(buildings=1, sensors_per_building=1, readings_per_sensor=5)
+        small = self.count_queries()
+
+        make_fleet(buildings=6, sensors_per_building=4, readings_per_sensor=5)
+        large = self.count_queries()
+
+        self.assertGreater(small, 0)
+        self.assertEqual(small, large)
+        self.assertEqual(len(capture_dashboard_queries()), small)
+
+    def test_view_query_count_is_constant(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=5)
+        with profiled() as small:
+            self.client.get(reverse('smartguard:analytics'))
+
+        cache.clear()
+        make_fleet(buildings=5, sensors_per_building=3, readings_per_sensor=5)
+        with profiled() as large:
+            response = self.client.get(reverse('smartguard:analytics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(small.queries), 0)
+        self.assertEqual(len(small.queries), len(large.queries))
+
+
+class DashboardSectionTests(TestCase):
+    def setUp(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=10)
+
+    def test_kpi_and_buildings(self):
+        data = compute_dashboard()
+        self.assertEqual(data['kpi']['total_buildings'], 2)
+        self.assertEqual(data['kpi']['total_sensors'], 4)
+        self.assertEqual(data['kpi']['total_readings'], 40)
+        self.assertEqual(data['kpi']['total_anomalies'], 4)
+        self.assertEqual(data['kpi']['active_alerts'], 4)
+        self.assertEqual([b['anomaly_count'] for b in data['buildings']], [2, 2])
+        self.assertEqual([b['reading_count'] for b in data['buildings']], [20, 20])
+
+    def test_spikes_and_power_factor(self):
+        data = compute_dashboard()
+        self.assertEqual(len(data['spikes']), 4)
+        self.assertTrue(all(s['spike_count'] == 1 for s in data['spikes']))
+        self.assertTrue(all(s['max_power'] == 5000 for s in data['spikes']))
+
+        critical, _, _, good, _ = data['power_factor']
+        self.assertEqual((critical['total'], critical['faults'], critical['rate']), (4, 4, 100))
+        self.assertEqual((good['total'], good['faults']), (36, 0))
+
+
+class HistogramTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=10)
+
+    def test_one_query_counts_each_faulty_reading_once(self):
+        anomaly = Anomaly.objects.first()
+        Anomaly.objects.create(
+            energy_reading=anomaly.energy_reading, anomaly_type=anomaly.anomaly_type,
+            timestamp=anomaly.timestamp, severity=1, description='',
+        )
+        with self.assertNumQueries(1):
+            buckets = histogram('power', buckets=histogram_buckets('power', [0, 2000, None]))
+        self.assertEqual(
+            [(b['label'], b['total'], b['faults'], b['rate']) for b in buckets],
+            [('0–2000 W', 36, 0, 0), ('≥2000 W', 4, 4, 100)],
+        )
+
+    def test_edges_bound_the_range(self):
+        buckets = histogram('voltage', DashboardFilter(sensors=[Sensor.objects.first().pk]),
+                            histogram_buckets('voltage', [100, 200, 230]))
+        # 230 V is the closed-open upper edge, so no reading is counted.
+        self.assertEqual([b['total'] for b in buckets], [0, 0])
+
+        with self.settings(SMARTGUARD_HISTOGRAMS={'voltage': {'edges': [220, 240]}}):
+            self.assertEqual([(b['label'], b['total']) for b in histogram('voltage')], [('220–240 V', 40)])
+
+        for edges in ([1], [2, 1], [0, None, 5]):
+            with self.subTest(edges=edges), self.assertRaises(ValueError):
+                histogram_buckets('power', edges)
+
+    def test_api(self):
+        url = reverse('smartguard:reading_histogram', args=['power'])
+        default = self.client.get(url).json()
+        self.assertEqual(default['field'], 'power')
+        self.assertEqual(sum(b['total'] for b in default['buckets']), 40)
+        self.assertEqual(default['buckets'], compute_section('power_histogram'))
+
+        custom = self.client.get(url, {'edges': '0,2000,inf', 'building': str(Building.objects.first().pk)}).json()
+        self.assertEqual([(b['upper'], b['total']) for b in custom['buckets']], [(2000, 18), (None, 2)])
+
+        self.assertEqual(self.client.get(url, {'edges': '0,x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'edges': '5,1'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('smartguard:reading_histogram', args=['status'])).status_code, 404)
+
+
+@override_settings(SMARTGUARD_DASHBOARD_WORKERS=1)
+class DashboardFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=10)
+        self.building = Building.objects.order_by('building_id').first()
+
+    def test_trend_covers_most_recent_readings(self):
+        trend = compute_dashboard()['trend']
+        latest = EnergyReading.objects.order_by('-timestamp').values_list('timestamp', flat=True)[0]
+        self.assertEqual(sum(p['count'] for p in trend), 40)
+        self.assertLess(abs(trend[-1]['timestamp'] - latest), timedelta(minutes=10))
+        self.assertEqual([p['timestamp'] for p in trend], sorted(p['timestamp'] for p in trend))
+
+    def test_building_filter_scopes_every_section(self):
+        data = compute_dashboard(DashboardFilter(buildings=[self.building.pk]))
+        self.assertEqual(data['kpi']['total_buildings'], 1)
+        self.assertEqual(data['kpi']['total_sensors'], 2)
+        self.assertEqual(data['kpi']['total_readings'], 20)
+        self.assertEqual(data['kpi']['total_anomalies'], 2)
+        self.assertEqual(data['kpi']['total_alerts'], 2)
+        self.assertEqual(len(data['spikes']), 2)
+        self.assertEqual(sum(b['total'] for b in data['power_factor']), 20)
+        self.assertEqual(sum(h['reading_count'] for h in data['hourly']), 20)
+        self.assertEqual([b['name'] for b in data['buildings']], [self.building.name])
+
+    def test_sensor_filter(self):
+        sensor = Sensor.objects.order_by('sensor_id').first()
+        data = compute_dashboard(DashboardFilter(sensors=[sensor.pk]))
+        self.assertEqual(data['kpi']['total_sensors'], 1)
+        self.assertEqual(data['kpi']['total_readings'], 10)
+        self.assertEqual(data['kpi']['total_anomalies'], 1)
+        self.assertEqual(sum(h['reading_count'] for h in data['hourly']), 10)
+
+    def test_time_window_uses_hourly_rollups(self):
+        future = DashboardFilter(start=timezone.now() + timedelta(hours=2))
+        data = compute_dashboard(future)
+        self.assertEqual(data['kpi']['total_readings'], 0)
+        self.assertEqual(data['kpi']['total_anomalies'], 0)
+        self.assertEqual(data['trend'], [])
+
+        recent = compute_dashboard(DashboardFilter(start=timezone.now() - timedelta(days=2)))
+        self.assertEqual(recent['kpi']['total_readings'], 40)
+
+    def test_query_parameters(self):
+        url = reverse('smartguard:dashboard_panel', args=['buildings'])
+        response = self.client.get(url, {'window': '48h', 'building': str(self.building.pk)})
+        self.assertEqual(response.json()['buildingLabels'], [self.building.name])
+        self.assertEqual(self.client.get(url, {'window': 'soon'}).status_code, 400)
+
+        page = self.client.get(reverse('smartguard:analytics'), {'building': str(self.building.pk)})
+        self.assertContains(page, f'Building {self.building.pk}')
+        self.assertEqual(self.client.get(reverse('smartguard:analytics'), {'building': 'x'}).status_code, 400)
+
+
+class DownsampleTests(TestCase):
+    def setUp(self):
+        building = Building.objects.create(
+            name='Building 1', building_type=BuildingType.objects.create(name='Residential', description=''),
+            location='Location 1',
+        )
+        sensor = Sensor.objects.create(
+            building=building, sensor_type=SensorType.objects.create(name='Panel Sensor', description=''),
+            status='Active',
+        )
+        end = timezone.now().replace(second=0, microsecond=0)
+        readings = EnergyReading.objects.bulk_create([
+            EnergyReading(
+                sensor=sensor, timestamp=end - timedelta(minutes=10 * i), voltage=230, current=5,
+                power=1000 + 500 * (i % 7 == 0), power_factor=0.9,
+            )
+            for i in range(1, 3000)
+        ])
+        rollups.apply_readings(readings)
+        self.end = end
+
+    def series(self, span, **kwargs):
+        return TrendSeries(
+            EnergyReading.objects.all(), SensorHourlyRollup.objects.all(),
+            self.end - span, self.end, **kwargs
+        )
+
+    def test_lttb_keeps_endpoints_and_size(self):
+        import numpy as np
+
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 25)
+        chosen = lttb(x, y, 50)
+        self.assertEqual(len(chosen), 50)
+        self.assertEqual((chosen[0], chosen[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(chosen) > 0))
+        for threshold, expected in ((2, [0, 999]), (1, [0]), (0, [])):
+            self.assertEqual(list(lttb(x, y, threshold)), expected)
+
+    def test_epoch_needs_a_supported_backend(self):
+        from django.db import NotSupportedError
+        from django.db.models.sql import Query
+        from .downsample import Epoch
+
+        compiler = Query(EnergyReading).get_compiler('default')
+
+        class Other:
+            vendor = 'other'
+
+        with self.assertRaisesMessage(NotSupportedError, 'other backend'):
+            Epoch('timestamp').as_sql(compiler, Other())
+
+    def test_point_count_is_fixed_for_any_range(self):
+        for span in (timedelta(hours=6), timedelta(days=20), timedelta(days=365)):
+            with self.subTest(span=span):
+                series = self.series(span, points=40)
+                with self.assertNumQueries(1):
+                    points = series.compute()
+                self.assertLessEqual(len(points), 40)
+                self.assertEqual(series.from_rollups, span > timedelta(hours=6))
+
+    def test_minmax_buckets_keep_totals_and_peaks(self):
+        for span in (timedelta(hours=4), timedelta(days=30)):
+            with self.subTest(span=span):
+                points = self.series(span, points=20, method='minmax').compute()
+                expected = EnergyReading.objects.filter(
+                    timestamp__gte=self.end - span if span <= timedelta(hours=6)
+                    else (self.end - span).replace(minute=0, second=0, microsecond=0),
+                    timestamp__lt=self.end,
+                ).count()
+                self.assertEqual(sum(p['count'] for p in points), expected)
+                self.assertEqual(max(p['power_max'] for p in points), 1500)
+                self.assertTrue(all(p['power_min'] <= p['power'] <= p['power_max'] for p in points))
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=10)
+
+    def test_cached_dashboard_matches_and_skips_queries(self):
+        first = dashboard_cache.cached_dashboard()
+        with self.assertNumQueries(0):
+            second = dashboard_cache.cached_dashboard()
+        self.assertEqual(first['kpi'], compute_dashboard()['kpi'])
+        self.assertEqual(first['buildings'], second['buildings'])
+
+    def test_write_recomputes_only_affected_sections(self):
+        dashboard_cache.cached_dashboard()
+        alert = Alert.objects.first()
+        alert.status = 'Resolved'
+        alert.save()
+
+        with self.assertNumQueries(1):  # alert_stats only
+            data = dashboard_cache.cached_dashboard()
+        self.assertEqual(data['kpi']['active_alerts'], 3)
+        self.assertEqual(data['kpi']['resolved_alerts'], 1)
+
+    def test_bulk_rollup_writes_invalidate_readings(self):
+        dashboard_cache.cached_dashboard()
+        sensor = Sensor.objects.first()
+        readings = EnergyReading.objects.bulk_create([
+            EnergyReading(sensor=sensor, timestamp=timezone.now(), voltage=230,
+                          current=5, power=1000, power_factor=0.92)
+        ])
+        rollups.apply_readings(readings)
+        self.assertEqual(dashboard_cache.cached_dashboard()['kpi']['total_readings'], 41)
+
+    def test_bulk_deletes_keep_the_fast_path(self):
+        # No per-row delete receivers: one DELETE, and the caller invalidates.
+        with self.assertNumQueries(1):
+            Alert.objects.filter(status='Active').delete()
+
+    def test_concurrent_miss_serves_previous_value(self):
+        before = dashboard_cache.get_section('alert_stats')
+        Alert.objects.first().delete()
+        cache.add(f'{dashboard_cache.PREFIX}:alert_stats:all:lock', 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_cache.get_section('alert_stats'), before)
+
+
+class DashboardPanelApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=10)
+
+    def panel_url(self, panel):
+        return reverse('smartguard:dashboard_panel', args=[panel])
+
+    def test_every_panel_returns_json(self):
+        for panel in PANELS:
+            with self.subTest(panel=panel):
+                response = self.client.get(self.panel_url(panel))
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.json())
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+
+        buildings = self.client.get(self.panel_url('buildings')).json()
+        self.assertEqual(buildings['buildingAnomalies'], [2, 2])
+        self.assertEqual(self.client.get(self.panel_url('unknown')).status_code, 404)
+
+    def test_conditional_get(self):
+        first = self.client.get(self.panel_url('severity'))
+        with self.assertNumQueries(0):
+            unchanged = self.client.get(self.panel_url('severity'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+
+        # Unrelated writes keep the panel valid; writes to its data do not.
+        alert = Alert.objects.first()
+        alert.status = 'Resolved'
+        alert.save()
+        self.assertEqual(
+            self.client.get(self.panel_url('severity'), HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304
+        )
+        Anomaly.objects.first().delete()
+        changed = self.client.get(self.panel_url('severity'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(sum(changed.json()['severityCounts']), 3)
+
+
+class LiveFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=1, sensors_per_building=2, readings_per_sensor=3)
+
+    def test_poll_reports_only_new_rows(self):
+        poller = FeedPoller()
+        poller.prime()
+        self.assertEqual(poller.poll(), [])
+
+        sensor = Sensor.objects.first()
+        reading = EnergyReading.objects.create(
+            sensor=sensor, timestamp=timezone.now(), voltage=230, current=4, power=920, power_factor=0.9
+        )
+        anomaly = Anomaly.objects.create(
+            energy_reading=reading, anomaly_type=AnomalyType.objects.get(),
+            timestamp=reading.timestamp, severity=5, description='Live',
+        )
+        Alert.objects.create(anomaly=anomaly, status='Active', message='')
+
+        events = dict(poller.poll())
+        self.assertEqual(events['alert']['anomaly_id'], anomaly.anomaly_id)
+        self.assertEqual(events['readings'], [{
+            'sensor_id': sensor.sensor_id, 'timestamp': reading.timestamp,
+            'power': 920, 'power_factor': 0.9, 'voltage': 230, 'current': 4,
+        }])
+        self.assertEqual(events['kpi']['kpi']['active_alerts'], 3)
+        self.assertEqual(events['kpi']['delta']['total_anomalies'], 1)
+        self.assertEqual(poller.poll(), [])
+
+    def test_format_event(self):
+        self.assertEqual(format_event('kpi', {'a': 1}, 7), 'id: 7\nevent: kpi\ndata: {"a": 1}\n\n')
+
+    def test_broker_fans_out_and_drops_oldest(self):
+        async def scenario():
+            broker = LiveBroker(queue_size=2)
+            broker.producer = asyncio.get_running_loop().create_future()  # no polling in tests
+            first, second = broker.subscribe(), broker.subscribe()
+            for n in range(3):
+                broker.publish('kpi', {'n': n})
+            second.close()
+            broker.publish('kpi', {'n': 3})
+            messages = [await first.get(1) for _ in range(2)]
+            return messages, first.dropped, second.queue.qsize(), await first.get(0.01)
+
+        messages, dropped, closed_size, idle = asyncio.run(scenario())
+        self.assertEqual([m.splitlines()[0] for m in messages], ['id: 3', 'id: 4'])
+        self.assertEqual(dropped, 2)
+        self.assertEqual(closed_size, 2)
+        self.assertIsNone(idle)
+
+    def test_producer_survives_failed_polls(self):
+        async def scenario():
+            broker = LiveBroker(interval=0.001)
+            broker.producer = asyncio.get_running_loop().create_future()
+            viewer = broker.subscribe()
+            producer = asyncio.ensure_future(broker.produce(FlakyPoller()))
+            messages = [await viewer.get(1) for _ in range(3)]
+            viewer.close()
+            await producer
+            return [m.splitlines()[1:3] for m in messages]
+
+        with self.assertLogs('smartguard.live', 'ERROR'):
+            messages = asyncio.run(scenario())
+        self.assertEqual(messages, [
+            ['event: status', 'data: {"ok": false}'],
+            ['event: status', 'data: {"ok": true}'],
+            ['event: kpi', 'data: {"polls": 2}'],
+        ])
+
+    def test_feed_needs_asgi(self):
+        response = self.client.get(reverse('smartguard:live_feed'))
+        self.assertEqual(response.status_code, 501)
+
+
+class FlakyPoller:
+    """Fails its first poll, then reports one KPI change per poll."""
+
+    def __init__(self):
+        self.polls = 0
+
+    def prime(self):
+        pass
+
+    def poll(self):
+        self.polls += 1
+        if self.polls == 1:
+            raise OperationalError('database is locked')
+        return [('kpi', {'polls': self.polls})]
+
+
+class ConcurrentSectionTests(TransactionTestCase):
+    # Sections run on worker threads with their own connections, which only
+    # see committed rows, hence TransactionTestCase. They read through the
+    # dashboard alias, a mirror of the default test database.
+    databases = {'default', 'dashboard'}
+
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=5)
+
+    def test_concurrent_sections_match_serial(self):
+        values, timings = async_to_sync(gather_sections)(SECTIONS, section=compute_section, workers=4)
+        self.assertEqual(set(timings), set(SECTIONS))
+        for name in SECTIONS:
+            with self.subTest(section=name):
+                self.assertEqual(values[name], compute_section(name))
+
+    def test_analytics_reports_section_timings(self):
+        response = self.client.get(reverse('smartguard:analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['kpi']['total_anomalies'], 4)
+        timing = response['Server-Timing']
+        self.assertTrue(timing.startswith('total;dur='))
+        self.assertIn('reading_stats;dur=', timing)
+        self.assertIn('recent_anomalies;dur=', timing)
+
+    def test_server_timing_orders_slowest_first(self):
+        self.assertEqual(server_timing({'a': 1.0, 'b': 12.345}), 'b;dur=12.3, a;dur=1.0')
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    def test_connections_apply_the_profile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'db.sqlite3')
+            handler = ConnectionHandler({
+                'default': {},
+                'writer':  sqlite_profile(path),
+                'reader':  sqlite_profile(path, read_only=True, cache_size=-1000),
+            })
+            try:
+                with handler['writer'].cursor() as cursor:
+                    cursor.execute('CREATE TABLE t (x integer)')
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'query_only'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+                self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'query_only': 0})
+                self.assertEqual(handler['writer'].transaction_mode, 'IMMEDIATE')
+
+                with handler['reader'].cursor() as cursor:
+                    cursor.execute('PRAGMA cache_size')
+                    self.assertEqual(cursor.fetchone()[0], -1000)
+                    cursor.execute('SELECT count(*) FROM t')
+                    with self.assertRaisesMessage(OperationalError, 'readonly'):
+                        cursor.execute('INSERT INTO t VALUES (1)')
+            finally:
+                handler.close_all()
+
+    @override_settings(SMARTGUARD_DASHBOARD_DATABASE='dashboard')
+    def test_router_sends_dashboard_reads_to_the_alias(self):
+        router = DashboardRouter()
+        self.assertIsNone(router.db_for_read(EnergyReading))
+        with dashboard_reads():
+            self.assertEqual(router.db_for_read(EnergyReading), 'dashboard')
+        self.assertIs(router.allow_migrate('dashboard', 'smartguard'), False)
+        self.assertIsNone(router.allow_migrate('default', 'smartguard'))
+
+        reading = EnergyReading()
+        reading._state.db = 'dashboard'
+        self.assertEqual(router.db_for_write(EnergyReading, instance=reading), 'default')
+
+    @override_settings(SMARTGUARD_DASHBOARD_DATABASE=None)
+    def test_router_is_off_without_an_alias(self):
+        with dashboard_reads():
+            self.assertIsNone(DashboardRouter().db_for_read(EnergyReading))
+
+
+@override_settings(SMARTGUARD_PROFILING={'sample_rate': 1.0}, SMARTGUARD_DASHBOARD_WORKERS=1)
+class QueryProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=5)
+
+    def test_profile_header_and_log_line(self):
+        with self.assertLogs('smartguard.profiling', 'INFO') as logs:
+            page = self.client.get(reverse('smartguard:analytics'))
+            panel = self.client.get(reverse('smartguard:dashboard_panel', args=['hourly']))
+
+        # The view's own section timings come first, the middleware's after.
+        self.assertRegex(page['Server-Timing'], r'^total;dur=.*, sql;dur=[\d.]+;desc="\d+ queries", render;dur=')
+        self.assertIn('app;dur=', panel['Server-Timing'])
+
+        page_profile, panel_profile = read_profiles(logs.output)
+        self.assertEqual(page_profile['route'], 'analytics/')
+        self.assertGreater(page_profile['render_ms'], 0)
+        self.assertEqual(panel_profile['route'], 'api/dashboard/<slug:panel>/')
+        self.assertGreater(page_profile['queries'], 0)
+        self.assertEqual(len(panel_profile['slowest']), min(3, panel_profile['queries']))
+
+    @override_settings(SMARTGUARD_PROFILING={'sample_rate': 0.5})
+    def test_sampling_is_spread_evenly(self):
+        with self.assertLogs('smartguard.profiling', 'INFO') as logs:
+            responses = [self.client.get(reverse('smartguard:dashboard_panel', args=['severity'])) for _ in range(4)]
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(['Server-Timing' in r for r in responses], [False, True, False, True])
+
+    def test_repeated_and_duplicate_statements(self):
+        profile = RequestProfile()
+        profile.record('SELECT * FROM t WHERE id IN (%s, %s)', (1, 2), 0.002)
+        profile.record('SELECT * FROM t WHERE id IN (%s)', (1,), 0.001)
+        profile.record('SELECT * FROM t WHERE id IN (%s, %s, %s)', (1, 2, 3), 0.003)
+        profile.record('SELECT * FROM t WHERE id IN (%s, %s)', (1, 2), 0.002)
+        profile.finish()
+        self.assertEqual(profile.duplicates(), 1)
+        # Single-element IN lists keep their own shape.
+        self.assertEqual(profile.repeated(2), [('SELECT * FROM t WHERE id IN (%s, ...)', 3)])
+        self.assertEqual(profile.slowest(1)[0][2], 0.003)
+
+    def test_summary_command(self):
+        with self.assertLogs('smartguard.profiling', 'INFO') as logs:
+            for panel in ('severity', 'severity', 'hourly'):
+                self.client.get(reverse('smartguard:dashboard_panel', args=[panel]))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profile.log')
+            with open(path, 'w') as f:
+                f.write('unrelated line\n' + '\n'.join(f'2026-01-01 00:00:00 {line}' for line in logs.output))
+            out = StringIO()
+            call_command('profile_summary', path, stdout=out)
+
+        self.assertRegex(out.getvalue(), r'\n\s+3 .* GET api/dashboard/<slug:panel>/')
+        self.assertIn('Slowest statements', out.getvalue())
+
+
+@override_settings(SMARTGUARD_DASHBOARD_WORKERS=1, ALLOWED_HOSTS=['localhost'])
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=20)
+
+    def test_suite_metrics_leave_data_untouched(self):
+        run = benchmarks.run_suite(repeat=1, ingest_rows=40, detect_rows=40)
+        metrics = run['metrics']
+        self.assertEqual(run['readings'], 80)
+        self.assertEqual(EnergyReading.objects.count(), 80)
+        self.assertEqual(metrics['analytics.warm_queries']['value'], 0)
+        self.assertEqual(metrics['section.reading_stats.queries']['value'], 1)
+        for panel in PANELS:
+            self.assertIn(f'panel.{panel}.cold_ms', metrics)
+        self.assertGreater(metrics['ingest.readings_per_s']['value'], 0)
+        self.assertEqual(metrics['detection.backfill_per_s']['better'], benchmarks.HIGHER)
+
+    def test_compare_flags_regressions(self):
+        def results(ms, queries, rate):
+            return {'scales': {'10k': {'metrics': {
+                'page.ms':      benchmarks.metric(ms, 'ms'),
+                'page.queries': benchmarks.metric(queries, 'queries'),
+                'ingest':       benchmarks.metric(rate, 'readings/s', benchmarks.HIGHER),
+            }}}}
+
+        baseline = results(100, 7, 1000)
+        self.assertEqual(benchmarks.compare(results(115, 7, 850), baseline, 0.2), [])
+        self.assertEqual(
+            [name for _, name, _, _ in benchmarks.compare(results(130, 8, 700), baseline, 0.2)],
+            ['page.ms', 'page.queries', 'ingest'],
+        )
+        # Sub-millisecond jitter is ignored however large in relative terms.
+        self.assertEqual(benchmarks.compare(results(0.9, 7, 1000), results(0.2, 7, 1000), 0.2), [])
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        btype = BuildingType.objects.create(name='Residential', description='')
+        stype = SensorType.objects.create(name='Panel Sensor', description='')
+        building = Building.objects.create(name='Old', building_type=btype, location='')
+        old = timezone.now() - timedelta(days=40)
+        readings = []
+        for s in range(2):
+            sensor = Sensor.objects.create(building=building, sensor_type=stype, status='Active')
+            readings += [
+                EnergyReading(sensor=sensor, timestamp=old + timedelta(hours=i), voltage=230,
+                              current=4, power=900 + i, power_factor=0.9)
+                for i in range(30)
+            ] + [
+                EnergyReading(sensor=sensor, timestamp=timezone.now() - timedelta(minutes=i), voltage=230,
+                              current=4, power=1000, power_factor=0.9)
+                for i in range(5)
+            ]
+        readings = EnergyReading.objects.bulk_create(readings)
+        rollups.apply_readings(readings)
+        self.flagged = readings[3]
+        Anomaly.objects.create(
+            energy_reading=self.flagged, anomaly_type=AnomalyType.objects.create(name='Overload', description=''),
+            timestamp=self.flagged.timestamp, severity=3, description='',
+        )
+
+    def rollup_totals(self):
+        return (
+            SensorHourlyRollup.objects.aggregate(n=Sum('reading_count'), p=Sum('power_sum')),
+            BuildingDailyRollup.objects.aggregate(n=Sum('reading_count'), p=Sum('power_sum')),
+        )
+
+    def test_compaction_keeps_rollups_and_referenced_readings(self):
+        before = self.rollup_totals()
+        expired = set(
+            EnergyReading.objects.filter(timestamp__lt=timezone.now() - timedelta(days=30))
+            .exclude(pk=self.flagged.pk).values_list('pk', flat=True)
+        )
+
+        originals = {r.pk: r for r in EnergyReading.objects.filter(pk__in=expired)}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = retention.Compactor(older_than=timedelta(days=30), batch_size=7, archive_dir=tmp).run()
+            archived = [row for path in sorted(os.listdir(tmp)) for row in retention.read_archive(os.path.join(tmp, path))]
+
+        self.assertEqual(stats, {'deleted': 59, 'kept': 1, 'archived_files': 9, 'batches': 9})
+        self.assertEqual({row[0] for row in archived}, expired)
+        for pk, sensor_id, timestamp, voltage, current, power, power_factor in archived:
+            original = originals[pk]
+            self.assertEqual((sensor_id, timestamp, power), (original.sensor_id, original.timestamp, original.power))
+        self.assertEqual(EnergyReading.objects.count(), 11)
+        self.assertTrue(EnergyReading.objects.filter(pk=self.flagged.pk).exists())
+        self.assertEqual(self.rollup_totals(), before)
+        self.assertIsNotNone(ReadingCompaction.objects.get().finished_at)
+
+        # Rebuilding history leaves the compacted days alone; a rerun has nothing to do.
+        rollups.rebuild()
+        self.assertEqual(self.rollup_totals(), before)
+        self.assertEqual(retention.Compactor(older_than=timedelta(days=30)).run()['deleted'], 0)
+
+    def test_trend_over_compacted_days_reads_the_rollups(self):
+        start = EnergyReading.objects.earliest('timestamp').timestamp.replace(minute=0, second=0, microsecond=0)
+        window = DashboardFilter(start=start, end=start + timedelta(hours=5))
+        before = sum(p['count'] for p in trend_section(window))
+        self.assertEqual(before, 10)
+        retention.Compactor(older_than=timedelta(days=30)).run()
+        self.assertEqual(sum(p['count'] for p in trend_section(window)), before)
+
+    def test_dry_run_command(self):
+        out = StringIO()
+        call_command('compact_readings', '--older-than', '30', '--dry-run', stdout=out)
+        self.assertIn('Would delete 59 readings and keep 1', out.getvalue())
+        self.assertEqual(EnergyReading.objects.count(), 70)
+        self.assertFalse(ReadingCompaction.objects.exists())
+
+
+class ColumnarArchiveTests(TestCase):
+    def setUp(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=30)
+        # A reading in an earlier month gets a partition of its own.
+        EnergyReading.objects.create(
+            sensor=Sensor.objects.first(), timestamp=timezone.now() - timedelta(days=70),
+            voltage=230, current=3, power=700, power_factor=0.7,
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_export_and_aggregates_match_the_database(self):
+        partitions = export_columnar(self.tmp.name, chunk_size=7)
+        self.assertEqual(len(partitions), 5)
+        self.assertEqual(sum(p['rows'] for p in partitions), 121)
+        # Re-exporting replaces partitions rather than appending to them.
+        export_columnar(self.tmp.name)
+
+        archive = ColumnarArchive(self.tmp.name)
+        for mapped, stored in zip(archive.hourly_profile(), hourly_section()):
+            self.assertEqual(mapped['reading_count'], stored['reading_count'])
+            self.assertAlmostEqual(mapped['avg_power'], stored['avg_power'], places=3)
+            self.assertAlmostEqual(mapped['max_power'], stored['max_power'], places=3)
+        self.assertEqual(
+            [b['total'] for b in archive.pf_buckets()],
+            [b['total'] for b in power_factor_section()],
+        )
+        self.assertEqual(
+            [(s['sensor_id'], s['spike_count']) for s in archive.spike_counts()],
+            sorted((s['sensor_id'], s['spike_count']) for s in spike_section()),
+        )
+
+    def test_time_range_and_sensor_selection(self):
+        call_command('export_columnar', '--root', self.tmp.name, stdout=StringIO())
+        archive = ColumnarArchive(self.tmp.name)
+        sensor = Sensor.objects.first()
+        recent = timezone.now() - timedelta(days=2)
+        self.assertEqual(archive.summary()['count'], 121)
+        self.assertEqual(archive.summary(start=recent)['count'], 120)
+        self.assertEqual(archive.summary(end=recent, sensor_ids=[sensor.pk])['count'], 1)
+        self.assertEqual(archive.summary(sensor_ids=[sensor.pk])['max_power'], 5000)
+        self.assertEqual(len(list(archive.partitions(start=recent))), 4)
+
+    def test_local_hours_across_dst_change(self):
+        import numpy as np
+        from zoneinfo import ZoneInfo
+
+        berlin = ZoneInfo('Europe/Berlin')
+        start = datetime(2026, 3, 29, 0, 30, tzinfo=berlin).timestamp()  # clocks go forward at 02:00
+        seconds = np.arange(start, start + 4 * 3600, 900, dtype=np.int64)
+        hours = ColumnarArchive._local_hours(seconds * 1_000_000, berlin)
+        self.assertEqual(list(hours), [datetime.fromtimestamp(int(t), tz=berlin).hour for t in seconds])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=10)
+        self.sensor = Sensor.objects.order_by('sensor_id').first()
+
+    def download(self, dataset, **params):
+        response = self.client.get(reverse('smartguard:export_data', args=[dataset]), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_endpoints_stream_filtered_rows(self):
+        response, body = self.download('readings', sensor=str(self.sensor.pk))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="readings-', response['Content-Disposition'])
+        rows = list(csv.DictReader(body.decode().splitlines()))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual({r['sensor_id'] for r in rows}, {str(self.sensor.pk)})
+        self.assertEqual(rows[0]['building_id'], str(self.sensor.building_id))
+        self.assertTrue(rows[0]['timestamp'].endswith('+00:00'))
+        self.assertEqual([r['timestamp'] for r in rows], sorted(r['timestamp'] for r in rows))
+
+        _, body = self.download('anomalies', building=str(self.sensor.building_id))
+        self.assertEqual(len(body.decode().splitlines()), 1 + 2)
+        _, body = self.download('alerts')
+        alerts = list(csv.DictReader(body.decode().splitlines()))
+        self.assertEqual(len(alerts), 4)
+        self.assertEqual(alerts[0]['status'], 'Active')
+
+    def test_asgi_requests_stream_asynchronously(self):
+        async def download():
+            response = await self.async_client.get(
+                reverse('smartguard:export_data', args=['readings']), {'sensor': str(self.sensor.pk)},
+            )
+            return response.is_async, b''.join([chunk async for chunk in response.streaming_content])
+
+        is_async, body = async_to_sync(download)()
+        self.assertTrue(is_async)
+        self.assertEqual(len(body.decode().splitlines()), 1 + 10)
+
+    def test_bad_requests(self):
+        url = reverse('smartguard:export_data', args=['readings'])
+        self.assertEqual(self.client.get(url, {'format': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('smartguard:export_data', args=['users'])).status_code, 404)
+
+    def test_rows_are_encoded_a_chunk_at_a_time(self):
+        chunks = list(export.csv_chunks(export.DATASETS['readings'], chunk_size=7))
+        # The header, then ceil(40 / 7) chunks of rows.
+        self.assertEqual(len(chunks), 1 + 6)
+        self.assertEqual([len(c.splitlines()) for c in chunks], [1, 7, 7, 7, 7, 7, 5])
+
+    def test_parquet_is_written_in_row_groups(self):
+        url = reverse('smartguard:export_data', args=['readings'])
+        if export.pa is None:
+            self.assertEqual(self.client.get(url, {'format': 'parquet'}).status_code, 501)
+            return
+        with self.settings(SMARTGUARD_EXPORT={'row_group_size': 16}):
+            _, body = self.download('readings', format='parquet')
+        parquet = export.pq.ParquetFile(export.pa.BufferReader(body))
+        self.assertEqual(parquet.metadata.num_rows, 40)
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+
+    def test_command_writes_a_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'alerts.csv')
+            out = StringIO()
+            call_command('export_data', 'alerts', output=path, sensor=[str(self.sensor.pk)], stdout=out)
+            with open(path, newline='') as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 1)
+        self.assertIn(f'Sensor {self.sensor.pk}', out.getvalue())
+
+
+class SpikeSummaryTests(TestCase):
+    def setUp(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=10)
+
+    def test_strategies_find_one_spike_per_sensor(self):
+        for strategy in (GlobalMean(), SensorMean(k=1.5), SensorPercentile(q=0.9), SketchPercentile(q=0.9)):
+            with self.subTest(strategy=type(strategy).__name__):
+                top = SpikeSummary(strategy).top()
+                self.assertEqual(len(top), 4)
+                self.assertTrue(all(s['spike_count'] == 1 for s in top))
+                self.assertTrue(all(s['max_power'] == 5000 for s in top))
+
+    def test_limit_and_query_count(self):
+        with self.assertNumQueries(2):
+            top = SpikeSummary(SensorMean(), limit=3).top()
+        self.assertEqual(len(top), 3)
+        self.assertEqual(top[0]['appliances'], 'Appliance 1')
+
+
+class SketchTests(TestCase):
+    def test_quantiles_are_within_relative_accuracy_and_merge(self):
+        rng = random.Random(3)
+        values = [rng.lognormvariate(7, 1) for _ in range(5000)]
+        whole = QuantileSketch()
+        halves = QuantileSketch(), QuantileSketch()
+        for i, value in enumerate(values):
+            whole.add(value)
+            halves[i % 2].add(value)
+
+        ordered = sorted(values)
+        for q in (0.0, 0.5, 0.95, 0.99, 1.0):
+            exact = ordered[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(whole.quantile(q) / exact, 1, delta=0.01)
+        merged = halves[0].merge(halves[1])
+        self.assertEqual(merged.to_dict(), whole.to_dict())
+        self.assertEqual(QuantileSketch.from_dict(merged.to_dict()).quantile(0.99), whole.quantile(0.99))
+
+    def test_percentiles_and_active_sensors_from_rollups(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=100)
+        overall = power_percentiles(quantiles=(0.95, 0.995))
+        self.assertEqual(overall['count'], 400)
+        self.assertAlmostEqual(overall['p95'], 1000, delta=10)
+        self.assertAlmostEqual(overall['p99.5'], 5000, delta=50)
+
+        per_building = power_percentiles(by='building', quantiles=(0.5, 1.0))
+        self.assertEqual(set(per_building), set(Building.objects.values_list('pk', flat=True)))
+        self.assertTrue(all(p['p100'] == 5000 and p['count'] == 200 for p in per_building.values()))
+        self.assertEqual(len(power_percentiles(by='sensor')), 4)
+        self.assertEqual({row['sensors'] for row in active_sensors(by='hour')}, {4})
+        self.assertEqual({row['sensors'] for row in active_sensors(by='day')}, {4})
+
+    def test_migration_backfills_sketches(self):
+        make_fleet(buildings=1, sensors_per_building=2, readings_per_sensor=90)
+        before = list(SensorHourlyRollup.objects.order_by('pk').values_list('power_sketch', flat=True))
+        SensorHourlyRollup.objects.update(power_sketch=None)
+
+        migration = import_module('smartguard.migrations.0008_rollup_power_sketch')
+        migration.backfill_sketches(apps, None)
+        after = list(SensorHourlyRollup.objects.order_by('pk').values_list('power_sketch', flat=True))
+        self.assertEqual(after, before)
+        self.assertTrue(all(after))
+
+
+class RollupTests(TestCase):
+    def rollup_values(self):
+        def rounded(rows):
+            return [
+                {k: round(v, 6) if isinstance(v, float) else v for k, v in row.items()}
+                for row in rows
+            ]
+
+        hourly = list(
+            SensorHourlyRollup.objects.order_by('sensor_id', 'hour')
+            .values('sensor_id', 'hour', 'reading_count', 'power_sum', 'power_min', 'power_max', 'pf_sum', 'voltage_sum', 'current_sum', 'power_sketch')
+        )
+        daily = list(
+            BuildingDailyRollup.objects.order_by('building_id', 'day')
+            .values('building_id', 'day', 'reading_count', 'power_sum', 'power_min', 'power_max', 'pf_sum', 'voltage_sum', 'current_sum')
+        )
+        return rounded(hourly), rounded(daily)
+
+    def test_incremental_rollups_match_rebuild(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=90)
+        sensor = Sensor.objects.first()
+        EnergyReading.objects.create(
+            sensor=sensor, timestamp=timezone.now(), voltage=230, current=1, power=7000, power_factor=0.5
+        )
+        incremental = self.rollup_values()
+
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rollup_values())
+        self.assertEqual(sum(r['reading_count'] for r in incremental[0]), 361)
+        self.assertEqual(max(r['power_max'] for r in incremental[1]), 7000)
+
+    def test_building_totals_track_writes_and_reconcile(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=30)
+        sensor = Sensor.objects.first()
+        latest = EnergyReading.objects.create(
+            sensor=sensor, timestamp=timezone.now(), voltage=230, current=1, power=7000, power_factor=0.5
+        )
+        Anomaly.objects.exclude(building=sensor.building).first().delete()
+
+        stats = BuildingStats.objects.get(building=sensor.building)
+        self.assertEqual((stats.reading_count, stats.power_max, stats.anomaly_count), (61, 7000, 2))
+        self.assertEqual(stats.last_reading_at, latest.timestamp)
+        self.assertEqual(BuildingStats.objects.exclude(pk=stats.pk).get().anomaly_count, 1)
+        self.assertEqual(rollups.rebuild_building_stats(), (2, 0))
+
+        # The unscoped overview reads the totals; a time scope goes through
+        # the hourly rollups and anomalies, and both must agree.
+        since = DashboardFilter(start=timezone.now() - timedelta(days=30))
+        self.assertEqual(building_section(), building_section(since))
+
+        BuildingStats.objects.update(reading_count=0, anomaly_count=0)
+        call_command('reconcile_building_stats', stdout=open(os.devnull, 'w'))
+        self.assertEqual(BuildingStats.objects.get(pk=stats.pk).reading_count, 61)
+        self.assertEqual(rollups.rebuild_building_stats(), (2, 0))
+
+    def test_edits_deletes_and_sensor_moves_are_corrected(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=30)
+        reading = EnergyReading.objects.order_by('pk').last()
+        reading.power, reading.timestamp = 9000, reading.timestamp - timedelta(days=2)
+        reading.save()
+        EnergyReading.objects.order_by('pk').first().delete()
+        rollups.delete_readings(EnergyReading.objects.filter(pk__in=EnergyReading.objects.order_by('pk')[40:45]))
+        sensor = Sensor.objects.order_by('pk').first()
+        sensor.building = Building.objects.order_by('pk').last()
+        sensor.save()
+        Sensor.objects.order_by('pk').last().delete()
+
+        corrected = self.rollup_values()
+        self.assertEqual(rollups.rebuild_building_stats(), (2, 0))
+        rollups.rebuild()
+        self.assertEqual(self.rollup_values(), corrected)
+        self.assertEqual(BuildingStats.objects.aggregate(n=Sum('reading_count'))['n'], 30 * 3 - 6)
+
+    def test_moving_an_anomaly_moves_its_count(self):
+        make_fleet(buildings=2, sensors_per_building=1, readings_per_sensor=5)
+        first, second = Building.objects.order_by('pk')
+        anomaly = Anomaly.objects.get(building=first)
+        anomaly.energy_reading = EnergyReading.objects.filter(sensor__building=second).last()
+        anomaly.save()
+
+        self.assertEqual(anomaly.building_id, second.pk)
+        counts = dict(BuildingStats.objects.values_list('building_id', 'anomaly_count'))
+        self.assertEqual(counts, {first.pk: 0, second.pk: 2})
+        self.assertEqual(rollups.rebuild_building_stats(), (2, 0))
+
+        # A second save with nothing moved counts nothing again.
+        anomaly.severity = 1
+        anomaly.save()
+        self.assertEqual(rollups.rebuild_building_stats(), (2, 0))
+
+
+class BatchTests(TestCase):
+    # The test database lives in memory, so jobs that touch it run with one
+    # worker; the process pool itself is covered by BatchPoolTests.
+
+    def test_partitions_cover_every_sensor_and_day_once(self):
+        self.assertEqual(batch.sensor_partitions([5, 1, 4, 2, 3], 2), [[1, 3, 5], [2, 4]])
+        self.assertEqual(batch.sensor_partitions([7], 4), [[7]])
+        first = datetime(2026, 1, 1).date()
+        days = batch.day_partitions(first, first + timedelta(days=9), 4)
+        self.assertEqual([(a.day, b.day) for a, b in days], [(1, 3), (4, 6), (7, 9), (10, 10)])
+
+    @override_settings(SMARTGUARD_BATCH={'partitions_per_worker': 3})
+    def test_parallel_rebuild_matches_rebuild(self):
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=30)
+        sensor = Sensor.objects.first()
+        for days in (3, 5, 8):
+            EnergyReading.objects.create(
+                sensor=sensor, timestamp=timezone.now() - timedelta(days=days),
+                voltage=230, current=1, power=700 * days, power_factor=0.8,
+            )
+        rollups.rebuild()
+        expected = RollupTests.rollup_values(self)
+
+        SensorHourlyRollup.objects.update(power_sum=0)
+        reports = []
+        stats = batch.parallel_rebuild(progress=lambda report: reports.append(str(report)))
+        self.assertEqual(RollupTests.rollup_values(self), expected)
+        self.assertEqual(stats['partitions'], 3)
+        self.assertEqual((stats['readings'], stats['hourly_rows']), (123, len(expected[0])))
+        self.assertEqual(len(reports), 3)
+        self.assertTrue(reports[-1].startswith('3/3 partitions, 123 readings'))
+
+    def test_parallel_rescore_matches_scanner(self):
+        from .scanner import BackfillScanner
+
+        make_fleet(buildings=2, sensors_per_building=2, readings_per_sensor=40)
+        for sensor in Sensor.objects.all()[:3]:
+            EnergyReading.objects.create(
+                sensor=sensor, timestamp=timezone.now(), voltage=230, current=30, power=6900, power_factor=0.9
+            )
+
+        stats = batch.parallel_rescore(window=20, dry_run=True)
+        expected = BackfillScanner(window=20, dry_run=True).run()
+        self.assertEqual(stats['partitions'], 4)
+        for key in ('sensors', 'readings', 'found'):
+            self.assertEqual(stats[key], expected[key])
+
+        stats = batch.parallel_rescore(window=20)
+        self.assertEqual((stats['found'], stats['created']), (3, 3))
+        self.assertEqual(BackfillScanner(window=20).run()['created'], 0)
+
+
+
+class ConcurrentRollupTests(TransactionTestCase):
+    # The writer runs on a thread with its own connection, hence
+    # TransactionTestCase.
+
+    def setUp(self):
+        make_fleet(buildings=1, sensors_per_building=1, readings_per_sensor=5)
+        self.sensor = Sensor.objects.get()
+
+    def ingest(self):
+        # Waits out the rebuild's write lock, as a second writer would.
+        try:
+            for _ in range(100):
+                try:
+                    with transaction.atomic():
+                        EnergyReading.objects.create(
+                            sensor=self.sensor, timestamp=timezone.now(), voltage=230,
+                            current=1, power=230, power_factor=1,
+                        )
+                    return
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    time.sleep(0.05)
+        finally:
+            connection.close()
+
+    def test_reading_saved_during_a_day_rebuild_is_counted(self):
+        writer = threading.Thread(target=self.ingest)
+        rollup_rows = rollups.rollup_rows
+
+        def rows_then_ingest(*args, **kwargs):
+            # Computes the day's rows, then lets a reading in before they are swapped in.
+            hourly, daily = rollup_rows(*args, **kwargs)
+            hourly, daily = list(hourly), list(daily)
+            writer.start()
+            writer.join(timeout=0.5)
+            return iter(hourly), iter(daily)
+
+        rollups.rollup_rows = rows_then_ingest
+        try:
+            today = timezone.localdate()
+            batch.rollup_partition((today, today))
+        finally:
+            rollups.rollup_rows = rollup_rows
+        writer.join()
+
+        self.assertEqual(EnergyReading.objects.count(), 6)
+        self.assertEqual(SensorHourlyRollup.objects.aggregate(n=Sum('reading_count'))['n'], 6)
+        self.assertEqual(BuildingDailyRollup.objects.aggregate(n=Sum('reading_count'))['n'], 6)
+
+class BatchPoolTests(SimpleTestCase):
+    def test_worker_results_come_back_in_partition_order(self):
+        self.assertEqual(list(batch.map_partitions(abs, [-3, 1, -2, 4], workers=2)), [3, 1, 2, 4])
+        self.assertEqual(batch.merge_stats([{'a': 1, 'b': 2.5}, {'a': 2, 'c': 'x'}]), {'a': 3, 'b': 2.5})
+        with self.assertRaises(ValueError):
+            batch.batch_options(workers=0)
+
+    def test_locked_writes_are_retried(self):
+        attempts = []
+
+        def write():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('database is locked')
+            return 'written'
+
+        self.assertEqual(batch.retry_locked(write, retries=2), 'written')
+        attempts.clear()
+        with self.assertRaises(OperationalError):
+            batch.retry_locked(write, retries=1)
+
+
+class IngestTests(TestCase):
+    url = reverse('smartguard:ingest_readings')
+
+    def setUp(self):
+        detection.reset_detector()
+        make_fleet(buildings=1, sensors_per_building=2, readings_per_sensor=1)
+        self.sensor = Sensor.objects.first()
+
+    def test_ndjson_batch_reports_rejected_rows(self):
+        rows = [
+            {'sensor_id': self.sensor.pk, 'timestamp': '2026-01-01T10:00:00Z',
+             'voltage': 230, 'current': 5, 'power': 1150, 'power_factor': 0.9},
+            {'sensor_id': 9999, 'timestamp': '2026-01-01T10:01:00Z',
+             'voltage': 230, 'current': 5, 'power': 1150, 'power_factor': 0.9},
+            {'sensor_id': self.sensor.pk, 'timestamp': 'yesterday',
+             'voltage': 230, 'current': 5, 'power': 1150, 'power_factor': 0.9},
+        ]
+        body = '\n'.join(json.dumps(r) for r in rows) + '\nnot json\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        result = response.json()
+        self.assertEqual((result['accepted'], result['rejected']), (1, 3))
+        self.assertEqual([e['line'] for e in result['errors']], [2, 3, 4])
+        self.assertEqual(EnergyReading.objects.filter(sensor=self.sensor).count(), 2)
+        self.assertEqual(
+            SensorHourlyRollup.objects.filter(sensor=self.sensor).aggregate(n=Sum('reading_count'))['n'], 2
+        )
+
+    def test_csv_batch_in_chunks(self):
+        lines = ['sensor_id,timestamp,voltage,current,power,power_factor']
+        lines += [
+            f'{self.sensor.pk},2026-01-01T10:{i:02d}:00,230,5,1150,0.9' for i in range(25)
+        ]
+        lines.append(f'{self.sensor.pk},2026-01-01T11:00:00,230,5,1150,1.7')
+        with self.settings(SMARTGUARD_INGEST_CHUNK_SIZE=10):
+            response = self.client.post(self.url, '\n'.join(lines), content_type='text/csv')
+
+        result = response.json()
+        self.assertEqual((result['accepted'], result['rejected']), (25, 1))
+        self.assertEqual(result['errors'][0]['line'], 27)
+
+    def test_rejects_unknown_content_type_and_bad_token(self):
+        response = self.client.post(self.url, 'x', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        with self.settings(SMARTGUARD_INGEST_TOKEN='secret'):
+            response = self.client.post(self.url, '', content_type='text/csv')
+        self.assertEqual(response.status_code, 401)
+
+
+class AnomalyReadingCopyTests(TestCase):
+    def setUp(self):
+        make_fleet(buildings=2, sensors_per_building=1, readings_per_sensor=3)
+        self.anomaly = Anomaly.objects.select_related('energy_reading__sensor').first()
+        self.reading = self.anomaly.energy_reading
+
+    def test_save_copies_the_reading(self):
+        self.assertEqual(
+            (self.anomaly.sensor_id, self.anomaly.building_id, self.anomaly.power),
+            (self.reading.sensor_id, self.reading.sensor.building_id, 5000),
+        )
+
+    def test_edits_keep_the_copies_unless_the_reading_changes(self):
+        anomaly = Anomaly.objects.get(pk=self.anomaly.pk)
+        anomaly.severity = 5
+        with self.assertNumQueries(1):
+            anomaly.save()
+
+        other = EnergyReading.objects.select_related('sensor').exclude(sensor=self.reading.sensor).first()
+        other.power = 7000
+        anomaly.energy_reading = other
+        # The loaded reading is reused: the save only writes.
+        with profiled() as profile:
+            anomaly.save()
+        self.assertFalse([sql for sql, _, _ in profile.queries if sql.startswith('SELECT')])
+        self.assertEqual(
+            (anomaly.sensor_id, anomaly.building_id, anomaly.power),
+            (other.sensor_id, other.sensor.building_id, 7000),
+        )
+        self.assertEqual(rollups.rebuild_building_stats(), (2, 0))
+
+    def test_reading_and_sensor_changes_follow_through(self):
+        other = Building.objects.exclude(pk=self.anomaly.building_id).get()
+        self.reading.power = 6000
+        self.reading.save()
+        sensor = self.reading.sensor
+        sensor.building = other
+        sensor.save()
+
+        self.anomaly.refresh_from_db()
+        self.assertEqual((self.anomaly.building_id, self.anomaly.power), (other.pk, 6000))
+        self.assertFalse(stale_anomaly_copies().exists())
+
+    def test_migration_backfills_copies(self):
+        Anomaly.objects.update(building=Building.objects.last(), power=0)
+        self.assertTrue(stale_anomaly_copies().exists())
+
+        migration = import_module('smartguard.migrations.0006_anomaly_denormalized')
+        migration.backfill_readings(apps, None)
+        self.assertFalse(stale_anomaly_copies().exists())
+
+
+class StreamingDetectorTests(TestCase):
+    def readings(self, powers, sensor_id=1):
+        base = timezone.now()
+        return [
+            EnergyReading(
+                sensor_id=sensor_id, timestamp=base + timedelta(seconds=i),
+                voltage=230, current=5, power=power, power_factor=0.9,
+            )
+            for i, power in enumerate(powers)
+        ]
+
+    def test_classifies_spikes_and_overloads(self):
+        detector = detection.StreamingDetector(min_samples=5)
+        findings = detector.process(self.readings([1000] * 10 + [5000]))
+        self.assertEqual([f[1] for f in findings], [detection.SPIKE])
+
+        # A gradual climb is sustained overload rather than a sudden spike.
+        findings = detector.process(self.readings([1000] * 10 + [1200, 1400, 1600, 1800], sensor_id=2))
+        self.assertEqual({f[1] for f in findings}, {detection.OVERLOAD})
+
+    def test_state_moves_only_when_the_batch_commits(self):
+        detector = detection.StreamingDetector(min_samples=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            detector.process(self.readings([1000] * 10))
+            with transaction.atomic():
+                self.assertTrue(detector.process(self.readings([1000] * 5 + [9000])))
+                transaction.set_rollback(True)
+        state = detector.states[1]
+        self.assertEqual((state.count, state.mean, state.last_power), (10, 1000, 1000))
+
+    def test_ingest_warms_from_history_and_records_alerts(self):
+        detection.reset_detector()
+        make_fleet(buildings=1, sensors_per_building=1, readings_per_sensor=30)
+        sensor = Sensor.objects.get()
+        body = json.dumps({
+            'sensor_id': sensor.pk, 'timestamp': timezone.now().isoformat(),
+            'voltage': 230, 'current': 30, 'power': 6900, 'power_factor': 0.9,
+        })
+        self.client.post(reverse('smartguard:ingest_readings'), body, content_type='application/x-ndjson')
+
+        anomaly = Anomaly.objects.filter(energy_reading__power=6900).get()
+        self.assertEqual(anomaly.anomaly_type.name, detection.SPIKE)
+        self.assertEqual(anomaly.alert_set.get().status, 'Active')
+        self.assertEqual((anomaly.sensor_id, anomaly.building_id), (sensor.pk, sensor.building_id))
+        self.assertFalse(stale_anomaly_copies().exists())
+
+
+class BackfillScannerTests(TestCase):
+    def test_rescan_is_idempotent_and_keeps_alert_status(self):
+        from .scanner import BackfillScanner
+
+        make_fleet(buildings=1, sensors_per_building=2, readings_per_sensor=40)
+        sensor = Sensor.objects.first()
+        spike = EnergyReading.objects.create(
+            sensor=sensor, timestamp=timezone.now(), voltage=230, current=30, power=6900, power_factor=0.9
+        )
+
+        stats = BackfillScanner(window=20).run()
+        self.assertEqual((stats['found'], stats['created']), (1, 1))
+        anomaly = Anomaly.objects.get(energy_reading=spike)
+        self.assertEqual(anomaly.anomaly_type.name, detection.SPIKE)
+        self.assertFalse(stale_anomaly_copies().exists())
+        anomaly.alert_set.update(status='Resolved')
+
+        stats = BackfillScanner(window=20).run()
+        self.assertEqual((stats['created'], stats['updated'], stats['deleted']), (0, 0, 0))
+        self.assertEqual(Anomaly.objects.get(energy_reading=spike).alert_set.get().status, 'Resolved')
+
+        # A stricter threshold withdraws the anomaly on the next run.
+        call_command('detect_anomalies', z_threshold=1000, stdout=open(os.devnull, 'w'))
+        self.assertFalse(Anomaly.objects.filter(energy_reading=spike).exists())
+
+    def test_partial_rescan_matches_full_scan_and_drops_duplicates(self):
+        from .scanner import BackfillScanner
+
+        make_fleet(buildings=1, sensors_per_building=1, readings_per_sensor=40)
+        sensor = Sensor.objects.get()
+        spike = EnergyReading.objects.create(
+            sensor=sensor, timestamp=timezone.now(), voltage=230, current=30, power=6900, power_factor=0.9
+        )
+        BackfillScanner(window=20).run()
+        full = list(Anomaly.objects.values_list('energy_reading_id', 'severity', 'description'))
+        self.assertTrue(full)
+
+        # Starting at the spike, the window is seeded from the readings before it.
+        anomaly = Anomaly.objects.get(energy_reading=spike)
+        Anomaly.objects.create(
+            energy_reading=spike, anomaly_type=anomaly.anomaly_type, timestamp=spike.timestamp, severity=1
+        )
+        stats = BackfillScanner(start=spike.timestamp, window=20).run()
+        self.assertEqual((stats['readings'], stats['found'], stats['deleted']), (1, 1, 1))
+        self.assertEqual(list(Anomaly.objects.values_list('energy_reading_id', 'severity', 'description')), full)
+        self.assertEqual(Anomaly.objects.get(energy_reading=spike).pk, anomaly.pk)
+        self.assertEqual(BuildingStats.objects.get().anomaly_count, len(full))
+
+
+class SyntheticFleetTests(TestCase):
+    end = timezone.now()
+
+    def generate(self, **kwargs):
+        fleet = SyntheticFleet(
+            buildings=2, sensors_per_building=3, span=timedelta(hours=2), chunk_size=100,
+            spike_rate=0.2, anomaly_rate=0.5, seed=7, end=self.end, **kwargs
+        )
+        fleet.run()
+        return fleet.stats, list(EnergyReading.objects.order_by('pk').values_list('power', flat=True))
+
+    def test_seeded_runs_are_reproducible_across_write_paths(self):
+        stats, powers = self.generate()
+        self.assertEqual(stats['readings'], 2 * 3 * 120)
+        self.assertTrue(0 < stats['anomalies'] < stats['readings'])
+        self.assertEqual(Alert.objects.count(), stats['anomalies'])
+        self.assertFalse(stale_anomaly_copies().exists())
+        self.assertEqual(
+            BuildingDailyRollup.objects.aggregate(n=Sum('reading_count'))['n'], stats['readings']
+        )
+
+        EnergyReading.objects.all().delete()
+        _, fast_powers = self.generate(fast=True)
+        self.assertEqual(powers, fast_powers)
+
+    def test_seed_data_command(self):
+        call_command('seed_data', seed=1, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Building.objects.count(), 3)
+        self.assertEqual(EnergyReading.objects.count(), 600)
+        self.assertEqual(
+            set(Anomaly.objects.values_list('anomaly_type__name', flat=True)), {detection.SPIKE, detection.OVERLOAD}
+        )
+
+    def test_keys_follow_rows_written_in_between(self):
+        chunks = []
+        fleet = SyntheticFleet(
+            buildings=1, sensors_per_building=2, span=timedelta(minutes=20), chunk_size=10,
+            spike_rate=0.5, anomaly_rate=1, seed=3, end=self.end, fast=True,
+        )
+        fleet.run(progress=lambda done, total: chunks.append(EnergyReading.objects.create(
+            sensor=Sensor.objects.first(), timestamp=self.end, voltage=230, current=1, power=230, power_factor=1,
+        )))
+        self.assertEqual(EnergyReading.objects.count(), 40 + len(chunks))
+        self.assertEqual(Alert.objects.filter(anomaly__energy_reading__in=chunks).count(), 0)
+        self.assertEqual(Alert.objects.count(), fleet.stats['anomalies'])
+        self.assertFalse(stale_anomaly_copies().exists())
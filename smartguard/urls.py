@@ -5,4 +5,9 @@ app_name = 'smartguard'
 
 urlpatterns = [
     path('analytics/', views.analytics, name='analytics'),
+    path('api/dashboard/<slug:panel>/', views.dashboard_panel, name='dashboard_panel'),
+    path('api/histogram/<slug:field>/', views.reading_histogram, name='reading_histogram'),
+    path('api/live/', views.live_feed, name='live_feed'),
+    path('api/export/<slug:dataset>/', views.export_data, name='export_data'),
+    path('api/readings/ingest/', views.ingest_readings, name='ingest_readings'),
 ]